@@ -1,35 +1,645 @@
 import sqlite3
 from flask_cors import CORS
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request, send_file
 import requests
-from datetime import datetime
+from collections import OrderedDict, deque
+import base64
+import bisect
+from datetime import date, datetime, timedelta
+import difflib
+import functools
+import hashlib
 import json
+import math
+import os
+import pathlib
+import re
+import sys
+import threading
+import time
+import uuid
+
+try:
+    from PIL import Image, ImageOps # Optional: without Pillow, photos are stored but not thumbnailed
+except ImportError:
+    Image = None
 
 # --- CONFIGURATION ---
-SQLITE_DB_NAME = "test_data_trim.db"
+SQLITE_DB_NAME = os.environ.get("SQLITE_DB_NAME", "test_data_trim.db")
+
+# Connection pool and PRAGMA tuning. Each gunicorn worker keeps its own pool of
+# warm connections so requests don't pay to reopen the file and rebuild the page cache.
+SQLITE_POOL_SIZE = int(os.environ.get("SQLITE_POOL_SIZE", "4"))          # Max idle connections kept per worker
+SQLITE_CACHE_SIZE = int(os.environ.get("SQLITE_CACHE_SIZE", "-65536"))   # Negative = size in KiB (64 MiB)
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", "268435456"))  # 256 MiB of memory-mapped I/O
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")      # NORMAL is durable enough under WAL
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# ERP data is served from a read-only snapshot built by test_data.py and swapped in with an
+# atomic rename. Every connection attaches it as "erp"; pools notice a new snapshot within
+# ERP_RELOAD_CHECK_INTERVAL seconds and move new requests over to it (see SQLiteConnectionPool).
+ERP_DB_NAME = os.environ.get("ERP_DB_NAME", os.path.join(os.path.dirname(SQLITE_DB_NAME), "erp_snapshot.db"))
+ERP_RELOAD_CHECK_INTERVAL = float(os.environ.get("ERP_RELOAD_CHECK_INTERVAL", "1.0"))
+ERP_SCHEMA_VERSION = 3 # Must match ERP_SCHEMA_VERSION in test_data.py
+
+# LocalAI endpoint (using host.docker.internal to connect to the host)
+LOCALAI_URL = os.environ.get("LOCALAI_URL", "http://host.docker.internal:4444/v1/chat/completions")
+LOCALAI_MODEL = os.environ.get("LOCALAI_MODEL", "mistral-7b-instruct-v0.3") # Your downloaded model
+LOCALAI_TEMPERATURE = 0.7
+LOCALAI_MAX_TOKENS = 500
+LOCALAI_TIMEOUT = 90
+LOCALAI_POOL_SIZE = int(os.environ.get("LOCALAI_POOL_SIZE", "4"))              # Keep-alive connections to LocalAI per worker
+SUMMARIZE_STREAM_LIMIT = int(os.environ.get("SUMMARIZE_STREAM_LIMIT", "2"))    # Concurrent /summarize/stream requests per worker
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000")) # Persistent LLM cache size (see LLMResponseCache)
+
+# Summarization job queue (see SummarizeJobQueue)
+SUMMARIZE_QUEUE_LIMIT = int(os.environ.get("SUMMARIZE_QUEUE_LIMIT", "20"))             # Max queued jobs before returning 429
+SUMMARIZE_WORKER_THREADS = int(os.environ.get("SUMMARIZE_WORKER_THREADS", "1"))        # LLM calls in flight per gunicorn worker
+SUMMARIZE_POLL_INTERVAL = float(os.environ.get("SUMMARIZE_POLL_INTERVAL", "1.0"))      # Seconds between checks for new jobs
+SUMMARIZE_JOB_RETENTION = int(os.environ.get("SUMMARIZE_JOB_RETENTION", "3600"))       # Seconds to keep finished jobs
+SUMMARIZE_STALE_AFTER = int(os.environ.get("SUMMARIZE_STALE_AFTER", "300"))            # Reclaim 'running' jobs older than this
+
+# Batched lookups split IN (...) lists into chunks below SQLite's historical 999-variable limit
+SQLITE_MAX_IN_PARAMS = 900
+SERVICE_CALL_BATCH_LIMIT = int(os.environ.get("SERVICE_CALL_BATCH_LIMIT", "500")) # Max IDs per batch request
+
+# Service note search (see search_service_notes)
+NOTE_SEARCH_PAGE_SIZE = 20
+NOTE_SEARCH_MAX_PAGE_SIZE = 100
+
+# How long save_quote remembers an Idempotency-Key (seconds)
+QUOTE_IDEMPOTENCY_TTL = int(os.environ.get("QUOTE_IDEMPOTENCY_TTL", str(24 * 3600)))
+
+# Bulk NDJSON quote import/export
+QUOTE_IMPORT_BATCH_SIZE = int(os.environ.get("QUOTE_IMPORT_BATCH_SIZE", "500")) # Records per transaction
+QUOTE_IMPORT_MAX_ERRORS = 1000 # Per-record errors listed in an import response (the count is always exact)
+QUOTE_EXPORT_PAGE_SIZE = 500
+
+# Quote listing (keyset pagination)
+QUOTE_LIST_PAGE_SIZE = 50
+QUOTE_LIST_MAX_PAGE_SIZE = 200
+
+# Parts typeahead (see PartsIndex)
+PARTS_AUTOCOMPLETE_LIMIT = 10
+PARTS_AUTOCOMPLETE_MAX_LIMIT = 50
+PARTS_AUTOCOMPLETE_CACHE_SIZE = int(os.environ.get("PARTS_AUTOCOMPLETE_CACHE_SIZE", "2048"))
+PARTS_AUTOCOMPLETE_CACHE_TTL = int(os.environ.get("PARTS_AUTOCOMPLETE_CACHE_TTL", "300"))
+
+# Inspection photo uploads are stored under their SHA-256 (see INSPECTION PHOTOS) and
+# thumbnailed by background threads, PHOTO_WORKER_THREADS per gunicorn worker.
+PHOTO_STORAGE_DIR = os.environ.get("PHOTO_STORAGE_DIR", os.path.join(os.path.dirname(SQLITE_DB_NAME), "photos"))
+PHOTO_MAX_BYTES = int(os.environ.get("PHOTO_MAX_BYTES", str(25 * 1024 * 1024)))
+PHOTO_UPLOAD_CHUNK_SIZE = 256 * 1024
+PHOTO_THUMBNAIL_SIZE = int(os.environ.get("PHOTO_THUMBNAIL_SIZE", "320"))   # Longest edge, in pixels
+PHOTO_PREVIEW_SIZE = int(os.environ.get("PHOTO_PREVIEW_SIZE", "1600"))
+PHOTO_WORKER_THREADS = int(os.environ.get("PHOTO_WORKER_THREADS", "2"))
+PHOTO_POLL_INTERVAL = float(os.environ.get("PHOTO_POLL_INTERVAL", "2.0"))    # Seconds between checks for queued photos
+PHOTO_STALE_AFTER = int(os.environ.get("PHOTO_STALE_AFTER", "300"))          # Reclaim 'running' photos older than this
+
+# Per-worker cache of GET /api/checklists/<id> payloads, stamped with checklist_version
+CHECKLIST_CACHE_SIZE = int(os.environ.get("CHECKLIST_CACHE_SIZE", "256"))
+CHECKLIST_CACHE_TTL = int(os.environ.get("CHECKLIST_CACHE_TTL", "3600"))
+
+# Per-worker cache of assembled /api/service-call payloads
+SERVICE_CALL_CACHE_SIZE = int(os.environ.get("SERVICE_CALL_CACHE_SIZE", "1024"))
+SERVICE_CALL_CACHE_TTL = int(os.environ.get("SERVICE_CALL_CACHE_TTL", "300")) # Seconds; bounds warranty-status drift
+
+# Request, SQL and LLM metrics (see METRICS), served at /metrics for Prometheus
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+METRICS_SLOW_QUERY_MS = float(os.environ.get("METRICS_SLOW_QUERY_MS", "100"))      # Log SQLite calls slower than this
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))      # Seconds between snapshots per worker
+METRICS_WORKER_RETENTION = int(os.environ.get("METRICS_WORKER_RETENTION", "86400")) # Retire snapshots of workers gone this long
+
 app = Flask(__name__)
 
 # Enable CORS to allow the HTML file (served from file:// or localhost) to make requests
 CORS(app)
 
+# --- METRICS ---
+# Each worker counts requests, SQL statements and LLM calls in memory (a lock and a bisect per
+# event), and a background thread upserts a snapshot into the metrics_worker table every
+# METRICS_FLUSH_INTERVAL seconds. /metrics sums every worker's snapshot, so any worker can answer
+# a scrape. The snapshots of workers gone for METRICS_WORKER_RETENTION are folded into a
+# 'retired' row rather than deleted, so the summed counters never go down when gunicorn replaces
+# a worker (Prometheus would read that as a counter reset). Latencies are fixed-bucket
+# histograms because buckets add up across workers and percentiles don't; p50/p95/p99 are
+# estimated from the merged buckets (as Prometheus' histogram_quantile does).
+
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LLM_BUCKETS = (0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 90.0)
+
+METRICS = { # name: (type, help, buckets)
+    "quote_api_http_requests_total": ("counter", "HTTP requests by route, method and status.", None),
+    "quote_api_http_request_duration_seconds": ("histogram", "Time to serve a request, including streamed bodies.", REQUEST_BUCKETS),
+    "quote_api_sqlite_query_duration_seconds": ("histogram", "Time spent in SQLite execute() and commit() calls.", SQL_BUCKETS),
+    "quote_api_sqlite_slow_queries_total": ("counter", f"SQLite calls slower than {METRICS_SLOW_QUERY_MS} ms.", None),
+    "quote_api_llm_requests_total": ("counter", "LLM completions by kind and outcome.", None),
+    "quote_api_llm_request_duration_seconds": ("histogram", "Time taken by LLM completions that reached the LLM.", LLM_BUCKETS),
+}
+
+SQL_OPERATION_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+"?([\w.]+)', re.IGNORECASE)
+
+@functools.lru_cache(maxsize=2048)
+def describe_sql(sql):
+    """Returns (operation, table, normalized SQL) for a statement; literals and IN lists are collapsed."""
+    normalized = " ".join(sql.split())
+    normalized = re.sub(r"'(?:[^']|'')*'", "?", normalized)
+    normalized = re.sub(r"\b\d+(?:\.\d+)?\b", "?", normalized)
+    normalized = re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", normalized)
+    operation = normalized.split(" ", 1)[0].lower() if normalized else "-"
+    table = SQL_OPERATION_TABLE.search(normalized)
+    return operation, table.group(1).lower() if table else "-", normalized
+
+def prometheus_escape(value):
+    """Escapes a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metrics:
+    """Per-worker counters and histograms, merged across workers through the metrics_worker table."""
+
+    RETIRED = "retired" # metrics_worker row holding the totals of workers that are gone
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self._flusher_pid = None
+        self.slow_queries = deque(maxlen=50) # This worker's most recent slow queries, newest last
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.worker_id = f"{self._pid}-{uuid.uuid4().hex[:8]}"
+        self._series = {} # (name, labels) -> counter value, or [count per bucket..., count over the last bucket, sum]
+
+    def _check_fork(self):
+        # With --preload the master imports (and queries) before forking; start each worker from zero
+        if self._pid != os.getpid():
+            self._reset()
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._check_fork()
+            self._series[name, labels] = self._series.get((name, labels), 0) + value
+
+    def observe(self, name, labels, seconds):
+        buckets = METRICS[name][2]
+        with self._lock:
+            self._check_fork()
+            series = self._series.get((name, labels))
+            if series is None:
+                series = self._series[name, labels] = [0] * (len(buckets) + 2)
+            series[bisect.bisect_left(buckets, seconds)] += 1
+            series[-1] += seconds
+
+    def observe_sql(self, sql, seconds):
+        operation, table, normalized = describe_sql(sql)
+        labels = (("operation", operation), ("table", table))
+        self.observe("quote_api_sqlite_query_duration_seconds", labels, seconds)
+        if seconds * 1000 >= METRICS_SLOW_QUERY_MS:
+            caller = sys._getframe(2) # Our caller is PooledConnection.execute; its caller issued the SQL
+            where = f"{caller.f_code.co_name} (line {caller.f_lineno})"
+            self.inc("quote_api_sqlite_slow_queries_total", labels)
+            self.slow_queries.append({"sql": normalized, "caller": where, "ms": round(seconds * 1000, 1), "at": time.time()})
+            print(f"⚠️ Slow query ({seconds * 1000:.0f} ms) in {where}: {normalized[:300]}")
+
+    def snapshot(self):
+        with self._lock:
+            self._check_fork()
+            return [[name, list(labels), value if isinstance(value, (int, float)) else list(value)]
+                    for (name, labels), value in self._series.items()]
+
+    def ensure_flusher(self):
+        """Starts the thread that saves this worker's snapshot. Threads don't survive a fork, so this is checked per PID."""
+        if not METRICS_ENABLED or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_periodically, name="metrics-flusher", daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            self.flush()
+
+    @staticmethod
+    def merge_snapshots(snapshots):
+        """Sums snapshots (lists of [name, labels, value]) into {(name, labels): value}."""
+        merged = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot:
+                if name not in METRICS:
+                    continue # Written by another version of this file
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if isinstance(value, list):
+                    total = merged.setdefault(key, [0] * len(value))
+                    if len(total) == len(value): # Bucket layouts differ across versions; skip the odd one out
+                        merged[key] = [a + b for a, b in zip(total, value)]
+                else:
+                    merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def flush(self):
+        """
+        Writes this worker's snapshot to metrics_worker, and folds the snapshots of workers that
+        haven't written one for METRICS_WORKER_RETENTION into the retired row.
+        """
+        snapshot = json.dumps(self.snapshot())
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.execute(
+                    """INSERT INTO metrics_worker (worker, snapshot, updated_at) VALUES (?, ?, ?)
+                       ON CONFLICT (worker) DO UPDATE SET snapshot = excluded.snapshot, updated_at = excluded.updated_at""",
+                    (self.worker_id, snapshot, now)
+                )
+                stale = conn.execute(
+                    "SELECT worker, snapshot FROM metrics_worker WHERE updated_at < ? AND worker != ?",
+                    (now - METRICS_WORKER_RETENTION, self.RETIRED)
+                ).fetchall()
+                if stale:
+                    retired = conn.execute("SELECT snapshot FROM metrics_worker WHERE worker = ?", (self.RETIRED,)).fetchone()
+                    totals = self.merge_snapshots(
+                        [json.loads(row['snapshot']) for row in stale] + ([json.loads(retired['snapshot'])] if retired else [])
+                    )
+                    conn.execute(
+                        """INSERT INTO metrics_worker (worker, snapshot, updated_at) VALUES (?, ?, ?)
+                           ON CONFLICT (worker) DO UPDATE SET snapshot = excluded.snapshot, updated_at = excluded.updated_at""",
+                        (self.RETIRED, json.dumps([[name, list(labels), value] for (name, labels), value in totals.items()]), now)
+                    )
+                    conn.executemany("DELETE FROM metrics_worker WHERE worker = ?", [(row['worker'],) for row in stale])
+        except sqlite3.Error as e:
+            print(f"⚠️ Could not save metrics: {e}")
+        finally:
+            release_db_connection(conn)
+
+    def merged(self):
+        """
+        Returns ({(name, labels): value}, worker_count) summed over every worker's latest snapshot,
+        with this worker's current figures in place of its saved ones. Only reads the database.
+        """
+        own = self.snapshot() # Taken first; it resets the worker ID if we were just forked
+        conn = get_db_connection()
+        try:
+            rows = conn.execute("SELECT worker, snapshot FROM metrics_worker WHERE worker != ?", (self.worker_id,)).fetchall()
+        finally:
+            release_db_connection(conn)
+        merged = self.merge_snapshots([json.loads(row['snapshot']) for row in rows] + [own])
+        return merged, sum(1 for row in rows if row['worker'] != self.RETIRED) + 1
+
+    @staticmethod
+    def quantile(q, buckets, series):
+        """Estimates a quantile from per-bucket counts by interpolating within the bucket that holds it."""
+        count = sum(series[:-1])
+        if not count:
+            return None
+        rank, seen = q * count, 0
+        for i, bound in enumerate(buckets):
+            if seen + series[i] >= rank:
+                lower = buckets[i - 1] if i else 0.0
+                return lower + (bound - lower) * ((rank - seen) / series[i] if series[i] else 0)
+            seen += series[i]
+        return buckets[-1] # In the overflow bucket; the largest bound is all we know
+
+    def render(self):
+        """Formats the merged metrics in the Prometheus text exposition format."""
+        merged, worker_count = self.merged()
+        def label_text(labels, extra=()):
+            pairs = [f'{key}="{prometheus_escape(value)}"' for key, value in (*labels, *extra)]
+            return "{" + ",".join(pairs) + "}" if pairs else ""
+        lines = ["# HELP quote_api_metrics_workers Worker snapshots included in these metrics.",
+                 "# TYPE quote_api_metrics_workers gauge", f"quote_api_metrics_workers {worker_count}"]
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            for (series_name, labels), value in sorted(merged.items()):
+                if series_name != name:
+                    continue
+                if kind == "counter":
+                    lines.append(f"{name}{label_text(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip((*buckets, "+Inf"), value[:-1]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{label_text(labels, (('le', bound),))} {cumulative}")
+                lines.append(f"{name}_sum{label_text(labels)} {value[-1]}")
+                lines.append(f"{name}_count{label_text(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Per-series counts and p50/p95/p99 estimates for every histogram, merged across workers."""
+        merged, worker_count = self.merged()
+        histograms = {}
+        for (name, labels), value in sorted(merged.items()):
+            buckets = METRICS[name][2]
+            if buckets is None:
+                continue
+            count = sum(value[:-1])
+            histograms.setdefault(name, []).append(dict(
+                labels, count=count, avg=value[-1] / count if count else None,
+                **{f"p{int(q * 100)}": self.quantile(q, buckets, value) for q in (0.5, 0.95, 0.99)}
+            ))
+        return {"workers": worker_count, "histograms": histograms}
+
+metrics = Metrics()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    if not METRICS_ENABLED or 'request_started' not in g:
+        return response
+    started = g.request_started
+    method = request.method
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched" # Templated, so label values stay few
+    status = str(response.status_code)
+
+    def record():
+        # Runs once the body has been sent, so streamed exports and SSE count their full duration
+        metrics.inc("quote_api_http_requests_total", (("method", method), ("route", route), ("status", status)))
+        metrics.observe("quote_api_http_request_duration_seconds", (("method", method), ("route", route)),
+                        time.perf_counter() - started)
+    response.call_on_close(record)
+    return response
+
+def record_llm_call(kind, outcome, seconds=None):
+    """Counts one LLM completion ("completion" or "stream") and, if it reached the LLM, its latency."""
+    if not METRICS_ENABLED:
+        return
+    metrics.inc("quote_api_llm_requests_total", (("kind", kind), ("outcome", outcome)))
+    if seconds is not None:
+        metrics.observe("quote_api_llm_request_duration_seconds", (("kind", kind), ("outcome", outcome)), seconds)
+
+class PooledConnection(sqlite3.Connection):
+    """
+    A connection that remembers which ERP snapshot it has attached. execute(), executemany()
+    and commit() are timed for the metrics (sqlite3's trace callback reports when a statement
+    starts but not how long it ran). Time spent fetching rows after the first is not included.
+    """
+    snapshot = None       # (inode, mtime_ns, size) of the attached snapshot, or None for the legacy layout
+    erp_generation = 0    # Generation recorded in the snapshot by test_data.py
+
+    def execute(self, sql, parameters=()):
+        if not METRICS_ENABLED:
+            return super().execute(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        if not METRICS_ENABLED:
+            return super().executemany(sql, seq_of_parameters)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            metrics.observe_sql(sql, time.perf_counter() - started)
+
+    def commit(self):
+        if not METRICS_ENABLED:
+            return super().commit()
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            metrics.observe_sql("COMMIT", time.perf_counter() - started)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # "with conn:" commits or rolls back in C without going through commit() above
+        if not METRICS_ENABLED:
+            return super().__exit__(exc_type, exc_value, traceback)
+        started = time.perf_counter()
+        try:
+            return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            metrics.observe_sql("COMMIT" if exc_type is None else "ROLLBACK", time.perf_counter() - started)
+
+class SQLiteConnectionPool:
+    """
+    A small per-process pool of tuned SQLite connections.
+    Connections are opened in WAL mode so readers never wait on a writer, and are
+    handed back to the pool after each request instead of being closed.
+
+    Each connection also attaches the ERP snapshot as "erp". The snapshot file is never
+    modified in place: test_data.py renames a complete new file over it. The pool polls the
+    file's identity, and once it changes, connections still on the old snapshot are closed
+    on release instead of being reused. Requests already running finish against the old
+    file (its inode stays readable until the last handle is closed), so nobody waits.
+    """
+
+    def __init__(self, db_path, max_idle, erp_path):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.erp_path = erp_path
+        self._lock = threading.Lock()
+        self._idle = []  # Used as a stack so the most recently used (warmest) connection is reused first
+        self._pid = os.getpid()
+        self._snapshot = self._snapshot_identity()
+        self._snapshot_checked_at = time.monotonic()
+        self._stats = {"opened": 0, "reused": 0, "closed": 0, "in_use": 0, "snapshot_reloads": 0}
+
+    def _snapshot_identity(self):
+        try:
+            st = os.stat(self.erp_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _connect(self, snapshot):
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               uri=True, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row # This allows accessing columns by name
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+        conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys = ON") # Required for the ON DELETE CASCADE clauses in schema.sql
+        if snapshot is not None:
+            # immutable=1: the file never changes under us, so SQLite can skip locking entirely
+            conn.execute("ATTACH DATABASE ? AS erp", (pathlib.Path(self.erp_path).resolve().as_uri() + "?immutable=1",))
+            metadata = dict(conn.execute("SELECT key, value FROM erp.snapshot_metadata").fetchall())
+            conn.erp_generation = int(metadata.get("generation", 0))
+            if int(metadata.get("schema_version", 0)) != ERP_SCHEMA_VERSION:
+                print(f"⚠️ ERP snapshot schema version {metadata.get('schema_version')} does not match "
+                      f"the expected version {ERP_SCHEMA_VERSION}. Rebuild it with 'python test_data.py --full'.")
+        else:
+            # Legacy layout: the ERP tables still live in the application database itself
+            conn.execute("ATTACH DATABASE ? AS erp", (pathlib.Path(self.db_path).resolve().as_uri() + "?mode=ro",))
+        conn.execute(f"PRAGMA erp.cache_size = {SQLITE_CACHE_SIZE}")
+        conn.snapshot = snapshot
+        return conn
+
+    def _check_fork(self):
+        # Connections must never be shared across processes. If gunicorn forked us after
+        # the pool was populated, drop the inherited connections without touching them.
+        if self._pid != os.getpid():
+            self._idle = []
+            self._pid = os.getpid()
+            self._stats = {"opened": 0, "reused": 0, "closed": 0, "in_use": 0, "snapshot_reloads": 0}
+
+    def _check_snapshot(self):
+        """Called with the lock held. Returns idle connections made stale by a snapshot swap."""
+        now = time.monotonic()
+        if now - self._snapshot_checked_at < ERP_RELOAD_CHECK_INTERVAL:
+            return []
+        self._snapshot_checked_at = now
+        snapshot = self._snapshot_identity()
+        if snapshot == self._snapshot:
+            return []
+        print(f"✅ ERP snapshot '{self.erp_path}' changed; new requests will use it.")
+        self._snapshot = snapshot
+        self._stats["snapshot_reloads"] += 1
+        stale, self._idle = self._idle, []
+        self._stats["closed"] += len(stale)
+        return stale
+
+    def acquire(self):
+        """Returns a warm connection from the pool, opening a new one if none are idle."""
+        with self._lock:
+            self._check_fork()
+            stale = self._check_snapshot()
+            conn = self._idle.pop() if self._idle else None
+            self._stats["reused" if conn else "opened"] += 1
+            self._stats["in_use"] += 1
+            snapshot = self._snapshot
+        for old in stale:
+            old.close()
+        return conn or self._connect(snapshot)
+
+    def release(self, conn):
+        """Hands a connection back to the pool, closing it if the pool is full or its snapshot is stale."""
+        try:
+            if conn.in_transaction:
+                conn.rollback() # Never hand out a connection with a half-finished transaction
+        except sqlite3.Error:
+            conn.close()
+            with self._lock:
+                self._stats["in_use"] -= 1
+                self._stats["closed"] += 1
+            return
+        with self._lock:
+            self._stats["in_use"] -= 1
+            if self._pid == os.getpid() and len(self._idle) < self.max_idle and conn.snapshot == self._snapshot:
+                self._idle.append(conn)
+                return
+            self._stats["closed"] += 1
+        conn.close()
+
+    def close_all(self):
+        """Closes every idle connection. Connections currently checked out are closed on release."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._stats["closed"] += len(idle)
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, idle=len(self._idle), max_idle=self.max_idle, pid=self._pid,
+                        erp_path=self.erp_path, erp_layout="snapshot" if self._snapshot else "legacy")
+
+db_pool = SQLiteConnectionPool(SQLITE_DB_NAME, SQLITE_POOL_SIZE, ERP_DB_NAME)
+
 def get_db_connection():
-    """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(SQLITE_DB_NAME)
-    conn.row_factory = sqlite3.Row # This allows accessing columns by name
-    return conn
-
-def format_warranty(exp_date_str):
-    """Formats the warranty status based on the expiration date."""
-    if not exp_date_str or '1900' in exp_date_str:
+    """Checks out a pooled connection to the SQLite database. Pair with release_db_connection()."""
+    return db_pool.acquire()
+
+def release_db_connection(conn):
+    """Returns a connection obtained from get_db_connection() to the pool."""
+    db_pool.release(conn)
+
+class LRUCache:
+    """
+    A thread-safe, size-bounded LRU cache with a time-to-live.
+    Each entry carries a stamp; a lookup with a different stamp counts as a miss,
+    so callers can validate entries against a cheap version check in the DB.
+    """
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, stamp, expires_at)
+        self._generation = None
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key, stamp=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, entry_stamp, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            if entry_stamp != stamp:
+                del self._entries[key]
+                self._stats["invalidations"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key, value, stamp=None):
+        with self._lock:
+            self._entries[key] = (value, stamp, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def check_generation(self, generation):
+        """Drops every entry when the underlying data set (e.g. the ERP snapshot) changes."""
+        with self._lock:
+            if generation == self._generation:
+                return
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+            self._generation = generation
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats, size=len(self._entries), max_entries=self.max_entries,
+                ttl_seconds=self.ttl_seconds, hit_rate=round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            )
+
+service_call_cache = LRUCache(SERVICE_CALL_CACHE_SIZE, SERVICE_CALL_CACHE_TTL)
+checklist_cache = LRUCache(CHECKLIST_CACHE_SIZE, CHECKLIST_CACHE_TTL)
+
+def format_warranty(expires):
+    """Formats the warranty status from the ISO expiration date stored in service_call_snapshot."""
+    if not expires:
         return "N/A"
     try:
-        exp_date = datetime.strptime(exp_date_str, '%Y-%m-%d %H:%M:%S')
-        if exp_date > datetime.now():
-            return f"Active until {exp_date.strftime('%m/%Y')}"
-        else:
-            return f"Expired on {exp_date.strftime('%m/%Y')}"
-    except (ValueError, TypeError):
+        exp_date = date.fromisoformat(expires)
+    except ValueError: # Stored as 'invalid' when the ERP value couldn't be parsed
         return "Invalid Date"
+    if exp_date > date.today():
+        return f"Active until {exp_date.strftime('%m/%Y')}"
+    else:
+        return f"Expired on {exp_date.strftime('%m/%Y')}"
 
 def to_float(value, default=0.0):
     """Safely converts a value to a float, returning a default if conversion fails."""
@@ -41,106 +651,410 @@ def to_float(value, default=0.0):
     except (ValueError, TypeError):
         return default
 
+# --- HOT QUERIES ---
+# These are shared by the routes below and by find_query_plan_scans(), so the plan
+# check always tests exactly the SQL that runs in production.
+SQL_SERVICE_CALL_SNAPSHOT = "SELECT * FROM erp.service_call_snapshot WHERE call_id IN ({placeholders})"
+SQL_QUOTE_REVISIONS = """SELECT TRIM(q.service_call_id) AS call_id, q.id, q.revision, q.description, q.tech_count, q.tech_hours,
+                      q.travel_hours, q.tech_rate, q.travel_rate
+               FROM quote q
+               WHERE TRIM(q.service_call_id) IN ({placeholders}) ORDER BY q.revision ASC"""
+SQL_EXISTING_REVISION = "SELECT id FROM quote WHERE TRIM(service_call_id) = ? AND revision = ?"
+SQL_QUOTE_PARTS = """
+                SELECT quote_id, part_number as part, description as "desc", vendor, 
+                       quantity as qty, unit_cost as unitCost 
+                FROM quote_line_item WHERE quote_id IN ({placeholders})
+            """
+SQL_INSERT_QUOTE = """INSERT INTO quote (service_call_id, revision, description, customer_name, status,
+                                     tech_count, tech_hours, travel_hours, tech_rate, travel_rate)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+# Writes the header only if some field differs (IS NOT treats NULLs as comparable values)
+SQL_UPDATE_QUOTE_IF_CHANGED = """UPDATE quote SET description = ?, customer_name = ?, status = ?, tech_count = ?, tech_hours = ?,
+                      travel_hours = ?, tech_rate = ?, travel_rate = ?
+               WHERE id = ? AND (description, customer_name, status, tech_count, tech_hours, travel_hours, tech_rate, travel_rate)
+                                IS NOT (?, ?, ?, ?, ?, ?, ?, ?)"""
+SQL_INSERT_QUOTE_CHILD = {
+    "quote_line_item": """INSERT INTO quote_line_item (quote_id, part_number, description, vendor, on_hand, quantity, unit_cost, total_cost)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+    "subcontractor": """INSERT INTO subcontractor (quote_id, contact_name, contact_details, cost)
+                   VALUES (?, ?, ?, ?)""",
+}
+# Bulk import writes quotes with IDs it assigned itself, so a whole batch goes in with executemany
+SQL_NEXT_QUOTE_ID = """SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'quote'), 0),
+                          COALESCE((SELECT MAX(id) FROM quote), 0)) + 1"""
+SQL_IMPORT_QUOTE = """INSERT INTO quote (id, service_call_id, revision, description, customer_name, status,
+                                     tech_count, tech_hours, travel_hours, tech_rate, travel_rate, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))"""
+SQL_EXPORT_QUOTES = """SELECT id, TRIM(service_call_id) AS service_call_id, revision, description, customer_name, status,
+                      tech_count, tech_hours, travel_hours, tech_rate, travel_rate, created_at
+               FROM quote WHERE id > ? ORDER BY id LIMIT ?"""
+SQL_EXPORT_PARTS = """SELECT quote_id, part_number, description, vendor, on_hand, quantity, unit_cost FROM quote_line_item
+               WHERE quote_id IN ({placeholders}) ORDER BY quote_id, id"""
+SQL_EXPORT_SUBCONTRACTORS = """SELECT quote_id, contact_name, contact_details, cost FROM subcontractor
+               WHERE quote_id IN ({placeholders}) ORDER BY quote_id, id"""
+SQL_SAVED_QUOTE_REQUEST = "SELECT request_hash, response FROM quote_save_request WHERE key = ?"
+SQL_SAVE_QUOTE_REQUEST = "INSERT INTO quote_save_request (key, request_hash, response, created_at) VALUES (?, ?, ?, ?)"
+SQL_ON_HAND_TOTALS = "SELECT TRIM(ITEMNMBR), SUM(QTYONHND) FROM erp.iv00102_item_quantity_all GROUP BY TRIM(ITEMNMBR)"
+# Quote listing, one page per query. {where} always ends with the keyset condition, e.g.
+# "(q.created_at, q.id) < (?, ?)"; quote_totals is driven first when sorting by total.
+SQL_LIST_QUOTES_BY_CREATED = """SELECT q.id, TRIM(q.service_call_id) AS service_call_id, q.revision, q.customer_name, q.status,
+                      q.created_at, t.parts_total, t.subcontractor_total, t.labor_total, t.total
+               FROM quote q JOIN quote_totals t ON t.quote_id = q.id
+               WHERE {where} ORDER BY q.created_at {direction}, q.id {direction} LIMIT ?"""
+SQL_LIST_QUOTES_BY_TOTAL = """SELECT q.id, TRIM(q.service_call_id) AS service_call_id, q.revision, q.customer_name, q.status,
+                      q.created_at, t.parts_total, t.subcontractor_total, t.labor_total, t.total
+               FROM quote_totals t CROSS JOIN quote q ON q.id = t.quote_id
+               WHERE {where} ORDER BY t.total {direction}, t.quote_id {direction} LIMIT ?"""
+SQL_COUNT_QUOTES = "SELECT COUNT(*) FROM quote q JOIN quote_totals t ON t.quote_id = q.id WHERE {where}"
+# PartsIndex's view of quote lines: the change log position, the parts changed since a position,
+# the whole history (on a rebuild), and one part's most recent line (on a merge)
+SQL_PART_CHANGE_SEQ = "SELECT MAX(seq) FROM quote_line_part_change"
+SQL_PART_CHANGES = "SELECT seq, part_number FROM quote_line_part_change WHERE seq > ? AND seq <= ? ORDER BY seq"
+SQL_QUOTE_LINE_HISTORY = """SELECT TRIM(part_number), description, vendor, unit_cost FROM quote_line_item
+               WHERE TRIM(COALESCE(part_number, '')) != '' ORDER BY id"""
+SQL_PART_LATEST_LINE = """SELECT description, vendor, unit_cost FROM quote_line_item
+               WHERE TRIM(part_number) = ? ORDER BY id DESC LIMIT 1"""
+SQL_QUOTE_SUBCONTRACTORS = "SELECT quote_id, contact_name, contact_details, cost FROM subcontractor WHERE quote_id IN ({placeholders})"
+SQL_SERVICE_CALL_STAMP = "SELECT version FROM service_call_version WHERE service_call_id = ?"
+SQL_CHECKLIST_VERSION = "SELECT version FROM checklist_version WHERE checklist_id = ?"
+SQL_CHECKLIST = "SELECT id, name, description, updated_at FROM checklists WHERE id = ?"
+SQL_CHECKLIST_ITEMS = """SELECT id, item_text, category, is_required, display_order FROM inspection_checklist_items
+               WHERE checklist_id = ? ORDER BY display_order ASC, id ASC"""
+SQL_ITEM_RESULT_COUNTS = """SELECT r.checklist_item_id, r.status, COUNT(*) FROM inspections i
+               JOIN inspection_results r ON r.inspection_id = i.id
+               WHERE i.checklist_id = :checklist AND i.inspection_date >= :from AND i.inspection_date < :to
+                 AND (:inspector IS NULL OR i.inspector_name = :inspector)
+               GROUP BY r.checklist_item_id, r.status"""
+SQL_INSPECTION_COUNT = """SELECT COUNT(*) FROM inspections
+               WHERE checklist_id = :checklist AND inspection_date >= :from AND inspection_date < :to
+                 AND (:inspector IS NULL OR inspector_name = :inspector)"""
+SQL_ITEM_RESULT_ROLLUP_COUNTS = """SELECT checklist_item_id, status, SUM(result_count) FROM inspection_item_result_rollup
+               WHERE checklist_id = ? AND month BETWEEN ? AND ? GROUP BY checklist_item_id, status"""
+SQL_INSPECTION_ROLLUP_COUNT = """SELECT COALESCE(SUM(inspection_count), 0) FROM dashboard_inspection_rollup
+               WHERE month BETWEEN ? AND ? AND checklist_id = ?"""
+SQL_BUMP_SERVICE_CALL_VERSION = """INSERT INTO service_call_version (service_call_id, version) VALUES (?, 1)
+               ON CONFLICT(service_call_id) DO UPDATE SET version = version + 1"""
+
+# Full-text search over service_note. Matches are grouped per service call and ranked by the
+# call's best-scoring note (bm25; lower is better). Snippets are only made for the page shown.
+SQL_SEARCH_NOTES = """
+    WITH hits AS (
+        SELECT n.call_id, n.id AS note_id, n.note_type, f.rank AS score
+        FROM erp.service_note_fts f JOIN erp.service_note n ON n.id = f.rowid
+        WHERE f.service_note_fts MATCH :query
+          AND (:customer IS NULL OR n.customer = :customer)
+          AND (:technician IS NULL OR n.technician = :technician)
+    )
+    SELECT h.call_id, MIN(h.score) AS score, h.note_id, h.note_type, COUNT(*) AS matches, s.customer_name
+    FROM hits h LEFT JOIN erp.service_call_snapshot s ON s.call_id = h.call_id
+    GROUP BY h.call_id ORDER BY score, h.call_id LIMIT :limit OFFSET :offset
+"""
+SQL_NOTE_SNIPPETS = """SELECT rowid, snippet(service_note_fts, 0, '[', ']', '…', 12) FROM erp.service_note_fts
+               WHERE service_note_fts MATCH ? AND rowid IN ({placeholders})"""
+
+# (sql, sample parameters) pairs checked by find_query_plan_scans().
+HOT_QUERIES = [
+    (SQL_SERVICE_CALL_SNAPSHOT.format(placeholders="?,?"), ("250000", "250001")),
+    (SQL_QUOTE_REVISIONS.format(placeholders="?,?"), ("250000", "250001")),
+    (SQL_EXISTING_REVISION, ("250000", 1)),
+    (SQL_QUOTE_PARTS.format(placeholders="?,?"), (1, 2)),
+    (SQL_QUOTE_SUBCONTRACTORS.format(placeholders="?,?"), (1, 2)),
+    (SQL_SERVICE_CALL_STAMP, ("250000",)),
+    (SQL_PART_CHANGE_SEQ, ()),
+    (SQL_PART_CHANGES, (0, 100)),
+    (SQL_PART_LATEST_LINE, ("FILT-00001",)),
+    (SQL_CHECKLIST_VERSION, (1,)),
+    (SQL_CHECKLIST_ITEMS, (1,)),
+    (SQL_ITEM_RESULT_COUNTS, {"checklist": 1, "from": "2024-01-01", "to": "2024-04-01", "inspector": None}),
+    (SQL_INSPECTION_COUNT, {"checklist": 1, "from": "2024-01-01", "to": "2024-04-01", "inspector": None}),
+    (SQL_ITEM_RESULT_ROLLUP_COUNTS, (1, "2024-01", "2024-03")),
+    (SQL_INSPECTION_ROLLUP_COUNT, ("2024-01", "2024-03", 1)),
+    (SQL_LIST_QUOTES_BY_CREATED.format(where="q.status = ? AND (q.created_at, q.id) < (?, ?)", direction="DESC"),
+     ("Draft", "2030-01-01", 0, 50)),
+    (SQL_LIST_QUOTES_BY_TOTAL.format(where="(t.total, t.quote_id) < (?, ?)", direction="DESC"), (1e12, 0, 50)),
+]
+
+def find_query_plan_scans(conn):
+    """
+    Runs EXPLAIN QUERY PLAN over every hot query and returns a list of
+    (sql, plan_detail) tuples for any step that falls back to a full scan.
+    Queries against tables that don't exist yet are reported as well.
+    """
+    scans = []
+    for sql, params in HOT_QUERIES:
+        try:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+        except sqlite3.OperationalError as e:
+            scans.append((" ".join(sql.split()), f"ERROR: {e}"))
+            continue
+        for row in plan:
+            detail = row['detail']
+            if detail.startswith("SCAN") and detail != "SCAN CONSTANT ROW": # Scalar subqueries report a constant row
+                scans.append((" ".join(sql.split()), detail))
+    return scans
+
 def setup_database():
-    """Reads schema.sql and executes it to set up application tables if they don't exist."""
+    """
+    Reads schema.sql and executes it to set up application tables if they don't exist.
+    Every statement is idempotent, so it also adds any indexes missing from an existing DB.
+    """
     conn = get_db_connection()
     try:
-        # Check if our main 'quote' table exists. If not, run the schema.
+        # Check if our main 'quote' table exists. If not, announce the first-time setup.
         cursor = conn.cursor()
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='quote'")
-        if cursor.fetchone() is None:
+        is_new_database = cursor.fetchone() is None
+        if is_new_database:
             print("⚠️ Application tables not found. Initializing from schema.sql...")
-            with open('schema.sql', 'r') as f:
+        existing_tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+        has_rollups = all(table in existing_tables for table, _, _ in ROLLUPS[1:]) # quote_totals backfills itself
+        photo_columns = {row[1] for row in conn.execute("PRAGMA table_info(inspection_photos)")}
+        if photo_columns and 'content_hash' not in photo_columns:
+            # Added for API photo uploads; older databases get the (nullable) column here
+            conn.execute('ALTER TABLE "inspection_photos" ADD COLUMN "content_hash" TEXT')
+        with open('schema.sql', 'r') as f:
+            conn.executescript(f.read())
+        if not is_new_database and not has_rollups:
+            # The rollup triggers only see changes from now on; fill in everything saved before them
+            rebuild_rollups(conn)
+            print("✅ Built rollups from existing quotes and inspections.")
+        if db_pool.stats()["erp_layout"] == "legacy":
+            # No snapshot yet, so the ERP tables are read from this file; make sure they exist
+            print(f"⚠️ ERP snapshot '{ERP_DB_NAME}' not found; reading ERP tables from '{SQLITE_DB_NAME}'. "
+                  "Run test_data.py to build the snapshot.")
+            with open('erp_schema.sql', 'r') as f:
                 conn.executescript(f.read())
+        if is_new_database:
             print("✅ Database schema initialized successfully.")
+
+        for sql, detail in find_query_plan_scans(conn):
+            print(f"⚠️ Hot query is not using an index ({detail}): {sql}")
     finally:
-        conn.close()
+        release_db_connection(conn)
 
-@app.route('/api/service-call/<service_call_id>')
-def get_service_call_data(service_call_id):
+class ReferenceData:
     """
-    Fetches all necessary data for a given service call ID from the SQLite DB
-    and formats it for the quote sheet frontend.
+    Small, read-mostly ERP lookup data held in memory by each worker: on-hand quantity per
+    item, summed over every location (LOCNCODE) row. It is loaded once per ERP snapshot;
+    with gunicorn --preload the master loads it before forking, so workers start out sharing
+    those pages. After a snapshot swap, each worker reloads on its next request.
     """
-    conn = get_db_connection()
-    try:
-        # --- 1. Fetch Base Service Call Details from ERP data ---
-        details_cursor = conn.execute(
-            "SELECT * FROM service_call_details WHERE TRIM(SV00300_Service_Call_ID) = ?",
-            (service_call_id.strip(),)
-        )
-        details = details_cursor.fetchone()
 
-        # --- 2. Fetch saved revisions from local application DB ---
-        quote_cursor = conn.execute(
-            """SELECT q.id, q.revision, q.description, q.tech_count, q.tech_hours, q.travel_hours, q.tech_rate, q.travel_rate
-               FROM quote q
-               WHERE TRIM(q.service_call_id) = ? ORDER BY q.revision ASC""",
-            (service_call_id.strip(),)
-        )
-        saved_quotes = quote_cursor.fetchall()
- 
-        # --- 3. Validate if any data exists for this ID ---
-        # If the ID is not in the ERP data and has no saved revisions, it's not found.
-        if not details and not saved_quotes:
-            return jsonify({"error": "Service Call ID not found"}), 404
-
-        # --- 4. Process saved revisions (if they exist) ---
-        revisions = []
-        # --- OPTIMIZATION: Solve N+1 query problem by fetching all children in two queries ---
-        quote_ids = [q['id'] for q in saved_quotes]
-        parts_by_quote_id = {}
-        subs_by_quote_id = {}
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_for = None  # (snapshot, generation) of the data currently held
+        self._on_hand = {}
+        self._stats = {"loads": 0, "last_load_seconds": None, "items": 0, "memory_bytes": 0, "erp_generation": None}
 
-        if quote_ids:
-            # Create placeholders for the IN clause, e.g., (?, ?, ?)
-            placeholders = ','.join('?' for _ in quote_ids)
+    def _ensure_current(self, conn):
+        key = (conn.snapshot, conn.erp_generation)
+        if key == self._loaded_for:
+            return
+        with self._lock:
+            if key == self._loaded_for:
+                return # Another thread reloaded while we waited
+            started = time.perf_counter()
+            on_hand = dict(conn.execute(SQL_ON_HAND_TOTALS).fetchall())
+            # Build the new dict completely, then swap it in, so readers never see a partial load
+            self._on_hand = on_hand
+            self._loaded_for = key
+            self._stats.update(
+                loads=self._stats["loads"] + 1, last_load_seconds=round(time.perf_counter() - started, 4),
+                items=len(on_hand), erp_generation=conn.erp_generation,
+                memory_bytes=sys.getsizeof(on_hand) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in on_hand.items()),
+            )
 
-            # Fetch all parts for all relevant quotes in one go
-            parts_sql = f"""
-                SELECT quote_id, part_number as part, description as "desc", vendor, 
-                       quantity as qty, unit_cost as unitCost 
-                FROM quote_line_item WHERE quote_id IN ({placeholders})
-            """
-            parts_cursor = conn.execute(parts_sql, quote_ids)
-            all_part_numbers = set()
-            for part_row in parts_cursor:
-                qid = part_row['quote_id']
-                if qid not in parts_by_quote_id:
-                    parts_by_quote_id[qid] = []
-                part_data = dict(part_row)
-                del part_data['quote_id']
-                parts_by_quote_id[qid].append(part_data)
-                all_part_numbers.add(part_data['part'])
-
-            # Fetch on-hand quantities for all unique parts
-            on_hand_quantities = {}
-            if all_part_numbers:
-                placeholders_parts = ','.join('?' for _ in all_part_numbers)
-                on_hand_sql = f"SELECT ITEMNMBR, QTYONHND FROM iv00102_item_quantity_all WHERE ITEMNMBR IN ({placeholders_parts})"
-                on_hand_cursor = conn.execute(on_hand_sql, list(all_part_numbers))
-                for row in on_hand_cursor:
-                    on_hand_quantities[row['ITEMNMBR']] = row['QTYONHND']
-
-            # Add on-hand quantity to each part
-            for qid in parts_by_quote_id:
-                for part in parts_by_quote_id[qid]:
-                    part['onHand'] = on_hand_quantities.get(part['part'], 'N/A')
-
-
-            # Fetch all subcontractors for all relevant quotes in one go
-            subs_sql = f"SELECT quote_id, contact_name, contact_details, cost FROM subcontractor WHERE quote_id IN ({placeholders})"
-            subs_cursor = conn.execute(subs_sql, quote_ids)
-            for sub_row in subs_cursor:
-                qid = sub_row['quote_id']
-                if qid not in subs_by_quote_id:
-                    subs_by_quote_id[qid] = []
-                sub_data = dict(sub_row)
-                del sub_data['quote_id'] # Don't need to send this to the frontend
-                subs_by_quote_id[qid].append(sub_data)
-
-        # Now, assemble the revisions using the pre-fetched data
-        for quote_row in saved_quotes:
+    def on_hand(self, conn):
+        """Returns {trimmed item number: total quantity on hand} for the snapshot conn is attached to."""
+        self._ensure_current(conn)
+        return self._on_hand
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pid=os.getpid())
+
+reference_data = ReferenceData()
+
+class PartsIndex:
+    """
+    A sorted, in-memory list of every known part number, for prefix (typeahead) lookups
+    by binary search. Part numbers come from ERP inventory (reference_data's on-hand totals)
+    and from saved quote lines, which also supply the most recently used description,
+    vendor and unit cost. The index is rebuilt when the ERP snapshot changes. Quote line
+    inserts, in-place edits and deletes by any worker are logged per part number in
+    quote_line_part_change, and only the parts logged since the last refresh are re-read.
+    The version goes up whenever the index's content changes, for stamping cached results.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._on_hand = None    # The reference_data.on_hand() dict the index was built from
+        self._last_change = 0   # seq of the last quote_line_part_change row applied
+        # (version, sorted (casefolded part number, part number) pairs,
+        #  part number -> (description, vendor, unit cost) from its latest quote line, on-hand totals),
+        # replaced as a whole so searches always see one consistent index
+        self._index = (0, [], {}, {})
+        self._stats = {"rebuilds": 0, "merges": 0, "last_rebuild_seconds": None, "last_merge_seconds": None}
+
+    def _rebuild(self, conn, on_hand, change_seq):
+        started = time.perf_counter()
+        history = {}
+        for part, description, vendor, unit_cost in conn.execute(SQL_QUOTE_LINE_HISTORY):
+            history[part] = (description, vendor, unit_cost) # Later lines win
+        entries = sorted((part.casefold(), part) for part in set(on_hand) | set(history))
+        self._index = (self._index[0] + 1, entries, history, on_hand)
+        self._on_hand, self._last_change = on_hand, change_seq
+        self._stats["rebuilds"] += 1
+        self._stats["last_rebuild_seconds"] = round(time.perf_counter() - started, 4)
+
+    def _merge(self, conn, changes, change_seq):
+        """Re-reads the latest quote line of each changed part. Copy on write, so searches never see it mid-update."""
+        started = time.perf_counter()
+        version, entries, history, on_hand = self._index
+        updated = False
+        for part in {part for _, part in changes}:
+            latest = conn.execute(SQL_PART_LATEST_LINE, (part,)).fetchone()
+            latest = tuple(latest) if latest is not None else None
+            if latest == history.get(part):
+                continue # e.g. only an older line of the part changed
+            if not updated:
+                history, updated = dict(history), True
+            if latest is None:
+                del history[part]
+            else:
+                history[part] = latest
+            if part not in on_hand:
+                # Inventory parts are always listed; others only while some quote line uses them
+                if entries is self._index[1]:
+                    entries = list(entries)
+                entry = (part.casefold(), part)
+                position = bisect.bisect_left(entries, entry)
+                listed = position < len(entries) and entries[position] == entry
+                if latest is None and listed:
+                    del entries[position]
+                elif latest is not None and not listed:
+                    entries.insert(position, entry)
+        if updated:
+            version += 1
+        self._index = (version, entries, history, on_hand)
+        self._last_change = change_seq
+        self._stats["merges"] += 1
+        self._stats["last_merge_seconds"] = round(time.perf_counter() - started, 4)
+
+    def refresh(self, conn, change_seq):
+        """
+        Brings the index up to date with the ERP snapshot conn is attached to and with the quote
+        line change log up to change_seq (read with SQL_PART_CHANGE_SEQ). Returns the index version.
+        """
+        on_hand = reference_data.on_hand(conn)
+        if on_hand is self._on_hand and change_seq == self._last_change:
+            return self._index[0]
+        with self._lock:
+            if on_hand is not self._on_hand or change_seq < self._last_change:
+                self._rebuild(conn, on_hand, change_seq) # New snapshot, or a new application database
+            elif change_seq > self._last_change:
+                changes = conn.execute(SQL_PART_CHANGES, (self._last_change, change_seq)).fetchall()
+                if not changes or changes[0][0] != self._last_change + 1:
+                    self._rebuild(conn, on_hand, change_seq) # Changes we haven't applied were pruned from the log
+                else:
+                    self._merge(conn, changes, change_seq)
+            return self._index[0]
+
+    def search(self, prefix, limit):
+        """
+        Returns (index version, up to limit parts whose number starts with prefix, case-insensitive,
+        in order). Call refresh() first.
+        """
+        version, entries, history, on_hand = self._index
+        key = prefix.casefold()
+        results = []
+        for i in range(bisect.bisect_left(entries, (key,)), len(entries)):
+            folded, part = entries[i]
+            if not folded.startswith(key) or len(results) >= limit:
+                break
+            description, vendor, unit_cost = history.get(part, (None, None, None))
+            results.append({
+                "part": part, "description": description, "vendor": vendor,
+                "unitCost": unit_cost, "onHand": on_hand.get(part, 'N/A')
+            })
+        return version, results
+
+    def stats(self):
+        with self._lock:
+            version, entries, history, _ = self._index
+            return dict(self._stats, version=version, parts=len(entries), parts_with_history=len(history),
+                        last_change=self._last_change, pid=os.getpid())
+
+parts_index = PartsIndex()
+parts_autocomplete_cache = LRUCache(PARTS_AUTOCOMPLETE_CACHE_SIZE, PARTS_AUTOCOMPLETE_CACHE_TTL)
+
+def fetch_in_chunks(conn, sql_template, values):
+    """
+    Runs sql_template (which must contain an IN ({placeholders}) list) over the values in
+    chunks small enough for SQLite's bound-variable limit, yielding every resulting row.
+    """
+    values = list(values)
+    for start in range(0, len(values), SQLITE_MAX_IN_PARAMS):
+        chunk = values[start:start + SQLITE_MAX_IN_PARAMS]
+        placeholders = ','.join('?' for _ in chunk)
+        yield from conn.execute(sql_template.format(placeholders=placeholders), chunk)
+
+def build_service_call_payloads(conn, service_call_ids):
+    """
+    Fetches all necessary data for the given service call IDs from the SQLite DB
+    and formats it for the quote sheet frontend. Each table is read with one IN (...)
+    query per chunk of IDs, however many calls are requested.
+    Returns a dict of {service_call_id: payload}; unknown IDs are left out.
+    """
+    call_ids = list(dict.fromkeys(sc_id.strip() for sc_id in service_call_ids))
+    if not call_ids:
+        return {}
+
+    # --- 1. Fetch the pre-joined ERP rows (details, write-up, rates) built at sync time ---
+    details_by_call_id = {row['call_id']: row for row in fetch_in_chunks(conn, SQL_SERVICE_CALL_SNAPSHOT, call_ids)}
+
+    # --- 2. Fetch saved revisions from local application DB ---
+    quotes_by_call_id = {}
+    for row in fetch_in_chunks(conn, SQL_QUOTE_REVISIONS, call_ids):
+        quotes_by_call_id.setdefault(row['call_id'], []).append(row)
+
+    # --- 3. Validate if any data exists for each ID ---
+    # If an ID is not in the ERP data and has no saved revisions, it's not found.
+    call_ids = [sc_id for sc_id in call_ids if sc_id in details_by_call_id or sc_id in quotes_by_call_id]
+    if not call_ids:
+        return {}
+
+    # --- 4. Fetch all revision children (parts, on-hand quantities, subcontractors) at once ---
+    # --- OPTIMIZATION: Solve N+1 query problem by fetching all children in batched queries ---
+    quote_ids = [q['id'] for quotes in quotes_by_call_id.values() for q in quotes]
+    parts_by_quote_id = {}
+    subs_by_quote_id = {}
+
+    if quote_ids:
+        # Fetch all parts for all relevant quotes in one go
+        for part_row in fetch_in_chunks(conn, SQL_QUOTE_PARTS, quote_ids):
+            part_data = dict(part_row)
+            qid = part_data.pop('quote_id')
+            parts_by_quote_id.setdefault(qid, []).append(part_data)
+
+        # Add on-hand quantity (summed over every location) to each part, from memory
+        on_hand_quantities = reference_data.on_hand(conn)
+        for parts in parts_by_quote_id.values():
+            for part in parts:
+                part['onHand'] = on_hand_quantities.get((part['part'] or '').strip(), 'N/A')
+
+        # Fetch all subcontractors for all relevant quotes in one go
+        for sub_row in fetch_in_chunks(conn, SQL_QUOTE_SUBCONTRACTORS, quote_ids):
+            sub_data = dict(sub_row)
+            qid = sub_data.pop('quote_id') # Don't need to send this to the frontend
+            subs_by_quote_id.setdefault(qid, []).append(sub_data)
+
+    # --- 5. Assemble the response for each call ---
+    payloads = {}
+    for sc_id in call_ids:
+        # Assemble the revisions using the pre-fetched data
+        revisions = []
+        for quote_row in quotes_by_call_id.get(sc_id, []):
             quote_id = quote_row['id']
             # Assemble the revision object to match the structure expected by the save endpoint
             revision_data = {
@@ -155,40 +1069,20 @@ def get_service_call_data(service_call_id):
             }
             revisions.append(revision_data)
 
-        # --- 5. Assemble Base Data ---
         # This structure matches what the frontend JavaScript expects.
+        details = details_by_call_id.get(sc_id)
         if details:
             # --- 5a. Data exists in ERP, build from that ---
-            notes_cursor = conn.execute(
-                "SELECT Record_Notes FROM sv000805_service_notes_description WHERE TRIM(Service_Call_ID) = ?",
-                (service_call_id.strip(),)
-            )
-            notes = notes_cursor.fetchall()
-            service_writeup = "\n".join([note['Record_Notes'].strip() for note in notes if note['Record_Notes']])
-
-            default_tech_rate = 75.00
-            default_travel_rate = 75.00
-            labor_group_name = details['PL_Labor_Group_Name']
-            if labor_group_name:
-                rate_cursor = conn.execute(
-                    "SELECT Billing_Amount FROM sv000123_overhead_groups WHERE Labor_Group_Name = ?",
-                    (labor_group_name,)
-                )
-                rate_result = rate_cursor.fetchone()
-                if rate_result and rate_result['Billing_Amount'] is not None:
-                    default_tech_rate = rate_result['Billing_Amount']
-                    default_travel_rate = rate_result['Billing_Amount']
-            
             base_data = {
-                "customer": { "name": details['PL_CUSTNAME'], "company": details['BillCustomer_CUSTNAME'] or details['PL_CUSTNAME'] },
+                "customer": { "name": details['customer_name'], "company": details['customer_company'] },
                 "unitInfo": {
-                    "generator.model": details['Generator_Wennsoft_Model_Number'], "generator.serial": details['Generator_Wennsoft_Serial_Number'],
-                    "generator.warranty": format_warranty(details['SV00400_Warranty_Expiration']), "ats.model": details['ATS_Wennsoft_Model_Number'],
-                    "ats.serial": details['ATS_Wennsoft_Serial_Number'], "engine.model": details['Engine_Wennsoft_Model_Number'],
-                    "engine.serial": details['Engine_Wennsoft_Serial_Number'], "generator.spec": "N/A", "generator.kw": "N/A", "generator.voltage": "N/A",
+                    "generator.model": details['generator_model'], "generator.serial": details['generator_serial'],
+                    "generator.warranty": format_warranty(details['generator_warranty_expires']), "ats.model": details['ats_model'],
+                    "ats.serial": details['ats_serial'], "engine.model": details['engine_model'],
+                    "engine.serial": details['engine_serial'], "generator.spec": "N/A", "generator.kw": "N/A", "generator.voltage": "N/A",
                 },
-                "writeup": service_writeup,
-                "rates": { "tech": default_tech_rate, "travel": default_travel_rate }
+                "writeup": details['writeup'],
+                "rates": { "tech": details['tech_rate'], "travel": details['travel_rate'] }
             }
         else:
             # --- 5b. No ERP data, but saved revisions exist. Create a default structure. ---
@@ -204,78 +1098,598 @@ def get_service_call_data(service_call_id):
                 "rates": {"tech": 75.00, "travel": 75.00} # Default fallback rates
             }
 
-        # --- 6. Assemble the final response ---
-        response_data = {
+        payloads[sc_id] = {
             "revisions": revisions,
             "baseData": base_data
         }
 
-        return jsonify(response_data)
+    return payloads
+
+def build_service_call_payload(conn, service_call_id):
+    """Builds the quote sheet payload for a single service call. Returns None if the ID is unknown."""
+    return build_service_call_payloads(conn, [service_call_id]).get(service_call_id.strip())
+
+def get_service_call_stamp(conn, service_call_id):
+    """
+    Returns a cheap (erp_generation, revision_version) pair for a service call.
+    Cached payloads are only served while this stamp is unchanged, which keeps
+    every gunicorn worker's cache correct after a save or an ERP snapshot swap.
+    """
+    row = conn.execute(SQL_SERVICE_CALL_STAMP, (service_call_id,)).fetchone()
+    return (conn.erp_generation, row[0] if row else 0)
+
+@app.route('/api/service-call/<service_call_id>')
+def get_service_call_data(service_call_id):
+    """
+    Returns the quote sheet payload for a service call. Assembled payloads are cached
+    per worker and served with a strong ETag, so unchanged re-fetches get a 304.
+    """
+    cache_key = service_call_id.strip()
+    conn = get_db_connection()
+    try:
+        stamp = get_service_call_stamp(conn, cache_key)
+        service_call_cache.check_generation(stamp[0])
+        cached = service_call_cache.get(cache_key, stamp)
+        if cached is None:
+            response_data = build_service_call_payload(conn, cache_key)
+            if response_data is None:
+                return jsonify({"error": "Service Call ID not found"}), 404
+            body = app.json.dumps(response_data)
+            cached = (body, hashlib.sha256(body.encode('utf-8')).hexdigest())
+            service_call_cache.put(cache_key, cached, stamp)
+    finally:
+        release_db_connection(conn)
+
+    body, etag = cached
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate; a matching ETag costs only a 304
+    return response.make_conditional(request)
+
+@app.route('/api/service-calls/batch', methods=['POST'])
+def get_service_call_data_batch():
+    """
+    Resolves many service calls in one round trip. Accepts {"serviceCallIds": [...]} and
+    returns {"results": {id: <same payload as /api/service-call/<id>>}, "notFound": [...]}.
+    """
+    data = request.get_json(silent=True) or {}
+    service_call_ids = data.get('serviceCallIds')
+    if not isinstance(service_call_ids, list) or not all(isinstance(sc_id, str) for sc_id in service_call_ids):
+        return jsonify({"error": "'serviceCallIds' must be a list of strings"}), 400
+    if len(service_call_ids) > SERVICE_CALL_BATCH_LIMIT:
+        return jsonify({"error": f"A batch may contain at most {SERVICE_CALL_BATCH_LIMIT} service call IDs"}), 400
+
+    conn = get_db_connection()
+    try:
+        payloads = build_service_call_payloads(conn, service_call_ids)
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+    requested = list(dict.fromkeys(sc_id.strip() for sc_id in service_call_ids))
+    return jsonify({
+        "results": payloads,
+        "notFound": [sc_id for sc_id in requested if sc_id not in payloads]
+    }), 200
+
+def build_note_search_query(text):
+    """
+    Turns free text into an FTS5 query: every word must match (as a stemmed term), and FTS
+    operators or stray quotes in the input are treated as plain text, never as syntax.
+    Returns None if the text contains no searchable words.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"' for word in words) or None
+
+@app.route('/api/service-notes/search')
+def search_service_notes():
+    """
+    Finds service calls by what was written in their description and resolution notes.
+    Query parameters: q (required), customer (CUSTNMBR), technician (Technician_ID),
+    limit and offset. Returns ranked service call IDs with a highlighted snippet of the
+    best-matching note.
+    """
+    query = build_note_search_query(request.args.get('q', ''))
+    if query is None:
+        return jsonify({"error": "'q' must contain at least one word to search for"}), 400
+    try:
+        limit = min(int(request.args.get('limit', NOTE_SEARCH_PAGE_SIZE)), NOTE_SEARCH_MAX_PAGE_SIZE)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"error": "'limit' and 'offset' must be integers"}), 400
+    if limit < 1 or offset < 0:
+        return jsonify({"error": "'limit' must be positive and 'offset' must not be negative"}), 400
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(SQL_SEARCH_NOTES, {
+            "query": query, "customer": request.args.get('customer', '').strip() or None,
+            "technician": request.args.get('technician', '').strip() or None,
+            "limit": limit + 1, "offset": offset, # One extra row tells us whether there is a next page
+        }).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        snippets = {}
+        if rows:
+            note_ids = [row['note_id'] for row in rows]
+            placeholders = ','.join('?' for _ in note_ids)
+            snippets = dict(conn.execute(SQL_NOTE_SNIPPETS.format(placeholders=placeholders), [query, *note_ids]).fetchall())
+    finally:
+        release_db_connection(conn)
+
+    return jsonify({
+        "results": [
+            {
+                "serviceCallId": row['call_id'], "customerName": row['customer_name'], "score": round(-row['score'], 4),
+                "matchingNotes": row['matches'], "noteType": row['note_type'], "snippet": snippets.get(row['note_id'])
+            }
+            for row in rows
+        ],
+        "limit": limit,
+        "offset": offset,
+        "nextOffset": offset + limit if has_more else None
+    }), 200
+
+# Sort name -> (listing SQL, keyset columns, response field holding the sort value)
+QUOTE_LIST_SORTS = {
+    "created": (SQL_LIST_QUOTES_BY_CREATED, "(q.created_at, q.id)", "created_at"),
+    "total": (SQL_LIST_QUOTES_BY_TOTAL, "(t.total, t.quote_id)", "total"),
+}
+
+def encode_quote_cursor(sort, row):
+    """An opaque cursor that resumes a listing just after row."""
+    raw = json.dumps([sort, row[QUOTE_LIST_SORTS[sort][2]], row['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_quote_cursor(cursor, sort):
+    """Returns the (sort value, quote id) a cursor points at. Raises ValueError if it is malformed or for another sort."""
+    try:
+        cursor_sort, value, quote_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("'cursor' is not valid")
+    if cursor_sort != sort or not isinstance(quote_id, int):
+        raise ValueError("'cursor' belongs to a different sort order")
+    return value, quote_id
+
+def like_prefix(text):
+    """A LIKE pattern (with ESCAPE '\\') matching values that start with text, taken literally."""
+    return re.sub(r"([\\%_])", r"\\\1", text.strip()) + "%"
+
+def build_quote_filters(args):
+    """
+    Turns the listing's filter parameters into SQL conditions and parameters. Raises ValueError
+    for a bad parameter. Dates are YYYY-MM-DD and both ends of the range are inclusive.
+    """
+    conditions, params = [], []
+    if args.get('status'):
+        conditions.append("q.status = ?")
+        params.append(args['status'])
+    if args.get('customer'):
+        conditions.append("q.customer_name LIKE ? ESCAPE '\\'") # Case-insensitive prefix match
+        params.append(like_prefix(args['customer']))
+    if args.get('serviceCallPrefix'):
+        conditions.append("TRIM(q.service_call_id) LIKE ? ESCAPE '\\'")
+        params.append(like_prefix(args['serviceCallPrefix']))
+    for name, condition in (("from", "q.created_at >= ?"), ("to", "q.created_at < date(?, '+1 day')")):
+        if args.get(name):
+            try:
+                params.append(date.fromisoformat(args[name]).isoformat())
+            except ValueError:
+                raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format")
+            conditions.append(condition)
+    return conditions, params
+
+@app.route('/api/quotes')
+def list_quotes():
+    """
+    Lists saved quotes a page at a time, with parts, subcontractor and labor totals.
+    Query parameters: status, customer (name prefix), serviceCallPrefix, from/to (YYYY-MM-DD),
+    sort (created or total), order (desc or asc), limit, cursor (nextCursor from the previous
+    page) and count=true to also return the number of matching quotes, which costs a scan.
+    """
+    sort = request.args.get('sort', 'created')
+    order = request.args.get('order', 'desc').lower()
+    if sort not in QUOTE_LIST_SORTS or order not in ("asc", "desc"):
+        return jsonify({"error": "'sort' must be 'created' or 'total' and 'order' must be 'asc' or 'desc'"}), 400
+    try:
+        limit = min(int(request.args.get('limit', QUOTE_LIST_PAGE_SIZE)), QUOTE_LIST_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "'limit' must be positive"}), 400
+    try:
+        conditions, params = build_quote_filters(request.args)
+        cursor = request.args.get('cursor')
+        after = decode_quote_cursor(cursor, sort) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    sql, keyset_columns, _ = QUOTE_LIST_SORTS[sort]
+    page_conditions, page_params = list(conditions), list(params)
+    if after is not None:
+        page_conditions.append(f"{keyset_columns} {'<' if order == 'desc' else '>'} (?, ?)")
+        page_params.extend(after)
+
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            sql.format(where=" AND ".join(page_conditions) or "1", direction=order.upper()),
+            [*page_params, limit + 1] # One extra row tells us whether there is a next page
+        ).fetchall()
+        total_count = None
+        if request.args.get('count', '').lower() in ("1", "true"):
+            total_count = conn.execute(SQL_COUNT_QUOTES.format(where=" AND ".join(conditions) or "1"), params).fetchone()[0]
+    finally:
+        release_db_connection(conn)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    response = {
+        "quotes": [
+            {
+                "id": row['id'], "serviceCallId": row['service_call_id'], "revision": row['revision'],
+                "customerName": row['customer_name'], "status": row['status'], "createdAt": row['created_at'],
+                "partsTotal": round(row['parts_total'], 2), "subcontractorTotal": round(row['subcontractor_total'], 2),
+                "laborTotal": round(row['labor_total'], 2), "total": round(row['total'], 2)
+            }
+            for row in rows
+        ],
+        "limit": limit,
+        "nextCursor": encode_quote_cursor(sort, rows[-1]) if has_more else None
+    }
+    if total_count is not None:
+        response["totalCount"] = total_count
+    return jsonify(response), 200
+
+@app.route('/api/parts/autocomplete')
+def autocomplete_parts():
+    """
+    Typeahead for part numbers. Query parameters: prefix (required) and limit. Returns the
+    matching parts with their last-used description, vendor and unit cost from saved quotes,
+    and the on-hand quantity summed across locations. Cheap enough to call on every keystroke.
+    """
+    prefix = request.args.get('prefix', '').strip()
+    if not prefix:
+        return jsonify({"error": "'prefix' is required"}), 400
+    try:
+        limit = min(int(request.args.get('limit', PARTS_AUTOCOMPLETE_LIMIT)), PARTS_AUTOCOMPLETE_MAX_LIMIT)
+    except ValueError:
+        return jsonify({"error": "'limit' must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "'limit' must be positive"}), 400
+
+    conn = get_db_connection()
+    try:
+        # Cached results are stamped with the index version, which only changes when the index does
+        version = parts_index.refresh(conn, conn.execute(SQL_PART_CHANGE_SEQ).fetchone()[0] or 0)
+    finally:
+        release_db_connection(conn)
+    cache_key = (prefix.casefold(), limit)
+    results = parts_autocomplete_cache.get(cache_key, version)
+    if results is None:
+        version, results = parts_index.search(prefix, limit)
+        parts_autocomplete_cache.put(cache_key, results, version)
+
+    response = jsonify({"prefix": prefix, "results": results})
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response, 200
+
+# Columns of a quote's child rows, in the order quote_child_values() produces them
+QUOTE_CHILD_COLUMNS = {
+    "quote_line_item": ("part_number", "description", "vendor", "on_hand", "quantity", "unit_cost", "total_cost"),
+    "subcontractor": ("contact_name", "contact_details", "cost"),
+}
+
+def as_text(value):
+    """Stores like a TEXT column would, so a stored value compares equal to what the client resends."""
+    return None if value is None else str(value)
+
+def quote_header_values(data, status='Draft'):
+    """The quote row's values after service_call_id and revision, in SQL_INSERT_QUOTE order."""
+    return (
+        data['description'], data['customer']['name'], status, data['labor']['techCount'],
+        data['labor']['techHours'], data['labor']['travelHours'],
+        data['labor']['techRate'], data['labor']['travelRate']
+    )
+
+def quote_child_values(data):
+    """{table: [row values in QUOTE_CHILD_COLUMNS order]} for the parts and subcontractors in a save_quote body."""
+    parts = []
+    for p in data.get('parts') or []:
+        qty = to_float(p.get('qty'))
+        unit_cost = to_float(p.get('unitCost'))
+        parts.append((
+            as_text(p.get('part')), as_text(p.get('desc')), as_text(p.get('vendor')),
+            as_text(p.get('onHand', 'N/A')), qty, unit_cost, qty * unit_cost
+        ))
+    subcontractors = [
+        (as_text(s.get('contact_name')), as_text(s.get('contact_details')), to_float(s.get('cost')))
+        for s in data.get('subcontractors') or []
+    ]
+    return {"quote_line_item": parts, "subcontractor": subcontractors}
+
+def insert_quote(conn, data):
+    """Inserts a quote revision with its parts and subcontractors. Returns (quote_id, {table: rows inserted})."""
+    cursor = conn.execute(SQL_INSERT_QUOTE, (data['serviceCallId'], data['revision'], *quote_header_values(data)))
+    quote_id = cursor.lastrowid
+    inserted = {"quote": 1}
+    for table, rows in quote_child_values(data).items():
+        if rows:
+            conn.executemany(SQL_INSERT_QUOTE_CHILD[table], [(quote_id, *row) for row in rows])
+        inserted[table] = len(rows)
+    return quote_id, inserted
+
+def diff_quote_children(conn, table, quote_id, rows):
+    """
+    Brings a quote's rows in table in line with rows (in order) by writing only the differences.
+    Stored and incoming rows are aligned with difflib: identical rows are left alone, rows that
+    line up but differ are updated in place, and the rest are deleted or inserted. Rows are read
+    back in ID order, so new rows can only go at the end; past a mid-list insert the remaining
+    rows are rewritten in place instead. Returns {"inserted": n, "updated": n, "deleted": n}.
+    """
+    columns = QUOTE_CHILD_COLUMNS[table]
+    stored = conn.execute(f"SELECT id, {', '.join(columns)} FROM {table} WHERE quote_id = ? ORDER BY id", (quote_id,)).fetchall()
+    stored_ids = [row[0] for row in stored]
+    stored_values = [tuple(row)[1:] for row in stored]
+    inserts, updates, deletes = [], [], []
+
+    def pair(stored_range, row_range):
+        paired = min(len(stored_range), len(row_range))
+        updates.extend((*rows[j], stored_ids[i]) for i, j in zip(stored_range[:paired], row_range[:paired])
+                       if stored_values[i] != rows[j])
+        deletes.extend((stored_ids[i],) for i in stored_range[paired:])
+        inserts.extend((quote_id, *rows[j]) for j in row_range[paired:])
+
+    matcher = difflib.SequenceMatcher(None, stored_values, rows, autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == 'equal':
+            continue
+        if j2 - j1 > i2 - i1 and i2 < len(stored):
+            pair(range(i1, len(stored)), range(j1, len(rows))) # Rewrite the tail so the new rows stay in place
+            break
+        pair(range(i1, i2), range(j1, j2))
+
+    if deletes:
+        conn.executemany(f"DELETE FROM {table} WHERE id = ?", deletes)
+    if updates:
+        conn.executemany(f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?", updates)
+    if inserts:
+        conn.executemany(SQL_INSERT_QUOTE_CHILD[table], inserts)
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes)}
 
 @app.route('/api/quote', methods=['POST'])
 def save_quote():
-    """Saves a new or updated quote revision to the database."""
+    """
+    Saves a new or updated quote revision to the database. An existing revision is updated in
+    place: only the header fields, parts and subcontractors that changed are written and the
+    quote ID is kept. Send "mode": "replace" to delete and reinsert it instead. With an
+    Idempotency-Key header, a retried request returns the original response without saving again.
+    """
     data = request.json
+    mode = data.get('mode', 'diff')
+    if mode not in ('diff', 'replace'):
+        return jsonify({"error": "'mode' must be 'diff' or 'replace'"}), 400
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if idempotency_key is not None and not 0 < len(idempotency_key) <= 255:
+        return jsonify({"error": "Idempotency-Key must be 1 to 255 characters"}), 400
+    request_hash = hashlib.sha256(request.get_data()).hexdigest()
+    service_call_key = str(data['serviceCallId']).strip()
     conn = get_db_connection()
     try:
         with conn: # Use a transaction
+            conn.execute("BEGIN IMMEDIATE") # Serialize the idempotency check with a concurrent retry
+            if idempotency_key is not None:
+                saved = conn.execute(SQL_SAVED_QUOTE_REQUEST, (idempotency_key,)).fetchone()
+                if saved:
+                    if saved['request_hash'] != request_hash:
+                        return jsonify({"error": "This Idempotency-Key was already used for a different request."}), 422
+                    return jsonify(dict(json.loads(saved['response']), replayed=True)), 200
+
             # Check if this revision already exists
             existing_quote = conn.execute(
-                "SELECT id FROM quote WHERE TRIM(service_call_id) = ? AND revision = ?",
-                (data['serviceCallId'], data['revision'])
+                SQL_EXISTING_REVISION, (service_call_key, data['revision'])
             ).fetchone()
 
-            if existing_quote:
-                # If it exists, delete it and its children (thanks to ON DELETE CASCADE)
-                conn.execute("DELETE FROM quote WHERE id = ?", (existing_quote['id'],))
+            if existing_quote and mode == 'diff':
+                quote_id = existing_quote['id']
+                header = quote_header_values(data)
+                updated = conn.execute(SQL_UPDATE_QUOTE_IF_CHANGED, (*header, quote_id, *header)).rowcount
+                changes = {"quote": {"inserted": 0, "updated": updated, "deleted": 0}}
+                for table, rows in quote_child_values(data).items():
+                    changes[table] = diff_quote_children(conn, table, quote_id, rows)
+            else:
+                changes = {table: {"inserted": 0, "updated": 0, "deleted": 0} for table in ("quote", *QUOTE_CHILD_COLUMNS)}
+                if existing_quote:
+                    # Delete it and its children (thanks to ON DELETE CASCADE)
+                    for table in QUOTE_CHILD_COLUMNS:
+                        changes[table]["deleted"] = conn.execute(
+                            f"SELECT COUNT(*) FROM {table} WHERE quote_id = ?", (existing_quote['id'],)
+                        ).fetchone()[0]
+                    conn.execute("DELETE FROM quote WHERE id = ?", (existing_quote['id'],))
+                    changes["quote"]["deleted"] = 1
+                quote_id, inserted = insert_quote(conn, data)
+                for table, count in inserted.items():
+                    changes[table]["inserted"] = count
 
-            # Insert the new quote record
-            cursor = conn.execute(
-                """INSERT INTO quote (service_call_id, revision, description, customer_name, status, 
-                                     tech_count, tech_hours, travel_hours, tech_rate, travel_rate)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (
-                    data['serviceCallId'], data['revision'], data['description'],
-                    data['customer']['name'], 'Draft', data['labor']['techCount'],
-                    data['labor']['techHours'], data['labor']['travelHours'],
-                    data['labor']['techRate'], data['labor']['travelRate']
-                )
-            )
-            quote_id = cursor.lastrowid
-
-            # Insert parts
-            if data.get('parts'):
-                parts_to_insert = []
-                for p in data.get('parts', []):
-                    qty = to_float(p.get('qty'))
-                    unit_cost = to_float(p.get('unitCost'))
-                    parts_to_insert.append((
-                        quote_id, p.get('part'), p.get('desc'), p.get('vendor'), 
-                        p.get('onHand', 'N/A'), qty, unit_cost, qty * unit_cost
-                    ))
-                conn.executemany(
-                    """INSERT INTO quote_line_item (quote_id, part_number, description, vendor, on_hand, quantity, unit_cost, total_cost)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-                    parts_to_insert
-                )
-            
-            # Insert subcontractors
-            if data.get('subcontractors'):
-                subs_to_insert = [
-                    (quote_id, s.get('contact_name'), s.get('contact_details'), to_float(s.get('cost')))
-                    for s in data.get('subcontractors', [])
-                ]
-                conn.executemany(
-                    """INSERT INTO subcontractor (quote_id, contact_name, contact_details, cost)
-                       VALUES (?, ?, ?, ?)""",
-                    subs_to_insert
-                )
+            rows_touched = sum(sum(counts.values()) for counts in changes.values())
+            if rows_touched:
+                # Bump the call's version so every worker's cached payload for it goes stale
+                conn.execute(SQL_BUMP_SERVICE_CALL_VERSION, (service_call_key,))
+            result = {
+                "message": f"Quote revision {data['revision']} saved successfully.", "quote_id": quote_id,
+                "rowsTouched": rows_touched,
+                "changes": {"quote": changes["quote"], "parts": changes["quote_line_item"], "subcontractors": changes["subcontractor"]}
+            }
+            if idempotency_key is not None:
+                now = time.time()
+                conn.execute(SQL_SAVE_QUOTE_REQUEST, (idempotency_key, request_hash, json.dumps(result), now))
+                conn.execute("DELETE FROM quote_save_request WHERE created_at < ?", (now - QUOTE_IDEMPOTENCY_TTL,))
 
-        return jsonify({"message": f"Quote revision {data['revision']} saved successfully.", "quote_id": quote_id}), 200
+        if rows_touched:
+            service_call_cache.invalidate(service_call_key)
+        return jsonify(result), 200
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+def prepare_import_record(data):
+    """
+    Validates one NDJSON import record (a save_quote body, optionally with status and
+    createdAt) and returns the rows to write. Raises ValueError describing what is wrong.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("record must be a JSON object")
+    try:
+        service_call_id = str(data['serviceCallId']).strip()
+        revision = int(data['revision'])
+        header = quote_header_values(data, status=data.get('status') or 'Draft')
+        children = quote_child_values(data)
+        created_at = data.get('createdAt')
+        if created_at is not None:
+            created_at = datetime.fromisoformat(created_at).strftime('%Y-%m-%d %H:%M:%S')
+    except KeyError as e:
+        raise ValueError(f"missing field {e}")
+    except (TypeError, ValueError, AttributeError) as e:
+        raise ValueError(f"invalid value: {e}")
+    if not service_call_id:
+        raise ValueError("'serviceCallId' is empty")
+    return {"key": (service_call_id, revision), "service_call_id": data['serviceCallId'], "header": header,
+            "children": children, "created_at": created_at}
+
+def import_quote_batch(conn, batch):
+    """
+    Writes prepared import records in one transaction, with one executemany per table. A
+    record for a revision that already exists replaces it; within a batch the last record
+    for a revision wins. Returns (records written, revisions replaced, counting ones earlier
+    in the same batch).
+    """
+    records = list({record["key"]: record for _, record in batch}.values())
+    with conn:
+        conn.execute("BEGIN IMMEDIATE") # The IDs assigned below must not be taken by a concurrent save
+        existing = [row for row in (conn.execute(SQL_EXISTING_REVISION, record["key"]).fetchone() for record in records) if row]
+        if existing:
+            conn.executemany("DELETE FROM quote WHERE id = ?", [(row['id'],) for row in existing])
+        next_id = conn.execute(SQL_NEXT_QUOTE_ID).fetchone()[0]
+        quotes, children = [], {table: [] for table in QUOTE_CHILD_COLUMNS}
+        for quote_id, record in enumerate(records, start=next_id):
+            quotes.append((quote_id, record["service_call_id"], record["key"][1], *record["header"], record["created_at"]))
+            for table, rows in record["children"].items():
+                children[table].extend((quote_id, *row) for row in rows)
+        conn.executemany(SQL_IMPORT_QUOTE, quotes)
+        for table, rows in children.items():
+            if rows:
+                conn.executemany(SQL_INSERT_QUOTE_CHILD[table], rows)
+        conn.executemany(SQL_BUMP_SERVICE_CALL_VERSION, [(call_id,) for call_id in {record["key"][0] for record in records}])
+    for call_id in {record["key"][0] for record in records}:
+        service_call_cache.invalidate(call_id)
+    return len(records), len(existing) + len(batch) - len(records)
+
+@app.route('/api/quotes/import', methods=['POST'])
+def import_quotes():
+    """
+    Bulk-loads quotes from a newline-delimited JSON body (one save_quote body per line, and
+    optionally "status" and "createdAt"), read as it streams in. Records are committed in
+    batches (batchSize query parameter). A bad record is reported with its line number and
+    skipped; the rest of its batch is still written. Existing revisions are replaced.
+    """
+    try:
+        batch_size = int(request.args.get('batchSize', QUOTE_IMPORT_BATCH_SIZE))
+    except ValueError:
+        return jsonify({"error": "'batchSize' must be an integer"}), 400
+    if not 1 <= batch_size <= 10000:
+        return jsonify({"error": "'batchSize' must be between 1 and 10000"}), 400
+
+    started = time.monotonic()
+    totals = {"imported": 0, "replaced": 0, "failed": 0, "batches": 0}
+    errors = []
+
+    def record_error(line_number, message):
+        totals["failed"] += 1
+        if len(errors) < QUOTE_IMPORT_MAX_ERRORS:
+            errors.append({"line": line_number, "error": message})
+
+    def flush(batch):
+        try:
+            written, replaced = import_quote_batch(conn, batch)
+        except sqlite3.Error:
+            # Something in the batch was rejected by the database; find it by writing records one at a time
+            written = replaced = 0
+            for line_number, record in batch:
+                try:
+                    one_written, one_replaced = import_quote_batch(conn, [(line_number, record)])
+                    written, replaced = written + one_written, replaced + one_replaced
+                except sqlite3.Error as e:
+                    record_error(line_number, f"database error: {e}")
+        totals["imported"] += written
+        totals["replaced"] += replaced
+        totals["batches"] += 1
+
+    conn = get_db_connection()
+    try:
+        batch = []
+        for line_number, line in enumerate(request.stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, prepare_import_record(json.loads(line))))
+            except ValueError as e: # Includes JSON syntax errors
+                record_error(line_number, str(e))
+                continue
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        if batch:
+            flush(batch)
+    finally:
+        release_db_connection(conn)
+
+    seconds = time.monotonic() - started
+    print(f"✅ Imported {totals['imported']} quotes ({totals['replaced']} replaced, {totals['failed']} failed) in {seconds:.1f}s")
+    return jsonify(dict(totals, errors=errors, seconds=round(seconds, 3))), 200
+
+@app.route('/api/quotes/export')
+def export_quotes():
+    """
+    Streams every quote, with its parts and subcontractors, as newline-delimited JSON in the
+    shape /api/quotes/import accepts. Quotes are read a page at a time in ID order, so memory
+    use does not grow with the number of quotes. Quotes saved while an export runs may or may
+    not be included.
+    """
+    def generate():
+        conn = get_db_connection()
+        try:
+            last_id = 0
+            while True:
+                quotes = conn.execute(SQL_EXPORT_QUOTES, (last_id, QUOTE_EXPORT_PAGE_SIZE)).fetchall()
+                if not quotes:
+                    break
+                ids = [row['id'] for row in quotes]
+                placeholders = ','.join('?' for _ in ids)
+                parts, subcontractors = {}, {}
+                for row in conn.execute(SQL_EXPORT_PARTS.format(placeholders=placeholders), ids):
+                    parts.setdefault(row['quote_id'], []).append({
+                        "part": row['part_number'], "desc": row['description'], "vendor": row['vendor'],
+                        "onHand": row['on_hand'], "qty": row['quantity'], "unitCost": row['unit_cost']
+                    })
+                for row in conn.execute(SQL_EXPORT_SUBCONTRACTORS.format(placeholders=placeholders), ids):
+                    subcontractors.setdefault(row['quote_id'], []).append({
+                        "contact_name": row['contact_name'], "contact_details": row['contact_details'], "cost": row['cost']
+                    })
+                yield "".join(json.dumps({
+                    "serviceCallId": row['service_call_id'], "revision": row['revision'], "description": row['description'],
+                    "customer": {"name": row['customer_name']}, "status": row['status'], "createdAt": row['created_at'],
+                    "labor": {
+                        "techCount": row['tech_count'], "techHours": row['tech_hours'], "travelHours": row['travel_hours'],
+                        "techRate": row['tech_rate'], "travelRate": row['travel_rate']
+                    },
+                    "parts": parts.get(row['id'], []), "subcontractors": subcontractors.get(row['id'], [])
+                }) + "\n" for row in quotes)
+                last_id = ids[-1]
+        finally:
+            release_db_connection(conn) # Also runs if the client disconnects mid-stream
+
+    return app.response_class(generate(), mimetype='application/x-ndjson', headers={
+        'Content-Disposition': 'attachment; filename="quotes.ndjson"',
+        'X-Accel-Buffering': 'no',
+    })
 
 # --- INSPECTION API V2 (with multiple checklists) ---
 
@@ -288,7 +1702,49 @@ def get_checklists():
         checklists = conn.execute("SELECT id, name, description FROM checklists ORDER BY name ASC").fetchall()
         return jsonify([dict(c) for c in checklists])
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+def get_checklist_version(conn, checklist_id):
+    """The checklist's edit counter (see checklist_version in schema.sql); 0 if it was never changed."""
+    row = conn.execute(SQL_CHECKLIST_VERSION, (checklist_id,)).fetchone()
+    return row[0] if row else 0
+
+def build_checklist_payload(conn, checklist_id, version):
+    """A checklist with its items in display order, or None if it doesn't exist."""
+    checklist = conn.execute(SQL_CHECKLIST, (checklist_id,)).fetchone()
+    if checklist is None:
+        return None
+    items = conn.execute(SQL_CHECKLIST_ITEMS, (checklist_id,)).fetchall()
+    return dict(checklist, version=version, items=[dict(item) for item in items])
+
+@app.route('/api/checklists/<int:checklist_id>', methods=['GET'])
+def get_checklist(checklist_id):
+    """
+    Returns a checklist with its ordered items embedded, in one response. Payloads are cached
+    per worker against the checklist's version and served with a strong ETag, so a form that
+    reloads an unchanged checklist gets a 304.
+    """
+    conn = get_db_connection()
+    try:
+        # Read the version before the content: a concurrent edit then leaves the cached entry
+        # stamped older than what it holds, which only costs a rebuild on the next request.
+        version = get_checklist_version(conn, checklist_id)
+        cached = checklist_cache.get(checklist_id, version)
+        if cached is None:
+            payload = build_checklist_payload(conn, checklist_id, version)
+            if payload is None:
+                return jsonify({"error": "Checklist not found"}), 404
+            body = app.json.dumps(payload)
+            cached = (body, hashlib.sha256(body.encode('utf-8')).hexdigest())
+            checklist_cache.put(checklist_id, cached, version)
+    finally:
+        release_db_connection(conn)
+
+    body, etag = cached
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache' # Always revalidate; a matching ETag costs only a 304
+    return response.make_conditional(request)
 
 @app.route('/api/checklists', methods=['POST'])
 def create_checklist():
@@ -306,7 +1762,7 @@ def create_checklist():
     except sqlite3.IntegrityError:
         return jsonify({"error": "A checklist with this name already exists."}), 409
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 @app.route('/api/checklists/<int:checklist_id>', methods=['PUT'])
 def update_checklist(checklist_id):
@@ -319,11 +1775,12 @@ def update_checklist(checklist_id):
                 "UPDATE checklists SET name = ?, description = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                 (data['name'], data.get('description', ''), checklist_id)
             )
+        checklist_cache.invalidate(checklist_id) # Other workers see the bumped checklist_version
         return jsonify({"message": f"Checklist {checklist_id} updated."}), 200
     except sqlite3.IntegrityError:
         return jsonify({"error": "Another checklist with this name already exists."}), 409
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 @app.route('/api/checklists/<int:checklist_id>', methods=['DELETE'])
 def delete_checklist(checklist_id):
@@ -332,9 +1789,10 @@ def delete_checklist(checklist_id):
     try:
         with conn:
             conn.execute("DELETE FROM checklists WHERE id = ?", (checklist_id,))
+        checklist_cache.invalidate(checklist_id)
         return jsonify({"message": f"Checklist {checklist_id} and its items deleted."}), 200
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 # Checklist Item Management (now nested under a specific checklist)
 @app.route('/api/checklists/<int:checklist_id>/items', methods=['GET'])
@@ -342,13 +1800,97 @@ def get_checklist_items(checklist_id):
     """Fetches all items for a specific checklist."""
     conn = get_db_connection()
     try:
-        items = conn.execute(
-            "SELECT id, item_text, category, is_required, display_order FROM inspection_checklist_items WHERE checklist_id = ? ORDER BY display_order ASC, id ASC",
-            (checklist_id,)
-        ).fetchall()
+        items = conn.execute(SQL_CHECKLIST_ITEMS, (checklist_id,)).fetchall()
         return jsonify([dict(item) for item in items])
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+CHECKLIST_ITEM_FIELDS = ('item_text', 'category', 'is_required', 'display_order')
+
+def prepare_checklist_item_batch(data):
+    """
+    Validates a batch edit body ({"create": [...], "update": [...], "delete": [...]}) and returns
+    (creates, updates, deletes). Updates are grouped by the fields they set, so each group can be
+    written with one executemany. Raises ValueError describing what is wrong.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("body must be a JSON object")
+    creates, updates, deletes = data.get('create') or [], data.get('update') or [], data.get('delete') or []
+    if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+        raise ValueError("'create', 'update' and 'delete' must be lists")
+
+    create_rows = []
+    for item in creates:
+        if not isinstance(item, dict) or not item.get('item_text'):
+            raise ValueError("every created item needs 'item_text'")
+        create_rows.append((item['item_text'], item.get('category'), item.get('is_required', True), item.get('display_order')))
+
+    update_groups = {}
+    for item in updates:
+        if not isinstance(item, dict) or not isinstance(item.get('id'), int):
+            raise ValueError("every updated item needs an integer 'id'")
+        fields = tuple(f for f in CHECKLIST_ITEM_FIELDS if f in item)
+        if not fields:
+            raise ValueError(f"update for item {item['id']} sets no fields")
+        if 'item_text' in fields and not item['item_text']:
+            raise ValueError(f"update for item {item['id']} has an empty 'item_text'")
+        update_groups.setdefault(fields, []).append((*(item[f] for f in fields), item['id']))
+
+    if not all(isinstance(item_id, int) for item_id in deletes):
+        raise ValueError("'delete' must be a list of item IDs")
+
+    touched = [row[-1] for rows in update_groups.values() for row in rows] + deletes
+    if len(touched) != len(set(touched)):
+        raise ValueError("an item ID appears more than once in 'update' and 'delete'")
+    return create_rows, update_groups, deletes
+
+@app.route('/api/checklists/<int:checklist_id>/items', methods=['PATCH'])
+def batch_update_checklist_items(checklist_id):
+    """
+    Applies a batch of item creates, updates (e.g. new display_order values after a drag) and
+    deletes to a checklist in one transaction, so a reorder is one request and one commit and
+    never half-applied. Send "version" to have the batch rejected with a 409 if the checklist
+    changed since it was read. Returns the checklist with its new ordered items and version.
+    """
+    data = request.get_json(silent=True)
+    try:
+        creates, update_groups, deletes = prepare_checklist_item_batch(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    expected_version = data.get('version')
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE") # The ID and version checks must hold until the commit
+            version = get_checklist_version(conn, checklist_id)
+            if conn.execute(SQL_CHECKLIST, (checklist_id,)).fetchone() is None:
+                return jsonify({"error": "Checklist not found"}), 404
+            if expected_version is not None and expected_version != version:
+                return jsonify({"error": "The checklist was changed by someone else.", "version": version}), 409
+
+            existing = {row[0] for row in conn.execute(
+                "SELECT id FROM inspection_checklist_items WHERE checklist_id = ?", (checklist_id,))}
+            missing = sorted({row[-1] for rows in update_groups.values() for row in rows}.union(deletes) - existing)
+            if missing:
+                return jsonify({"error": "Items not found in this checklist.", "ids": missing}), 404
+
+            conn.executemany("DELETE FROM inspection_checklist_items WHERE id = ?", [(item_id,) for item_id in deletes])
+            for fields, rows in update_groups.items():
+                assignments = ", ".join(f"{field} = ?" for field in fields)
+                conn.executemany(
+                    f"UPDATE inspection_checklist_items SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ?", rows)
+            conn.executemany(
+                "INSERT INTO inspection_checklist_items (checklist_id, item_text, category, is_required, display_order) VALUES (?, ?, ?, ?, ?)",
+                [(checklist_id, *row) for row in creates]
+            )
+            payload = build_checklist_payload(conn, checklist_id, get_checklist_version(conn, checklist_id))
+        checklist_cache.invalidate(checklist_id)
+        payload["changes"] = {"created": len(creates), "updated": sum(len(rows) for rows in update_groups.values()),
+                              "deleted": len(deletes)}
+        return jsonify(payload), 200
+    finally:
+        release_db_connection(conn)
 
 @app.route('/api/checklists/<int:checklist_id>/items', methods=['POST'])
 def create_checklist_item(checklist_id):
@@ -362,9 +1904,10 @@ def create_checklist_item(checklist_id):
                 (checklist_id, data['item_text'], data.get('category'), data.get('is_required', True), data.get('display_order'))
             )
             new_id = cursor.lastrowid
+        checklist_cache.invalidate(checklist_id)
         return jsonify({"message": "Checklist item created.", "id": new_id}), 201
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 @app.route('/api/checklist-items/<int:item_id>', methods=['PUT'])
 def update_checklist_item(item_id):
@@ -373,15 +1916,18 @@ def update_checklist_item(item_id):
     conn = get_db_connection()
     try:
         with conn:
+            checklist = conn.execute("SELECT checklist_id FROM inspection_checklist_items WHERE id = ?", (item_id,)).fetchone()
             conn.execute(
                 """UPDATE inspection_checklist_items 
                    SET item_text = ?, category = ?, is_required = ?, display_order = ?, updated_at = CURRENT_TIMESTAMP
                    WHERE id = ?""",
                 (data['item_text'], data.get('category'), data.get('is_required'), data.get('display_order'), item_id)
             )
+        if checklist:
+            checklist_cache.invalidate(checklist['checklist_id'])
         return jsonify({"message": f"Checklist item {item_id} updated."}), 200
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 @app.route('/api/checklist-items/<int:item_id>', methods=['DELETE'])
 def delete_checklist_item(item_id):
@@ -389,18 +1935,32 @@ def delete_checklist_item(item_id):
     conn = get_db_connection()
     try:
         with conn:
+            checklist = conn.execute("SELECT checklist_id FROM inspection_checklist_items WHERE id = ?", (item_id,)).fetchone()
             conn.execute("DELETE FROM inspection_checklist_items WHERE id = ?", (item_id,))
+        if checklist:
+            checklist_cache.invalidate(checklist['checklist_id'])
         return jsonify({"message": f"Checklist item {item_id} deleted."}), 200
     finally:
-        conn.close()
+        release_db_connection(conn)
 
 # Inspection Submission (now requires a checklist_id)
 @app.route('/api/inspections', methods=['POST'])
 def submit_inspection():
-    """Saves a new inspection and its results to the database."""
+    """
+    Saves a new inspection and its results to the database. Each photo is either
+    {"hash": ...} from POST /api/photos or a legacy {"file_path": ...}.
+    """
     data = request.json
     conn = get_db_connection()
     try:
+        uploaded = {}
+        for photo in data.get('photos', []):
+            if photo.get('hash'):
+                row = conn.execute(SQL_PHOTO_BLOB, (photo['hash'],)).fetchone()
+                if row is None:
+                    return jsonify({"error": f"Photo {photo['hash']} has not been uploaded."}), 400
+                uploaded[photo['hash']] = row['file_path']
+
         with conn:
             # 1. Insert the main inspection record
             inspection_cursor = conn.execute(
@@ -431,14 +1991,16 @@ def submit_inspection():
             # 3. Insert photo records
             photos_to_insert = []
             for photo in data.get('photos', []):
+                content_hash = photo.get('hash') or None
                 photos_to_insert.append((
-                    inspection_id, photo['file_path'], photo.get('description')
+                    inspection_id, uploaded[content_hash] if content_hash else photo['file_path'],
+                    content_hash, photo.get('description')
                 ))
 
             if photos_to_insert:
                 conn.executemany(
-                    """INSERT INTO inspection_photos (inspection_id, file_path, description)
-                       VALUES (?, ?, ?)""",
+                    """INSERT INTO inspection_photos (inspection_id, file_path, content_hash, description)
+                       VALUES (?, ?, ?, ?)""",
                     photos_to_insert
                 )
 
@@ -448,26 +2010,626 @@ def submit_inspection():
         print(f"Error submitting inspection: {e}")
         return jsonify({"error": "An internal error occurred."}), 500
     finally:
-        conn.close()
+        release_db_connection(conn)
+
+
+def split_whole_months(date_from, date_to):
+    """
+    Splits the inclusive range [date_from, date_to] into the whole calendar months it covers,
+    as ('YYYY-MM', 'YYYY-MM') or None, and the leftover [start, end) date ranges at either end.
+    """
+    first = date_from if date_from.day == 1 else (date_from.replace(day=1) + timedelta(days=32)).replace(day=1)
+    after = date_to + timedelta(days=1)
+    end = after.replace(day=1) # Start of the month containing the day after the range
+    if first >= end:
+        return None, [(date_from, after)]
+    last = end - timedelta(days=1)
+    edges = [(start, stop) for start, stop in ((date_from, first), (end, after)) if start < stop]
+    return (first.strftime('%Y-%m'), last.strftime('%Y-%m')), edges
+
+@app.route('/api/inspections/analytics')
+def get_inspection_analytics():
+    """
+    Pass/fail/not-checked counts and failure rates per item of one checklist, most-failed first.
+    Query parameters: checklistId (required), from and to (YYYY-MM-DD, inclusive; default
+    the last 90 days) and inspector. The failure rate is Failed / (Passed + Failed).
+    Whole months are read from inspection_item_result_rollup and only the partial months at
+    either end from inspection_results; an inspector filter reads inspection_results throughout.
+    """
+    try:
+        checklist_id = int(request.args['checklistId'])
+    except (KeyError, ValueError):
+        return jsonify({"error": "'checklistId' is required and must be an integer"}), 400
+    try:
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else date.today()
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else date_to - timedelta(days=89)
+    except ValueError:
+        return jsonify({"error": "'from' and 'to' must be dates in YYYY-MM-DD format"}), 400
+    if date_from > date_to:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    inspector = request.args.get('inspector') or None
+
+    if inspector is None:
+        months, edges = split_whole_months(date_from, date_to)
+    else:
+        months, edges = None, [(date_from, date_to + timedelta(days=1))]
+    counts = {}
+    inspection_count = 0
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN") # One snapshot for the rollup, the edge ranges and the item list
+        try:
+            if months:
+                inspection_count += conn.execute(SQL_INSPECTION_ROLLUP_COUNT, (*months, checklist_id)).fetchone()[0]
+                for item_id, status, count in conn.execute(SQL_ITEM_RESULT_ROLLUP_COUNTS, (checklist_id, *months)):
+                    counts[item_id, status] = counts.get((item_id, status), 0) + count
+            for start, stop in edges:
+                params = {"checklist": checklist_id, "from": start.isoformat(), "to": stop.isoformat(), "inspector": inspector}
+                inspection_count += conn.execute(SQL_INSPECTION_COUNT, params).fetchone()[0]
+                for item_id, status, count in conn.execute(SQL_ITEM_RESULT_COUNTS, params):
+                    counts[item_id, status] = counts.get((item_id, status), 0) + count
+            items = conn.execute(SQL_CHECKLIST_ITEMS, (checklist_id,)).fetchall()
+        finally:
+            conn.rollback()
+    finally:
+        release_db_connection(conn)
+
+    # Every current item is listed, even with no results; results for since-removed items are kept
+    by_item = {item['id']: dict(item, results={}) for item in items}
+    for (item_id, status), count in counts.items():
+        by_item.setdefault(item_id, {"id": item_id, "item_text": None, "category": None, "is_required": None,
+                                     "display_order": None, "results": {}})["results"][status] = count
+    for entry in by_item.values():
+        passed, failed = entry["results"].get('Passed', 0), entry["results"].get('Failed', 0)
+        entry["passed"], entry["failed"] = passed, failed
+        entry["notChecked"] = entry["results"].get('Not Checked', 0)
+        entry["total"] = sum(entry["results"].values())
+        entry["failureRate"] = round(failed / (passed + failed), 4) if passed + failed else None
+
+    ranked = sorted(by_item.values(), key=lambda e: (-(e["failureRate"] or 0), -e["failed"],
+                                                     e["display_order"] if e["display_order"] is not None else math.inf, e["id"]))
+    return jsonify({
+        "checklistId": checklist_id,
+        "from": date_from.isoformat(),
+        "to": date_to.isoformat(),
+        "inspector": inspector,
+        "inspections": inspection_count,
+        "items": ranked
+    }), 200
+
+# --- INSPECTION PHOTOS ---
+# Uploads stream the request body to disk in chunks while hashing it, then move the file to
+# <PHOTO_STORAGE_DIR>/<first two hash chars>/<sha256><ext>. A photo that's already stored costs
+# only the read. Thumbnails and previews are made off the request path by PhotoDerivativeQueue.
+
+PHOTO_SIGNATURES = [ # (magic bytes, offset, content type, extension); the client's Content-Type isn't trusted
+    (b'\xff\xd8\xff', 0, 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 0, 'image/png', '.png'),
+    (b'GIF8', 0, 'image/gif', '.gif'),
+    (b'WEBP', 8, 'image/webp', '.webp'),
+]
+
+SQL_PHOTO_BLOB = """SELECT content_hash, file_path, content_type, size_bytes, thumbnail_path, preview_path,
+                           derivative_status FROM photo_blob WHERE content_hash = ?"""
+
+def sniff_photo_type(head):
+    """Returns (content_type, extension) for the first bytes of an image file, or None."""
+    for magic, offset, content_type, extension in PHOTO_SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return content_type, extension
+    return None
+
+def photo_payload(row):
+    """Describes a stored photo and the URLs of its variants."""
+    url = f"/api/photos/{row['content_hash']}"
+    return {
+        "hash": row['content_hash'],
+        "contentType": row['content_type'],
+        "sizeBytes": row['size_bytes'],
+        "filePath": row['file_path'],
+        "thumbnailPath": row['thumbnail_path'],
+        "previewPath": row['preview_path'],
+        "derivativeStatus": row['derivative_status'],
+        "urls": {"original": url, "thumbnail": f"{url}?variant=thumbnail", "preview": f"{url}?variant=preview"},
+    }
+
+class PhotoUploadStats:
+    """Per-worker upload throughput counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"uploads": 0, "duplicates": 0, "rejected": 0, "bytes": 0, "receive_seconds": 0.0}
+
+    def record(self, outcome, size=0, seconds=0.0):
+        with self._lock:
+            self._stats[outcome] += 1
+            self._stats["bytes"] += size
+            self._stats["receive_seconds"] += seconds
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["receive_mb_per_second"] = (
+            round(stats["bytes"] / stats["receive_seconds"] / 1e6, 2) if stats["receive_seconds"] else None
+        )
+        return stats
+
+photo_upload_stats = PhotoUploadStats()
+
+def store_photo_upload(stream):
+    """
+    Streams an uploaded image to content-addressed storage and records it in photo_blob.
+    Returns (photo, is_new, None), or (None, False, (error, http_status)) if it was rejected.
+    """
+    incoming_dir = os.path.join(PHOTO_STORAGE_DIR, ".incoming")
+    os.makedirs(incoming_dir, exist_ok=True)
+    temp_path = os.path.join(incoming_dir, f"{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    size = 0
+    photo_type = None
+    start = time.perf_counter()
+    try:
+        with open(temp_path, 'wb') as f:
+            while True:
+                chunk = stream.read(PHOTO_UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if photo_type is None:
+                    photo_type = sniff_photo_type(chunk)
+                    if photo_type is None:
+                        photo_upload_stats.record("rejected")
+                        return None, False, ("The upload is not a JPEG, PNG, GIF or WebP image.", 415)
+                size += len(chunk)
+                if size > PHOTO_MAX_BYTES:
+                    photo_upload_stats.record("rejected")
+                    return None, False, (f"Photos are limited to {PHOTO_MAX_BYTES // (1024 * 1024)} MB.", 413)
+                hasher.update(chunk)
+                f.write(chunk)
+        if size == 0:
+            photo_upload_stats.record("rejected")
+            return None, False, ("The request body is empty; send the image bytes as the body.", 400)
+        receive_seconds = time.perf_counter() - start
+
+        content_hash = hasher.hexdigest()
+        content_type, extension = photo_type
+        file_path = f"{content_hash[:2]}/{content_hash}{extension}"
+        final_path = os.path.join(PHOTO_STORAGE_DIR, file_path)
+        if os.path.exists(final_path):
+            os.remove(temp_path) # Already stored; keep the existing file
+        else:
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+    finally:
+        if os.path.exists(temp_path): # A rejected or interrupted upload
+            os.remove(temp_path)
+
+    conn = get_db_connection()
+    try:
+        with conn:
+            is_new = conn.execute(
+                """INSERT INTO photo_blob (content_hash, file_path, content_type, size_bytes, derivative_status, uploaded_at)
+                   VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (content_hash) DO NOTHING""",
+                (content_hash, file_path, content_type, size, 'queued' if Image is not None else 'skipped', time.time())
+            ).rowcount == 1
+            photo = conn.execute(SQL_PHOTO_BLOB, (content_hash,)).fetchone()
+    finally:
+        release_db_connection(conn)
+
+    photo_upload_stats.record("uploads" if is_new else "duplicates", size, receive_seconds)
+    if photo['derivative_status'] == 'queued':
+        photo_derivative_queue.notify()
+    return photo, is_new, None
+
+class PhotoDerivativeQueue:
+    """
+    Makes thumbnails and previews for queued photo_blob rows on per-worker background threads.
+    Like SummarizeJobQueue, the table is the queue, so a photo uploaded through one gunicorn
+    worker can be processed by any of them and one abandoned by a dead worker is picked up again.
+    """
+
+    def __init__(self, worker_threads):
+        self.worker_threads = worker_threads
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_workers(self):
+        """Starts the worker threads in this process. Threads don't survive a fork, so this is checked per PID."""
+        if Image is None or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.worker_threads):
+                threading.Thread(target=self._drain, name=f"photo-worker-{i}", daemon=True).start()
+
+    def notify(self):
+        self.ensure_workers()
+        self._wakeup.set()
+
+    def _claim(self):
+        now = time.time()
+        stale_before = now - PHOTO_STALE_AFTER
+        conn = get_db_connection()
+        try:
+            # Idle workers poll; only take the write lock when there is something to claim
+            if conn.execute(
+                """SELECT 1 FROM photo_blob
+                   WHERE derivative_status = 'queued' OR (derivative_status = 'running' AND derive_started_at < ?) LIMIT 1""",
+                (stale_before,)
+            ).fetchone() is None:
+                return None
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT content_hash, file_path FROM photo_blob
+                   WHERE derivative_status = 'queued' OR (derivative_status = 'running' AND derive_started_at < ?)
+                   ORDER BY uploaded_at ASC LIMIT 1""",
+                (stale_before,)
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute(
+                "UPDATE photo_blob SET derivative_status = 'running', derive_started_at = ? WHERE content_hash = ?",
+                (now, row['content_hash'])
+            )
+            conn.commit()
+            return row['content_hash'], row['file_path']
+        finally:
+            release_db_connection(conn)
+
+    @staticmethod
+    def _make_derivatives(content_hash, file_path):
+        """Writes the JPEG thumbnail and preview next to the original and returns their relative paths."""
+        paths = []
+        with Image.open(os.path.join(PHOTO_STORAGE_DIR, file_path)) as original:
+            # Let the JPEG decoder downscale while decoding; the preview is the largest size needed
+            original.draft('RGB', (PHOTO_PREVIEW_SIZE, PHOTO_PREVIEW_SIZE))
+            image = ImageOps.exif_transpose(original).convert('RGB')
+        for variant, edge in (("preview", PHOTO_PREVIEW_SIZE), ("thumb", PHOTO_THUMBNAIL_SIZE)):
+            image.thumbnail((edge, edge)) # In place, keeping the aspect ratio; the preview feeds the thumbnail
+            relative_path = f"{content_hash[:2]}/{content_hash}-{variant}.jpg"
+            temp_path = os.path.join(PHOTO_STORAGE_DIR, relative_path + ".part")
+            image.save(temp_path, 'JPEG', quality=82, optimize=True)
+            os.replace(temp_path, os.path.join(PHOTO_STORAGE_DIR, relative_path))
+            paths.append(relative_path)
+        preview_path, thumbnail_path = paths
+        return thumbnail_path, preview_path
+
+    def _finish(self, content_hash, paths, error):
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.execute(
+                    """UPDATE photo_blob SET derivative_status = ?, thumbnail_path = ?, preview_path = ?,
+                       derivative_error = ?, derived_at = ? WHERE content_hash = ?""",
+                    ('failed' if error else 'done', *paths, error, time.time(), content_hash)
+                )
+        finally:
+            release_db_connection(conn)
+
+    def _drain(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming photo for thumbnailing: {e}")
+                job = None
+            if job is None:
+                # Wake on a local upload, or poll for photos uploaded through another worker
+                self._wakeup.wait(PHOTO_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            content_hash, file_path = job
+            try:
+                paths, error = self._make_derivatives(content_hash, file_path), None
+            except Exception as e: # Corrupt or truncated images, decompression bombs, disk errors
+                print(f"⚠️ Could not make thumbnails for photo {content_hash}: {e}")
+                paths, error = (None, None), str(e)
+            self._finish(content_hash, paths, error)
+
+    def stats(self):
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            counts = dict(conn.execute("SELECT derivative_status, COUNT(*) FROM photo_blob GROUP BY derivative_status").fetchall())
+            oldest_queued = conn.execute(
+                "SELECT MIN(uploaded_at) FROM photo_blob WHERE derivative_status = 'queued'"
+            ).fetchone()[0]
+            timing = conn.execute(
+                """SELECT COUNT(*), AVG(derive_started_at - uploaded_at), MAX(derive_started_at - uploaded_at),
+                          AVG(derived_at - derive_started_at), MAX(derived_at - derive_started_at)
+                   FROM photo_blob WHERE derived_at >= ?""",
+                (now - 3600,)
+            ).fetchone()
+        finally:
+            release_db_connection(conn)
+        return {
+            "pillow_available": Image is not None,
+            "queue_depth": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "done": counts.get('done', 0),
+            "failed": counts.get('failed', 0),
+            "skipped": counts.get('skipped', 0),
+            "queue_lag_seconds": now - oldest_queued if oldest_queued is not None else 0,
+            "worker_threads_per_process": self.worker_threads if Image is not None else 0,
+            "last_hour_processed": timing[0],
+            "avg_wait_seconds": timing[1],
+            "max_wait_seconds": timing[2],
+            "avg_processing_seconds": timing[3],
+            "max_processing_seconds": timing[4],
+        }
+
+photo_derivative_queue = PhotoDerivativeQueue(PHOTO_WORKER_THREADS)
+
+@app.route('/api/photos', methods=['POST'])
+def upload_photo():
+    """
+    Stores one inspection photo, sent as the raw request body (not multipart). Returns its
+    hash, which submit_inspection accepts in place of a file path. A photo that was already
+    uploaded returns 200 with the existing record instead of 201.
+    """
+    if request.content_length is not None and request.content_length > PHOTO_MAX_BYTES:
+        photo_upload_stats.record("rejected")
+        return jsonify({"error": f"Photos are limited to {PHOTO_MAX_BYTES // (1024 * 1024)} MB."}), 413
+    photo, is_new, error = store_photo_upload(request.stream)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    return jsonify(photo_payload(photo)), 201 if is_new else 200
+
+@app.route('/api/inspections/<int:inspection_id>/photos', methods=['POST'])
+def upload_inspection_photo(inspection_id):
+    """Stores a photo (as POST /api/photos does) and links it to an existing inspection. Takes ?description=."""
+    if request.content_length is not None and request.content_length > PHOTO_MAX_BYTES:
+        photo_upload_stats.record("rejected")
+        return jsonify({"error": f"Photos are limited to {PHOTO_MAX_BYTES // (1024 * 1024)} MB."}), 413
+    conn = get_db_connection()
+    try:
+        if conn.execute("SELECT 1 FROM inspections WHERE id = ?", (inspection_id,)).fetchone() is None:
+            return jsonify({"error": "Inspection not found"}), 404
+    finally:
+        release_db_connection(conn)
+
+    photo, is_new, error = store_photo_upload(request.stream)
+    if error:
+        return jsonify({"error": error[0]}), error[1]
+    conn = get_db_connection()
+    try:
+        with conn:
+            photo_id = conn.execute(
+                "INSERT INTO inspection_photos (inspection_id, file_path, content_hash, description) VALUES (?, ?, ?, ?)",
+                (inspection_id, photo['file_path'], photo['content_hash'], request.args.get('description'))
+            ).lastrowid
+    finally:
+        release_db_connection(conn)
+    return jsonify(dict(photo_payload(photo), id=photo_id)), 201
+
+@app.route('/api/photos/<content_hash>', methods=['GET'])
+def get_photo(content_hash):
+    """
+    Serves a stored photo: ?variant=thumbnail or preview for the downscaled JPEGs. Until
+    they exist (or without Pillow) the original is served, marked as not to be cached.
+    """
+    variant = request.args.get('variant', 'original')
+    if variant not in ('original', 'thumbnail', 'preview'):
+        return jsonify({"error": "'variant' must be original, thumbnail or preview"}), 400
+    conn = get_db_connection()
+    try:
+        photo = conn.execute(SQL_PHOTO_BLOB, (content_hash,)).fetchone()
+    finally:
+        release_db_connection(conn)
+    if photo is None:
+        return jsonify({"error": "Photo not found"}), 404
+
+    if variant != 'original' and photo[f'{variant}_path'] is not None:
+        relative_path, mimetype, is_final = photo[f'{variant}_path'], 'image/jpeg', True
+    else:
+        relative_path, mimetype, is_final = photo['file_path'], photo['content_type'], variant == 'original'
+    response = send_file(
+        os.path.join(PHOTO_STORAGE_DIR, relative_path), mimetype=mimetype,
+        conditional=True, etag=f"{content_hash}-{variant}" if is_final else content_hash
+    )
+    # Content-addressed: a given hash and variant never change once they exist
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable' if is_final else 'no-cache'
+    return response
+
+@app.route('/api/stats/photos')
+def photo_stats():
+    """Reports this worker's upload throughput and the shared thumbnail queue's depth and lag."""
+    return jsonify({"uploads": photo_upload_stats.stats(), "thumbnails": photo_derivative_queue.stats()}), 200
+
+
+# --- DASHBOARD ROLLUPS ---
+# quote_totals, the dashboard_* tables and inspection_item_result_rollup are kept current by
+# triggers in schema.sql, so the dashboard and inspection analytics read rollup rows instead of
+# scanning quotes, lines and results.
+# Each one also has a query that recomputes it from the base tables; --check-rollups compares
+# the two and --rebuild-rollups replaces the stored rows with the recomputed ones.
+
+SQL_RECOMPUTE_QUOTE_TOTALS = """SELECT id, parts_total, subcontractor_total, labor_total, parts_total + subcontractor_total + labor_total
+               FROM (
+                   SELECT q.id,
+                          (SELECT COALESCE(SUM(total_cost), 0) FROM quote_line_item WHERE quote_id = q.id) AS parts_total,
+                          (SELECT COALESCE(SUM(cost), 0) FROM subcontractor WHERE quote_id = q.id) AS subcontractor_total,
+                          COALESCE(q.tech_count * q.tech_hours * q.tech_rate, 0) + COALESCE(q.travel_hours * q.travel_rate, 0) AS labor_total
+                   FROM quote q
+               )"""
+SQL_RECOMPUTE_QUOTE_ROLLUP = f"""WITH totals (quote_id, parts_total, subcontractor_total, labor_total, total) AS ({SQL_RECOMPUTE_QUOTE_TOTALS})
+               SELECT COALESCE(strftime('%Y-%m', q.created_at), 'unknown'), q.status, COUNT(*), SUM(CAST(ROUND(t.total * 100) AS INTEGER))
+               FROM quote q JOIN totals t ON t.quote_id = q.id GROUP BY 1, 2"""
+SQL_RECOMPUTE_INSPECTION_ROLLUP = """SELECT COALESCE(strftime('%Y-%m', inspection_date), 'unknown'), checklist_id, COUNT(*)
+               FROM inspections GROUP BY 1, 2"""
+SQL_RECOMPUTE_RESULT_ROLLUP = """SELECT COALESCE(strftime('%Y-%m', i.inspection_date), 'unknown'), i.checklist_id, r.status, COUNT(*)
+               FROM inspection_results r JOIN inspections i ON i.id = r.inspection_id GROUP BY 1, 2, 3"""
+SQL_RECOMPUTE_ITEM_RESULT_ROLLUP = """SELECT i.checklist_id, COALESCE(strftime('%Y-%m', i.inspection_date), 'unknown'), r.checklist_item_id,
+                      r.status, COUNT(*)
+               FROM inspection_results r JOIN inspections i ON i.id = r.inspection_id GROUP BY 1, 2, 3, 4"""
+
+# (table, columns, recompute query) for every trigger-maintained rollup
+ROLLUPS = [
+    ("quote_totals", ("quote_id", "parts_total", "subcontractor_total", "labor_total", "total"), SQL_RECOMPUTE_QUOTE_TOTALS),
+    ("dashboard_quote_rollup", ("month", "status", "quote_count", "total_cents"), SQL_RECOMPUTE_QUOTE_ROLLUP),
+    ("dashboard_inspection_rollup", ("month", "checklist_id", "inspection_count"), SQL_RECOMPUTE_INSPECTION_ROLLUP),
+    ("dashboard_inspection_result_rollup", ("month", "checklist_id", "status", "result_count"), SQL_RECOMPUTE_RESULT_ROLLUP),
+    ("inspection_item_result_rollup", ("checklist_id", "month", "checklist_item_id", "status", "result_count"),
+     SQL_RECOMPUTE_ITEM_RESULT_ROLLUP),
+]
+
+SQL_DASHBOARD_QUOTES = """SELECT month, status, quote_count, total_cents FROM dashboard_quote_rollup
+               WHERE month BETWEEN ? AND ? ORDER BY month, status"""
+SQL_DASHBOARD_INSPECTIONS = """SELECT month, SUM(inspection_count) FROM dashboard_inspection_rollup
+               WHERE month BETWEEN :from AND :to AND (:checklist IS NULL OR checklist_id = :checklist) GROUP BY month"""
+SQL_DASHBOARD_RESULTS = """SELECT month, status, SUM(result_count) FROM dashboard_inspection_result_rollup
+               WHERE month BETWEEN :from AND :to AND (:checklist IS NULL OR checklist_id = :checklist) GROUP BY month, status"""
 
+def check_rollups(conn):
+    """
+    Compares every rollup table with a recompute from the base tables, inside one read
+    transaction so concurrent saves can't cause false alarms. Returns {table: (missing,
+    unexpected)} for tables that differ: recomputed rows absent from the table, and stored
+    rows the recompute doesn't produce. Values must match exactly.
+    """
+    mismatches = {}
+    conn.execute("BEGIN")
+    try:
+        for table, columns, recompute_sql in ROLLUPS:
+            stored = {tuple(row) for row in conn.execute(f"SELECT {', '.join(columns)} FROM {table}")}
+            expected = {tuple(row) for row in conn.execute(recompute_sql)}
+            if stored != expected:
+                mismatches[table] = (sorted(expected - stored, key=str), sorted(stored - expected, key=str))
+    finally:
+        conn.rollback()
+    return mismatches
+
+def rebuild_rollups(conn):
+    """Replaces every rollup table's contents with a recompute from the base tables, in one transaction."""
+    with conn:
+        for table, columns, recompute_sql in ROLLUPS:
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(f"INSERT INTO {table} ({', '.join(columns)}) {recompute_sql}")
+
+@app.route('/api/dashboard')
+def get_dashboard():
+    """
+    Quote volume and value by month and status, and inspection result counts and pass rates
+    by month, read only from the rollup tables. Query parameters: from and to (YYYY-MM,
+    inclusive) and checklistId to limit the inspection figures to one checklist.
+    """
+    month_from = request.args.get('from', '0000-00')
+    month_to = request.args.get('to', '9999-99')
+    if not all(re.fullmatch(r"\d{4}-\d{2}", month) for month in (month_from, month_to)):
+        return jsonify({"error": "'from' and 'to' must be months in YYYY-MM format"}), 400
+    try:
+        checklist_id = int(request.args['checklistId']) if request.args.get('checklistId') else None
+    except ValueError:
+        return jsonify({"error": "'checklistId' must be an integer"}), 400
+
+    conn = get_db_connection()
+    try:
+        quote_rows = conn.execute(SQL_DASHBOARD_QUOTES, (month_from, month_to)).fetchall()
+        params = {"from": month_from, "to": month_to, "checklist": checklist_id}
+        inspection_rows = conn.execute(SQL_DASHBOARD_INSPECTIONS, params).fetchall()
+        result_rows = conn.execute(SQL_DASHBOARD_RESULTS, params).fetchall()
+    finally:
+        release_db_connection(conn)
+
+    by_status = {}
+    for month, status, count, cents in quote_rows:
+        totals = by_status.setdefault(status, [0, 0])
+        totals[0] += count
+        totals[1] += cents
+    quote_count = sum(count for count, _ in by_status.values())
+    quote_cents = sum(cents for _, cents in by_status.values())
+
+    def pass_rate(results):
+        checked = results.get('Passed', 0) + results.get('Failed', 0)
+        return round(results.get('Passed', 0) / checked, 4) if checked else None
+
+    months = {month: {"month": month, "inspections": count, "results": {}} for month, count in inspection_rows}
+    all_results = {}
+    for month, status, count in result_rows:
+        months.setdefault(month, {"month": month, "inspections": 0, "results": {}})["results"][status] = count
+        all_results[status] = all_results.get(status, 0) + count
+    for entry in months.values():
+        entry["passRate"] = pass_rate(entry["results"])
+
+    return jsonify({
+        "quotes": {
+            "count": quote_count,
+            "total": quote_cents / 100,
+            "averageValue": round(quote_cents / 100 / quote_count, 2) if quote_count else None,
+            "conversionRate": round(by_status.get('Accepted', (0, 0))[0] / quote_count, 4) if quote_count else None,
+            "byStatus": [{"status": status, "count": count, "total": cents / 100} for status, (count, cents) in sorted(by_status.items())],
+            "byMonth": [{"month": month, "status": status, "count": count, "total": cents / 100} for month, status, count, cents in quote_rows]
+        },
+        "inspections": {
+            "count": sum(entry["inspections"] for entry in months.values()),
+            "results": all_results,
+            "passRate": pass_rate(all_results),
+            "byMonth": [months[month] for month in sorted(months)]
+        }
+    }), 200
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Request, SQL and LLM metrics of every API worker (and of retired ones) in the Prometheus text
+    format. Each worker's figures are at most METRICS_FLUSH_INTERVAL seconds old (this worker's are current).
+    """
+    return app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/stats/metrics')
+def metrics_summary():
+    """Request, SQL and LLM latency histograms of every worker, summarized as count and p50/p95/p99."""
+    return jsonify(metrics.summary()), 200
+
+@app.route('/api/stats/slow-queries')
+def slow_queries():
+    """This worker's most recent SQLite calls slower than METRICS_SLOW_QUERY_MS, newest first."""
+    return jsonify({"thresholdMs": METRICS_SLOW_QUERY_MS, "queries": list(reversed(metrics.slow_queries))}), 200
 
 @app.route('/health')
 def health_check():
     """Simple health check endpoint for Docker."""
     return jsonify({"status": "healthy"}), 200
 
-@app.route('/summarize', methods=['POST'])
-def summarize_writeup():
-    """
-    Receives a service write-up and uses an LLM to generate
-    a customer-facing quote description, potentially extracting tech info.
-    """
-    data = request.get_json()
-    if not data or 'writeup' not in data:
-        return jsonify({"error": "Missing 'writeup' in request body"}), 400
+@app.route('/api/stats/service-call-cache')
+def service_call_cache_stats():
+    """Reports hit/miss/eviction counters for this worker's service call payload cache."""
+    return jsonify(service_call_cache.stats()), 200
+
+@app.route('/api/stats/reference-data')
+def reference_data_stats():
+    """Reports size, memory and load time of this worker's in-memory ERP reference data."""
+    return jsonify(reference_data.stats()), 200
 
-    service_writeup = data['writeup']
+@app.route('/api/stats/checklist-cache')
+def checklist_cache_stats():
+    """Reports hit/miss counters for this worker's checklist payload cache."""
+    return jsonify(checklist_cache.stats()), 200
+
+@app.route('/api/stats/parts-index')
+def parts_index_stats():
+    """Reports the size of this worker's parts typeahead index and its result cache counters."""
+    return jsonify({"index": parts_index.stats(), "cache": parts_autocomplete_cache.stats()}), 200
+
+@app.route('/api/stats/db-pool')
+def db_pool_stats():
+    """Reports connection pool usage for this worker along with the PRAGMAs in effect."""
+    conn = get_db_connection()
+    try:
+        pragmas = {
+            name: conn.execute(f"PRAGMA {name}").fetchone()[0]
+            for name in ("journal_mode", "synchronous", "cache_size", "mmap_size", "busy_timeout", "foreign_keys")
+        }
+    finally:
+        release_db_connection(conn)
+    return jsonify({"pool": db_pool.stats(), "pragmas": pragmas}), 200
 
+def build_summary_prompt(service_writeup):
+    """Builds the LLM prompt that turns a technician's write-up into a quote description."""
     # --- Enhanced Prompt ---
     prompt = f"""You are an expert technical writer for a generator repair company.
     A technician provided this repair write-up that covers what is needed for the future repair of the generator. Your task is to:
@@ -496,25 +2658,248 @@ def summarize_writeup():
     "{service_writeup}"
 
     JSON Response:"""
+    return prompt
 
-    llm_output, error = call_localai(prompt, expect_json=True)
+def summarize_service_writeup(service_writeup, bypass_cache=False):
+    """Runs the summarization prompt through the LLM. Returns (result_dict, error_message)."""
+    llm_output, error = call_localai(build_summary_prompt(service_writeup), expect_json=True, bypass_cache=bypass_cache)
 
     if error:
-        return jsonify({"error": error}), 503
+        return None, error
+
+    return extract_summary_fields(llm_output), None
 
+def extract_summary_fields(llm_output):
+    """Pulls the fields the quote sheet uses out of the LLM's JSON reply, with defaults."""
     # --- Extract Data ---
-    customer_description = llm_output.get("customer_description", "")
-    tech_count = llm_output.get("tech_count", 0)
-    tech_hours = llm_output.get("tech_hours", 0)
-    travel_days = llm_output.get("travel_days", 0)
+    return {
+        "customer_description": llm_output.get("customer_description", ""),
+        "tech_count": llm_output.get("tech_count", 0),
+        "tech_hours": llm_output.get("tech_hours", 0),
+        "travel_days": llm_output.get("travel_days", 0)
+    }
+
+@app.route('/summarize', methods=['POST'])
+def summarize_writeup():
+    """
+    Receives a service write-up and uses an LLM to generate
+    a customer-facing quote description, potentially extracting tech info.
+    This blocks the worker for the whole generation; prefer /summarize/jobs.
+    Pass "refresh": true to bypass the LLM cache and force a new generation.
+    """
+    data = request.get_json()
+    if not data or 'writeup' not in data:
+        return jsonify({"error": "Missing 'writeup' in request body"}), 400
+
+    result, error = summarize_service_writeup(data['writeup'], bypass_cache=bool(data.get('refresh')))
+    if error:
+        return jsonify({"error": error}), 503
 
     # --- Return Combined Result ---
-    return jsonify({
-        "customer_description": customer_description,
-        "tech_count": tech_count,
-        "tech_hours": tech_hours,
-        "travel_days": travel_days
-    }), 200
+    return jsonify(result), 200
+
+# --- SUMMARIZATION JOB QUEUE ---
+# Jobs live in the summarize_job table so any gunicorn worker can answer a poll, and
+# each worker runs a few background threads that claim queued jobs and call the LLM.
+# Request threads only insert a row and return, so LLM latency never pins a worker.
+
+class SummarizeJobQueue:
+    """A bounded, SQLite-backed job queue drained by per-worker background threads."""
+
+    def __init__(self, max_queued, worker_threads):
+        self.max_queued = max_queued
+        self.worker_threads = worker_threads
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_workers(self):
+        """Starts the drain threads in this process. Threads don't survive a fork, so this is checked per PID."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.worker_threads):
+                threading.Thread(target=self._drain, name=f"summarize-worker-{i}", daemon=True).start()
+
+    def submit(self, service_writeup, bypass_cache=False):
+        """Enqueues a write-up. Returns (job_id, None), or (None, retry_after_seconds) if the queue is full."""
+        self.ensure_workers()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE") # Serialize the depth check and insert across workers
+            depth = conn.execute("SELECT COUNT(*) FROM summarize_job WHERE status = 'queued'").fetchone()[0]
+            if depth >= self.max_queued:
+                conn.rollback()
+                return None, self._estimate_retry_after(conn, depth)
+            conn.execute(
+                "INSERT INTO summarize_job (id, status, writeup, bypass_cache, created_at) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, service_writeup, int(bypass_cache), now)
+            )
+            conn.execute(
+                "DELETE FROM summarize_job WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (now - SUMMARIZE_JOB_RETENTION,)
+            )
+            conn.commit()
+        finally:
+            release_db_connection(conn)
+        self._wakeup.set()
+        return job_id, None
+
+    def get(self, job_id):
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT id, status, result, error, created_at, started_at, finished_at FROM summarize_job WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = {"jobId": row['id'], "status": row['status']}
+            if row['status'] == 'queued':
+                job["position"] = conn.execute(
+                    "SELECT COUNT(*) FROM summarize_job WHERE status = 'queued' AND created_at <= ?",
+                    (row['created_at'],)
+                ).fetchone()[0]
+            if row['result'] is not None:
+                job["result"] = json.loads(row['result'])
+            if row['error'] is not None:
+                job["error"] = row['error']
+            return job
+        finally:
+            release_db_connection(conn)
+
+    def _estimate_retry_after(self, conn, depth):
+        avg_llm_seconds = conn.execute(
+            """SELECT AVG(finished_at - started_at) FROM
+               (SELECT finished_at, started_at FROM summarize_job WHERE finished_at IS NOT NULL
+                ORDER BY finished_at DESC LIMIT 20)"""
+        ).fetchone()[0] or 30
+        return max(1, math.ceil(avg_llm_seconds * depth / max(1, self.worker_threads)))
+
+    def _claim(self):
+        """Atomically moves the oldest queued (or abandoned running) job to 'running' and returns it."""
+        now = time.time()
+        stale_before = now - SUMMARIZE_STALE_AFTER # A worker that died mid-job leaves it 'running'
+        conn = get_db_connection()
+        try:
+            # Idle workers poll; only take the write lock when there is something to claim
+            if conn.execute(
+                "SELECT 1 FROM summarize_job WHERE status = 'queued' OR (status = 'running' AND started_at < ?) LIMIT 1",
+                (stale_before,)
+            ).fetchone() is None:
+                return None
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """SELECT id, writeup, bypass_cache FROM summarize_job
+                   WHERE status = 'queued' OR (status = 'running' AND started_at < ?)
+                   ORDER BY created_at ASC LIMIT 1""",
+                (stale_before,)
+            ).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute("UPDATE summarize_job SET status = 'running', started_at = ? WHERE id = ?", (now, row['id']))
+            conn.commit()
+            return row['id'], row['writeup'], bool(row['bypass_cache'])
+        finally:
+            release_db_connection(conn)
+
+    def _finish(self, job_id, result, error):
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.execute(
+                    "UPDATE summarize_job SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                    ('failed' if error else 'done', json.dumps(result) if result is not None else None, error, time.time(), job_id)
+                )
+        finally:
+            release_db_connection(conn)
+
+    def _drain(self):
+        while True:
+            try:
+                job = self._claim()
+            except sqlite3.Error as e:
+                print(f"Error claiming summarize job: {e}")
+                job = None
+            if job is None:
+                # Wake on a local submit, or poll for jobs submitted through another worker
+                self._wakeup.wait(SUMMARIZE_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            job_id, service_writeup, bypass_cache = job
+            try:
+                result, error = summarize_service_writeup(service_writeup, bypass_cache)
+            except Exception as e:
+                print(f"Unexpected error in summarize job {job_id}: {e}")
+                result, error = None, "An unexpected server error occurred while summarizing."
+            self._finish(job_id, result, error)
+
+    def stats(self):
+        conn = get_db_connection()
+        try:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM summarize_job GROUP BY status").fetchall())
+            timing = conn.execute(
+                """SELECT COUNT(*), AVG(started_at - created_at), MAX(started_at - created_at),
+                          AVG(finished_at - started_at), MAX(finished_at - started_at)
+                   FROM summarize_job WHERE finished_at IS NOT NULL AND finished_at >= ?""",
+                (time.time() - SUMMARIZE_JOB_RETENTION,)
+            ).fetchone()
+        finally:
+            release_db_connection(conn)
+        return {
+            "queue_depth": counts.get('queued', 0),
+            "running": counts.get('running', 0),
+            "done": counts.get('done', 0),
+            "failed": counts.get('failed', 0),
+            "max_queued": self.max_queued,
+            "worker_threads_per_process": self.worker_threads,
+            "recent_jobs": timing[0],
+            "avg_wait_seconds": timing[1],
+            "max_wait_seconds": timing[2],
+            "avg_llm_seconds": timing[3],
+            "max_llm_seconds": timing[4],
+        }
+
+summarize_queue = SummarizeJobQueue(SUMMARIZE_QUEUE_LIMIT, SUMMARIZE_WORKER_THREADS)
+
+@app.route('/summarize/jobs', methods=['POST'])
+def submit_summarize_job():
+    """
+    Queues a write-up for summarization and immediately returns a job ID to poll.
+    Pass "refresh": true to bypass the LLM cache and force a new generation.
+    """
+    data = request.get_json()
+    if not data or 'writeup' not in data:
+        return jsonify({"error": "Missing 'writeup' in request body"}), 400
+
+    job_id, retry_after = summarize_queue.submit(data['writeup'], bypass_cache=bool(data.get('refresh')))
+    if job_id is None:
+        response = jsonify({"error": "The summarization queue is full. Please try again shortly."})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
+    response = jsonify({"jobId": job_id, "status": "queued"})
+    response.headers['Location'] = f"/summarize/jobs/{job_id}"
+    return response, 202
+
+@app.route('/summarize/jobs/<job_id>', methods=['GET'])
+def get_summarize_job(job_id):
+    """Returns a summarization job's status, plus its result once it has finished."""
+    job = summarize_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/api/stats/summarize-queue')
+def summarize_queue_stats():
+    """Reports queue depth, wait time and LLM latency for summarization jobs."""
+    return jsonify(summarize_queue.stats()), 200
 
 # --- APPLICATION STARTUP ---
 
@@ -524,30 +2909,182 @@ try:
 except Exception as e:
     print(f"🔴 CRITICAL: An error occurred during database setup: {e}")
 
+# Load the ERP reference data up front (before gunicorn forks its workers, with --preload)
+try:
+    conn = get_db_connection()
+    try:
+        reference_data.on_hand(conn)
+    finally:
+        release_db_connection(conn)
+    print(f"✅ Loaded ERP reference data: {reference_data.stats()['items']} items on hand.")
+except Exception as e:
+    print(f"⚠️ Could not preload ERP reference data; it will load on first use. Details: {e}")
+
+def start_background_workers():
+    """
+    Starts this process's background threads: the summarize job drainers and the photo
+    thumbnailers, which resume work left queued by a restart, or running by a dead worker,
+    without waiting for a new submission or upload; and the metrics flusher.
+    """
+    summarize_queue.ensure_workers()
+    photo_derivative_queue.ensure_workers()
+    metrics.ensure_flusher()
+
+# Each gunicorn worker starts them as soon as it is forked. Threads don't survive a fork, so
+# with --preload the master (which imports this module) never runs them for the workers.
+os.register_at_fork(after_in_child=start_background_workers)
+
+@app.before_request
+def ensure_background_workers():
+    # Servers that don't fork from a preloaded master start them on their first request
+    start_background_workers()
+
 # Updated LocalAI integration
 import requests
 import os
 
-def call_localai(prompt, expect_json=False):
-    """Call LocalAI API with the given prompt. Returns (content, error_message)."""
+class LLMResponseCache:
+    """
+    A persistent, content-addressed cache of LLM completions stored in the llm_cache table.
+    Keys hash the normalized prompt with the model name and generation parameters, the
+    table is trimmed to max_entries by least-recent use, and concurrent identical calls
+    within a worker are coalesced so only one of them reaches LocalAI.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> {"event": Event, "result": (content, error, seconds)}
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0, "llm_seconds_saved": 0.0}
+
+    @staticmethod
+    def make_key(prompt, model, params):
+        normalized_prompt = " ".join(prompt.split()) # Whitespace differences shouldn't miss the cache
+        material = json.dumps({"prompt": normalized_prompt, "model": model, "params": params}, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        conn = get_db_connection()
+        try:
+            with conn:
+                row = conn.execute("SELECT content, llm_seconds FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE llm_cache SET hit_count = hit_count + 1, last_used_at = ? WHERE key = ?",
+                        (time.time(), key)
+                    )
+        finally:
+            release_db_connection(conn)
+        with self._lock:
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["llm_seconds_saved"] += row['llm_seconds'] or 0.0
+        return row['content']
+
+    def put(self, key, model, content, llm_seconds):
+        now = time.time()
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.execute(
+                    """INSERT INTO llm_cache (key, model, content, llm_seconds, created_at, last_used_at)
+                       VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(key) DO UPDATE SET content = excluded.content, llm_seconds = excluded.llm_seconds,
+                                                      last_used_at = excluded.last_used_at""",
+                    (key, model, content, llm_seconds, now, now)
+                )
+                conn.execute(
+                    """DELETE FROM llm_cache WHERE key IN (
+                           SELECT key FROM llm_cache ORDER BY last_used_at ASC
+                           LIMIT MAX(0, (SELECT COUNT(*) FROM llm_cache) - ?))""",
+                    (self.max_entries,)
+                )
+        finally:
+            release_db_connection(conn)
+
+    def discard(self, key):
+        """Deletes a cached entry, e.g. one that no longer passes validation."""
+        conn = get_db_connection()
+        try:
+            with conn:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+        finally:
+            release_db_connection(conn)
+
+    def single_flight(self, key, fn):
+        """
+        Runs fn() unless an identical call is already in flight in this worker, in which case
+        it waits for and shares that call's result. Returns (result, was_shared).
+        """
+        with self._lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = {"event": threading.Event(), "result": (None, "LLM call failed", 0.0)}
+                self._in_flight[key] = call
+            else:
+                self._stats["coalesced"] += 1
+        if not is_leader:
+            call["event"].wait()
+            return call["result"], True
+        try:
+            call["result"] = fn()
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call["event"].set()
+        return call["result"], False
+
+    def record_bypass(self):
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def stats(self):
+        conn = get_db_connection()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(content)), 0), COALESCE(SUM(hit_count), 0), "
+                "COALESCE(SUM(hit_count * llm_seconds), 0) FROM llm_cache"
+            ).fetchone()
+        finally:
+            release_db_connection(conn)
+        with self._lock:
+            worker = dict(self._stats)
+        lookups = worker["hits"] + worker["misses"]
+        worker["hit_rate"] = round(worker["hits"] / lookups, 4) if lookups else 0.0
+        return {
+            "entries": row[0], "max_entries": self.max_entries, "content_bytes": row[1],
+            "total_hits": row[2], "total_llm_seconds_saved": round(row[3], 3),
+            "worker": worker,
+        }
+
+llm_cache = LLMResponseCache(LLM_CACHE_MAX_ENTRIES)
+
+# One pooled HTTP session per worker so LLM calls reuse keep-alive connections to LocalAI
+localai_session = requests.Session()
+localai_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=LOCALAI_POOL_SIZE))
+localai_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=LOCALAI_POOL_SIZE))
+
+def request_localai_completion(prompt):
+    """Sends one chat completion request to LocalAI. Returns (content, error_message, seconds_taken)."""
+    started = time.monotonic()
     try:
-        # LocalAI endpoint (using host.docker.internal to connect to the host)
-        url = "http://host.docker.internal:4444/v1/chat/completions"
-        
         headers = {
             "Content-Type": "application/json"
         }
         
         data = {
-            "model": "mistral-7b-instruct-v0.3",  # Your downloaded model
+            "model": LOCALAI_MODEL,
             "messages": [
                 {"role": "user", "content": prompt}
             ],
-            "temperature": 0.7,
-            "max_tokens": 500
+            "temperature": LOCALAI_TEMPERATURE,
+            "max_tokens": LOCALAI_MAX_TOKENS
         }
         
-        response = requests.post(url, json=data, headers=headers, timeout=90)
+        response = localai_session.post(LOCALAI_URL, json=data, headers=headers, timeout=LOCALAI_TIMEOUT)
         response.raise_for_status() # Raise an exception for bad status codes (4xx or 5xx)
         
         result = response.json()
@@ -555,27 +3092,266 @@ def call_localai(prompt, expect_json=False):
 
         if not content:
             print(f"LocalAI response missing content: {result}")
-            return None, "LLM response was empty or malformed"
+            return None, "LLM response was empty or malformed", time.monotonic() - started
 
-        if expect_json:
-            try:
-                return json.loads(content), None
-            except json.JSONDecodeError:
-                print(f"LLM did not return valid JSON: {content}")
-                return None, "LLM did not return valid JSON"
-            
-        return content, None
+        return content, None, time.monotonic() - started
         
     except requests.exceptions.RequestException as e:
         print(f"Error connecting to LocalAI service: {e}")
-        return None, "Failed to connect to the LLM service. Is it running?"
+        return None, "Failed to connect to the LLM service. Is it running?", time.monotonic() - started
     except Exception as e:
         # Catch-all for other unexpected errors (e.g., JSON decoding)
         print(f"An unexpected error occurred in call_localai: {e}")
-        return None, "An unexpected server error occurred while calling the LLM."
+        return None, "An unexpected server error occurred while calling the LLM.", time.monotonic() - started
+
+def parse_llm_json(content):
+    """Returns an LLM reply parsed as a JSON object, or None if it isn't one."""
+    try:
+        parsed = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+def call_localai(prompt, expect_json=False, bypass_cache=False):
+    """
+    Call LocalAI API with the given prompt. Returns (content, error_message).
+    With expect_json the content is the reply parsed as a JSON object.
+    Responses are served from the persistent LLM cache when possible; pass
+    bypass_cache=True to force a fresh generation (which then replaces the cached one).
+    """
+    params = {"temperature": LOCALAI_TEMPERATURE, "max_tokens": LOCALAI_MAX_TOKENS}
+    key = LLMResponseCache.make_key(prompt, LOCALAI_MODEL, params)
+
+    content = None
+    if bypass_cache:
+        llm_cache.record_bypass()
+    else:
+        content = llm_cache.get(key)
+        if content is not None and expect_json:
+            parsed = parse_llm_json(content)
+            if parsed is None:
+                # Stored before replies had to be JSON objects; treat it as a miss
+                print(f"⚠️ Discarding a cached LLM reply that is not a JSON object: {content[:200]}")
+                llm_cache.discard(key)
+                content = None
+
+    if content is None:
+        (content, error, seconds), was_shared = llm_cache.single_flight(key, lambda: request_localai_completion(prompt))
+        if was_shared:
+            seconds = None # Counted once, by the request that made the call
+        if error:
+            record_llm_call("completion", "coalesced" if was_shared else "error", seconds)
+            return None, error
+        if expect_json:
+            parsed = parse_llm_json(content)
+            if parsed is None:
+                print(f"LLM did not return a JSON object: {content}")
+                record_llm_call("completion", "coalesced" if was_shared else "invalid_json", seconds)
+                return None, "LLM did not return valid JSON"
+        record_llm_call("completion", "coalesced" if was_shared else "ok", seconds)
+        if not was_shared:
+            llm_cache.put(key, LOCALAI_MODEL, content, seconds) # Only cache output that passed validation
+        return (parsed if expect_json else content), None
+
+    record_llm_call("completion", "cache_hit")
+    return (parsed if expect_json else content), None
+
+def stream_localai_completion(prompt):
+    """
+    Streams a chat completion from LocalAI, yielding text fragments as they arrive.
+    Uses the OpenAI-compatible server-sent events format ("data: {...}" lines ending in [DONE]).
+    Raises requests exceptions on connection or HTTP errors and ValueError on a malformed chunk.
+    """
+    data = {
+        "model": LOCALAI_MODEL,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": LOCALAI_TEMPERATURE,
+        "max_tokens": LOCALAI_MAX_TOKENS,
+        "stream": True
+    }
+    with localai_session.post(LOCALAI_URL, json=data, stream=True, timeout=LOCALAI_TIMEOUT) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            payload = line[len("data:"):].strip()
+            if payload == "[DONE]":
+                continue # Keep reading to the end of the body so the pooled connection can be reused
+            try:
+                chunk = json.loads(payload)
+                fragment = (chunk.get('choices') or [{}])[0].get('delta', {}).get('content')
+            except (ValueError, AttributeError, IndexError, TypeError) as e:
+                raise ValueError(f"Malformed stream chunk from LocalAI: {payload[:200]}") from e
+            if fragment:
+                yield fragment
+
+class LLMStreamStats:
+    """Per-worker counters for streamed generations, including time-to-first-token."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"streams": 0, "failed": 0, "rejected": 0, "cache_hits": 0,
+                       "ttft_seconds_total": 0.0, "ttft_seconds_max": 0.0, "total_seconds_total": 0.0}
+
+    def record(self, outcome, ttft_seconds=None, total_seconds=None):
+        with self._lock:
+            self._stats[outcome] += 1
+            if ttft_seconds is not None:
+                self._stats["ttft_seconds_total"] += ttft_seconds
+                self._stats["ttft_seconds_max"] = max(self._stats["ttft_seconds_max"], ttft_seconds)
+                self._stats["total_seconds_total"] += total_seconds
+
+    def stats(self):
+        with self._lock:
+            result = dict(self._stats)
+        streams = result["streams"]
+        result["avg_ttft_seconds"] = result["ttft_seconds_total"] / streams if streams else None
+        result["avg_total_seconds"] = result["total_seconds_total"] / streams if streams else None
+        return result
+
+llm_stream_stats = LLMStreamStats()
+summarize_stream_slots = threading.BoundedSemaphore(SUMMARIZE_STREAM_LIMIT)
+
+def sse_event(event, data):
+    """Formats one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/summarize/stream', methods=['POST'])
+def stream_summarize_writeup():
+    """
+    Streams the LLM's summary of a service write-up as server-sent events:
+    "token" events carry text fragments as they are generated, then a single "result"
+    event carries the validated fields (same shape as /summarize) or an "error" event.
+    Pass "refresh": true to bypass the LLM cache.
+    """
+    data = request.get_json()
+    if not data or 'writeup' not in data:
+        return jsonify({"error": "Missing 'writeup' in request body"}), 400
+
+    if not summarize_stream_slots.acquire(blocking=False):
+        llm_stream_stats.record("rejected")
+        response = jsonify({"error": "Too many summaries are being generated. Please try again shortly."})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+
+    prompt = build_summary_prompt(data['writeup'])
+    bypass_cache = bool(data.get('refresh'))
+    key = LLMResponseCache.make_key(prompt, LOCALAI_MODEL, {"temperature": LOCALAI_TEMPERATURE, "max_tokens": LOCALAI_MAX_TOKENS})
+    slot = [True]
+
+    def release_slot():
+        """Frees the slot exactly once: when the stream ends, or when the response is closed before it starts."""
+        try:
+            slot.pop()
+        except IndexError:
+            return
+        summarize_stream_slots.release()
+
+    def generate():
+        started = time.monotonic()
+        ttft = None
+        try:
+            content = None if bypass_cache else llm_cache.get(key)
+            if content is not None and parse_llm_json(content) is None:
+                print(f"⚠️ Discarding a cached LLM reply that is not a JSON object: {content[:200]}")
+                llm_cache.discard(key)
+                content = None
+            if content is not None:
+                llm_stream_stats.record("cache_hits")
+                record_llm_call("stream", "cache_hit")
+                yield sse_event("token", {"text": content})
+            else:
+                fragments = []
+                for fragment in stream_localai_completion(prompt):
+                    if ttft is None:
+                        ttft = time.monotonic() - started
+                    fragments.append(fragment)
+                    yield sse_event("token", {"text": fragment})
+                content = "".join(fragments)
+
+            # The JSON-extraction contract is validated once the whole reply has arrived
+            llm_output = parse_llm_json(content)
+            if llm_output is None:
+                print(f"LLM did not return a JSON object: {content}")
+                llm_stream_stats.record("failed")
+                record_llm_call("stream", "invalid_json", time.monotonic() - started if ttft is not None else None)
+                yield sse_event("error", {"error": "LLM did not return valid JSON"})
+                return
+
+            total = time.monotonic() - started
+            result = extract_summary_fields(llm_output)
+            result["ttft_ms"] = round(ttft * 1000, 1) if ttft is not None else 0.0
+            if ttft is not None:
+                llm_stream_stats.record("streams", ttft, total)
+                record_llm_call("stream", "ok", total)
+                llm_cache.put(key, LOCALAI_MODEL, content, total) # Only cache output that passed validation
+            yield sse_event("result", result)
+        except requests.exceptions.RequestException as e:
+            print(f"Error connecting to LocalAI service: {e}")
+            llm_stream_stats.record("failed")
+            record_llm_call("stream", "error", time.monotonic() - started)
+            yield sse_event("error", {"error": "Failed to connect to the LLM service. Is it running?"})
+        except Exception as e:
+            # e.g. a malformed chunk: still end the stream with an error event rather than cutting it off
+            print(f"Error streaming from LocalAI service: {e}")
+            llm_stream_stats.record("failed")
+            record_llm_call("stream", "error", time.monotonic() - started)
+            yield sse_event("error", {"error": "The LLM service returned an invalid response."})
+        finally:
+            release_slot()
+
+    response = app.response_class(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no', # Tell nginx to pass events through instead of buffering them
+    })
+    # Closing a generator that never started doesn't run its finally block
+    response.call_on_close(release_slot)
+    return response
+
+@app.route('/api/stats/llm-stream')
+def llm_stream_stats_endpoint():
+    """Reports streamed generation counts and time-to-first-token for this worker."""
+    return jsonify(llm_stream_stats.stats()), 200
+
+@app.route('/api/stats/llm-cache')
+def llm_cache_stats():
+    """Reports LLM cache size, hit rate and the LLM time saved by cache hits."""
+    return jsonify(llm_cache.stats()), 200
 
 # The if __name__ == '__main__' block is kept for convenience, allowing you to
 # run the server directly in a local environment (outside of Docker) for debugging.
 if __name__ == '__main__':
+    if '--check-query-plans' in sys.argv:
+        # Used after ETL loads and in CI: exit non-zero if any hot query falls back to a scan.
+        conn = get_db_connection()
+        try:
+            scans = find_query_plan_scans(conn)
+        finally:
+            release_db_connection(conn)
+        for sql, detail in scans:
+            print(f"❌ {detail}: {sql}")
+        if scans:
+            sys.exit(1)
+        print(f"✅ All {len(HOT_QUERIES)} hot queries use an index.")
+        sys.exit(0)
+    if '--check-rollups' in sys.argv or '--rebuild-rollups' in sys.argv:
+        # Consistency check for the trigger-maintained rollups; exits non-zero on any difference.
+        conn = get_db_connection()
+        try:
+            if '--rebuild-rollups' in sys.argv:
+                rebuild_rollups(conn)
+                print(f"✅ Rebuilt {len(ROLLUPS)} rollup tables from the base tables.")
+            mismatches = check_rollups(conn)
+        finally:
+            release_db_connection(conn)
+        for table, (missing, unexpected) in mismatches.items():
+            print(f"❌ {table}: {len(missing)} rows missing or wrong, {len(unexpected)} unexpected. "
+                  f"First expected: {missing[:3]}; first stored: {unexpected[:3]}")
+        if mismatches:
+            sys.exit(1)
+        print(f"✅ All {len(ROLLUPS)} rollup tables match a recompute from the base tables.")
+        sys.exit(0)
     print("--- Starting Quote API Server in local debug mode ---")
     app.run(host='0.0.0.0', port=3000, debug=True)
@@ -16,6 +16,8 @@ document.addEventListener('DOMContentLoaded', () => {
     const checklistTbody = document.getElementById('checklist-items-tbody');
     const unitStatusSelect = document.getElementById('unit-status');
     const overallCommentsTextarea = document.getElementById('overall-comments');
+    const photoUploadInput = document.getElementById('photo-upload');
+    const photoPreviews = document.getElementById('photo-previews');
     const submitBtn = document.getElementById('submit-inspection-btn');
     const saveDraftBtn = document.getElementById('save-draft-btn');
 
@@ -23,16 +25,28 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentQuoteId = null;
     let currentChecklistId = null;
     let checklistItems = [];
+    let uploadedPhotos = []; // { hash } per photo uploaded for this inspection
 
     // --- API Functions ---
     const api = {
         getChecklists: () => fetch(`${API_BASE_URL}/checklists`).then(res => res.json()),
-        getChecklistItems: (id) => fetch(`${API_BASE_URL}/checklists/${id}/items`).then(res => res.json()),
+        // One request for the checklist and its items; the ETag lets the browser cache revalidate it with a 304
+        getChecklist: (id) => fetch(`${API_BASE_URL}/checklists/${id}`).then(res => res.json()),
         createInspection: (data) => fetch(`${API_BASE_URL}/inspections`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(data)
         }).then(res => res.json()),
+        // The file is sent as the raw body and stored under its content hash
+        uploadPhoto: (file) => fetch(`${API_BASE_URL}/photos`, {
+            method: 'POST',
+            headers: { 'Content-Type': file.type || 'application/octet-stream' },
+            body: file
+        }).then(async res => {
+            const body = await res.json();
+            if (!res.ok) throw new Error(body.error || 'Upload failed');
+            return body;
+        }),
         createInspectionResult: (data) => fetch(`${API_BASE_URL}/inspection-results`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
@@ -86,12 +100,40 @@ document.addEventListener('DOMContentLoaded', () => {
         containers.forEach(c => c.classList.toggle('hidden', !visible));
     };
 
+    const renderPhotoPreview = (photo, fileName) => {
+        const figure = document.createElement('figure');
+        figure.innerHTML = `
+            <img class="w-full h-48 object-cover rounded-lg border border-[var(--border-color)]" alt="">
+            <figcaption class="mt-2 text-xs text-gray-500 truncate"></figcaption>
+        `;
+        // Thumbnails are made in the background; until this one exists, show the local file
+        figure.querySelector('img').src = photo.derivativeStatus === 'done' ? `${API_BASE_URL.replace(/\/api$/, '')}${photo.urls.thumbnail}` : URL.createObjectURL(photo.file);
+        figure.querySelector('figcaption').textContent = fileName;
+        photoPreviews.appendChild(figure);
+    };
+
     // --- Event Handlers ---
+    photoUploadInput.addEventListener('change', async () => {
+        for (const file of photoUploadInput.files) {
+            try {
+                const photo = await api.uploadPhoto(file);
+                if (!uploadedPhotos.some(p => p.hash === photo.hash)) {
+                    uploadedPhotos.push({ hash: photo.hash });
+                    renderPhotoPreview({ ...photo, file }, file.name);
+                }
+            } catch (error) {
+                console.error(`Error uploading ${file.name}:`, error);
+                alert(`Could not upload ${file.name}: ${error.message}`);
+            }
+        }
+        photoUploadInput.value = '';
+    });
+
     checklistSelect.addEventListener('change', async () => {
         currentChecklistId = checklistSelect.value ? parseInt(checklistSelect.value, 10) : null;
         if (currentChecklistId) {
             try {
-                checklistItems = await api.getChecklistItems(currentChecklistId);
+                checklistItems = (await api.getChecklist(currentChecklistId)).items;
                 renderChecklistItems();
                 toggleChecklistVisibility(true);
             } catch (error) {
@@ -118,7 +160,8 @@ document.addEventListener('DOMContentLoaded', () => {
             unit_status: unitStatusSelect.value,
             repair_quote_needed: document.querySelector('input[name="repair-quote"]:checked').value === 'true',
             overall_comments: overallCommentsTextarea.value,
-            status: 'Submitted'
+            status: 'Submitted',
+            photos: uploadedPhotos
         };
 
         try {
@@ -48,7 +48,11 @@ document.addEventListener('DOMContentLoaded', () => {
         updateItem: (itemId, data) => fetch(`${API_BASE_URL}/checklist-items/${itemId}`, {
             method: 'PUT', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(data)
         }),
-        deleteItem: (itemId) => fetch(`${API_BASE_URL}/checklist-items/${itemId}`, { method: 'DELETE' })
+        deleteItem: (itemId) => fetch(`${API_BASE_URL}/checklist-items/${itemId}`, { method: 'DELETE' }),
+        // Creates, updates and deletes in one transaction; responds with the checklist's new ordered items
+        batchItems: (checklistId, changes) => fetch(`${API_BASE_URL}/checklists/${checklistId}/items`, {
+            method: 'PATCH', headers: {'Content-Type': 'application/json'}, body: JSON.stringify(changes)
+        })
     };
 
     // --- UI Update Functions ---
@@ -83,7 +87,7 @@ document.addEventListener('DOMContentLoaded', () => {
             tbody.innerHTML = `<tr><td colspan="4" class="text-center py-4">No items in this checklist. Click "Add New Item" to get started.</td></tr>`;
             return;
         }
-        itemsCache.forEach((item) => {
+        itemsCache.forEach((item, index) => {
             const tr = document.createElement('tr');
             tr.className = 'bg-white border-b hover:bg-gray-50';
             tr.dataset.id = item.id;
@@ -94,6 +98,8 @@ document.addEventListener('DOMContentLoaded', () => {
                     <input type="checkbox" class="h-5 w-5 rounded border-gray-300" ${item.is_required ? 'checked' : ''} disabled>
                 </td>
                 <td class="px-6 py-4 text-right flex items-center justify-end gap-2">
+                    <button class="p-2 rounded-full hover:bg-gray-200 transition-colors move-btn" data-index="${index}" data-offset="-1" ${index === 0 ? 'disabled' : ''}><span class="material-icons text-gray-600 pointer-events-none">arrow_upward</span></button>
+                    <button class="p-2 rounded-full hover:bg-gray-200 transition-colors move-btn" data-index="${index}" data-offset="1" ${index === itemsCache.length - 1 ? 'disabled' : ''}><span class="material-icons text-gray-600 pointer-events-none">arrow_downward</span></button>
                     <button class="p-2 rounded-full hover:bg-gray-200 transition-colors edit-btn" data-id="${item.id}"><span class="material-icons text-gray-600 pointer-events-none">edit</span></button>
                     <button class="p-2 rounded-full hover:bg-red-100 transition-colors delete-btn" data-id="${item.id}"><span class="material-icons text-red-500 pointer-events-none">delete</span></button>
                 </td>
@@ -240,13 +246,36 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // Moves an item and renumbers the list; only the items whose position changed are sent
+    const handleItemMove = async (index, offset) => {
+        const reordered = [...itemsCache];
+        const [moved] = reordered.splice(index, 1);
+        reordered.splice(index + offset, 0, moved);
+        const update = reordered
+            .map((item, i) => ({ id: item.id, display_order: i + 1 }))
+            .filter((change, i) => reordered[i].display_order !== change.display_order);
+        try {
+            const response = await api.batchItems(currentChecklistId, { update });
+            if (!response.ok) throw new Error(await response.text());
+            itemsCache = (await response.json()).items;
+            renderItemsTable();
+        } catch (error) {
+            console.error('Error reordering items:', error);
+            alert('Could not reorder the items.');
+            handleChecklistSelection(currentChecklistId); // Show what the server has
+        }
+    };
+
     addItemBtn.addEventListener('click', () => openModal());
     cancelBtn.addEventListener('click', closeModal);
     saveBtn.addEventListener('click', handleItemFormSubmit);
     tbody.addEventListener('click', (e) => {
         const editBtn = e.target.closest('.edit-btn');
         const deleteBtn = e.target.closest('.delete-btn');
-        if (editBtn) {
+        const moveBtn = e.target.closest('.move-btn');
+        if (moveBtn) {
+            handleItemMove(parseInt(moveBtn.dataset.index, 10), parseInt(moveBtn.dataset.offset, 10));
+        } else if (editBtn) {
             const id = editBtn.dataset.id;
             const item = itemsCache.find(i => i.id == id);
             openModal(item);
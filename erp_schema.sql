@@ -0,0 +1,274 @@
+-- ERP tables, served to the API from a read-only snapshot file (ERP_DB_NAME).
+-- test_data.py builds each snapshot from this schema next to the live one, validates it,
+-- and renames it into place; the API attaches it to every connection as "erp".
+CREATE TABLE IF NOT EXISTS "equipment_all_types" (
+"ADRSCODE" TEXT,
+  "CUSTNMBR" TEXT,
+  "Equipment_ID" TEXT,
+  "Wennsoft_Region" TEXT,
+  "Wennsoft_Branch" TEXT,
+  "Wennsoft_Master_Equip_ID" TEXT,
+  "Manufacturer_ID" TEXT,
+  "Equipment_Type" TEXT,
+  "Wennsoft_Model_Number" TEXT,
+  "Wennsoft_Serial_Number" TEXT,
+  "Equip_Description_Long" TEXT,
+  "Installed_By_Long_Desc" TEXT,
+  "Extended_Warranty_Type" TEXT,
+  "Extended_Warr_Expiration" TIMESTAMP,
+  "Warranty_Expiration" TIMESTAMP,
+  "Install_Date" TIMESTAMP,
+  "Inactive_Retired_Flag" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "equipment_ats" (
+"ADRSCODE" TEXT,
+  "CUSTNMBR" TEXT,
+  "Equipment_ID" TEXT,
+  "Wennsoft_Region" TEXT,
+  "Wennsoft_Branch" TEXT,
+  "Wennsoft_Master_Equip_ID" TEXT,
+  "Manufacturer_ID" TEXT,
+  "Equipment_Type" TEXT,
+  "Wennsoft_Model_Number" TEXT,
+  "Wennsoft_Serial_Number" TEXT,
+  "Equip_Description_Long" TEXT,
+  "Installed_By_Long_Desc" TEXT,
+  "Extended_Warranty_Type" TEXT,
+  "Extended_Warr_Expiration" TIMESTAMP,
+  "Warranty_Expiration" TIMESTAMP,
+  "Install_Date" TIMESTAMP,
+  "Inactive_Retired_Flag" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "equipment_generator" (
+"ADRSCODE" TEXT,
+  "CUSTNMBR" TEXT,
+  "Equipment_ID" TEXT,
+  "Wennsoft_Region" TEXT,
+  "Wennsoft_Branch" TEXT,
+  "Wennsoft_Master_Equip_ID" TEXT,
+  "Manufacturer_ID" TEXT,
+  "Equipment_Type" TEXT,
+  "Wennsoft_Model_Number" TEXT,
+  "Wennsoft_Serial_Number" TEXT,
+  "Equip_Description_Long" TEXT,
+  "Installed_By_Long_Desc" TEXT,
+  "Extended_Warranty_Type" TEXT,
+  "Extended_Warr_Expiration" TIMESTAMP,
+  "Warranty_Expiration" TIMESTAMP,
+  "Install_Date" TIMESTAMP,
+  "Inactive_Retired_Flag" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "equipment_engine" (
+"ADRSCODE" TEXT,
+  "CUSTNMBR" TEXT,
+  "Equipment_ID" TEXT,
+  "Wennsoft_Region" TEXT,
+  "Wennsoft_Branch" TEXT,
+  "Wennsoft_Master_Equip_ID" TEXT,
+  "Manufacturer_ID" TEXT,
+  "Equipment_Type" TEXT,
+  "Wennsoft_Model_Number" TEXT,
+  "Wennsoft_Serial_Number" TEXT,
+  "Equip_Description_Long" TEXT,
+  "Installed_By_Long_Desc" TEXT,
+  "Extended_Warranty_Type" TEXT,
+  "Extended_Warr_Expiration" TIMESTAMP,
+  "Warranty_Expiration" TIMESTAMP,
+  "Install_Date" TIMESTAMP,
+  "Inactive_Retired_Flag" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "sv000123_overhead_groups" (
+"Overhead_Group_Code" TEXT,
+  "Labor_Group_Name" TEXT,
+  "DEPRTMNT" TEXT,
+  "JOBTITLE" TEXT,
+  "PAYRCORD" TEXT,
+  "Billing_Amount" REAL,
+  "Billing_Description" TEXT,
+  "Wennsoft_Affiliate" TEXT,
+  "Wennsoft_Region" TEXT,
+  "Wennsoft_Branch" TEXT,
+  "USERID" TEXT,
+  "Technician_ID" TEXT,
+  "Technician_Team" TEXT,
+  "User_Define_1" TEXT,
+  "User_Define_2" TEXT,
+  "USRDAT01" TIMESTAMP,
+  "USRDAT02" TIMESTAMP,
+  "User_Defined_Dollar_1" REAL,
+  "User_Defined_Dollar_2" REAL,
+  "User_Def_Integer_1" INTEGER,
+  "User_Def_Integer_2" INTEGER,
+  "WSReserved_CB1" INTEGER,
+  "WSReserved_CB2" INTEGER,
+  "DEX_ROW_ID" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "sv00166_pricing_matrix" (
+"Pricing_Matrix_Name" TEXT,
+  "WS_Cost_Code" INTEGER,
+  "WS_Other_Cost_Sub_Code" INTEGER,
+  "Price_Matrix_Entry_1" TEXT,
+  "Price_Matrix_Entry_2" TEXT,
+  "Price_Matrix_Entry_3" TEXT,
+  "Price_Matrix_Entry_4" TEXT,
+  "Price_Matrix_Entry_5" TEXT,
+  "Price_Matrix_Entry_6" TEXT,
+  "Price_Matrix_Entry_7" TEXT,
+  "SEQNUMBR" INTEGER,
+  "WS_Billing_Method" INTEGER,
+  "Billing_Amount" REAL,
+  "ITEMDESC" TEXT,
+  "Pricing_Markup_Amount" REAL,
+  "Pricing_Markup_Percent" INTEGER,
+  "Pricing_Amount_1" REAL,
+  "Pricing_Amount_2" REAL,
+  "WS_Bill_Cost_Code" INTEGER,
+  "WS_Bill_Other_Cost_Code" INTEGER,
+  "Min_Amount_Total" REAL,
+  "Max_Amount_Total" REAL,
+  "MODIFDT" TIMESTAMP,
+  "Modified_Time" TIMESTAMP,
+  "MDFUSRID" TEXT,
+  "DEX_ROW_ID" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "service_call_details" (
+"SV00300_Service_Call_ID" TEXT,
+  "SV00300_CUSTNMBR" TEXT,
+  "SV00300_ADRSCODE" TEXT,
+  "SV00300_Bill_Customer_Number" TEXT,
+  "SV00200_CUSTNAME" TEXT,
+  "SV00200_Labor_Group_Name" TEXT,
+  "SV00200_Pricing_Matrix_Name" TEXT,
+  "PL_CUSTNAME" TEXT,
+  "PL_Labor_Group_Name" TEXT,
+  "PL_Pricing_Matrix_Name" TEXT,
+  "BillCustomer_CUSTNAME" TEXT,
+  "SV00302_Equipment_ID" TEXT,
+  "Generator_Equipment_ID" TEXT,
+  "Generator_Wennsoft_Model_Number" TEXT,
+  "Generator_Wennsoft_Serial_Number" TEXT,
+  "Engine_Equipment_ID" TEXT,
+  "Engine_Wennsoft_Model_Number" TEXT,
+  "Engine_Wennsoft_Serial_Number" TEXT,
+  "ATS_Equipment_ID" TEXT,
+  "ATS_Wennsoft_Model_Number" TEXT,
+  "ATS_Wennsoft_Serial_Number" TEXT,
+  "SV00400_Extended_Warr_Expiration" TIMESTAMP,
+  "SV00400_Warranty_Expiration" TIMESTAMP,
+  "SV00400_Install_Date" TIMESTAMP,
+  "SV00300_Modified_At" TEXT -- 'YYYY-MM-DD HH:MM:SS'; the incremental sync's watermark
+);
+-- Every service note as extracted from SV000805. test_data.py splits it by WS_Note_Type into
+-- the description and resolution tables below after each load.
+CREATE TABLE IF NOT EXISTS "sv000805_service_notes" (
+"CUSTNMBR" TEXT,
+  "ADRSCODE" TEXT,
+  "Service_Call_ID" TEXT,
+  "Record_Notes" TEXT,
+  "WS_Note_Type" TEXT,
+  "Note_Service_Index" TEXT,
+  "USERID" TEXT,
+  "Technician_ID" TEXT,
+  "Technician_Team" TEXT,
+  "Note_Author" TEXT,
+  "DEX_ROW_ID" INTEGER
+);
+CREATE TABLE IF NOT EXISTS "sv000805_service_notes_resolution" (
+"CUSTNMBR" TEXT,
+  "ADRSCODE" TEXT,
+  "Service_Call_ID" TEXT,
+  "Record_Notes" TEXT,
+  "WS_Note_Type" TEXT,
+  "Note_Service_Index" TEXT,
+  "USERID" TEXT,
+  "Technician_ID" TEXT,
+  "Technician_Team" TEXT,
+  "Note_Author" TEXT
+);
+CREATE TABLE IF NOT EXISTS "sv000805_service_notes_description" (
+"CUSTNMBR" TEXT,
+  "ADRSCODE" TEXT,
+  "Service_Call_ID" TEXT,
+  "Record_Notes" TEXT,
+  "WS_Note_Type" TEXT,
+  "Note_Service_Index" TEXT,
+  "USERID" TEXT,
+  "Technician_ID" TEXT,
+  "Technician_Team" TEXT,
+  "Note_Author" TEXT
+);
+CREATE TABLE IF NOT EXISTS "iv00102_item_quantity_all" (
+"ITEMNMBR" TEXT,
+  "LOCNCODE" TEXT,
+  "QTYONHND" REAL
+);
+
+-- Indexes for hot lookups.
+-- ERP service call IDs arrive space-padded from SQL Server and the API compares them with
+-- TRIM(), so these are expression indexes on TRIM(...) that the planner can match directly.
+-- They are re-applied by test_data.py after every ERP load, and a snapshot missing any of
+-- them is rejected.
+CREATE INDEX IF NOT EXISTS "idx_service_call_details_call_id" ON "service_call_details" (TRIM("SV00300_Service_Call_ID"));
+CREATE INDEX IF NOT EXISTS "idx_service_notes_call_id" ON "sv000805_service_notes" (TRIM("Service_Call_ID"));
+CREATE INDEX IF NOT EXISTS "idx_notes_description_call_id" ON "sv000805_service_notes_description" (TRIM("Service_Call_ID"));
+CREATE INDEX IF NOT EXISTS "idx_notes_resolution_call_id" ON "sv000805_service_notes_resolution" (TRIM("Service_Call_ID"));
+CREATE INDEX IF NOT EXISTS "idx_item_quantity_itemnmbr" ON "iv00102_item_quantity_all" ("ITEMNMBR");
+CREATE INDEX IF NOT EXISTS "idx_overhead_groups_labor_group" ON "sv000123_overhead_groups" ("Labor_Group_Name");
+
+-- One pre-joined row per service call, built by test_data.py from service_call_details, the
+-- write-up notes and the labor group rates, so /api/service-call is a primary-key lookup.
+-- call_id is the trimmed service call ID; the warranty is kept as a date and turned into
+-- "Active until"/"Expired on" text per request, since that depends on today's date.
+CREATE TABLE IF NOT EXISTS "service_call_snapshot" (
+    "call_id" TEXT PRIMARY KEY,
+    "customer_name" TEXT,
+    "customer_company" TEXT,
+    "labor_group_name" TEXT,
+    "tech_rate" REAL NOT NULL,
+    "travel_rate" REAL NOT NULL,
+    "generator_model" TEXT,
+    "generator_serial" TEXT,
+    "generator_warranty_expires" TEXT, -- ISO date; NULL when there is no warranty, 'invalid' if unparseable
+    "ats_model" TEXT,
+    "ats_serial" TEXT,
+    "engine_model" TEXT,
+    "engine_serial" TEXT,
+    "writeup" TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_service_call_snapshot_labor_group" ON "service_call_snapshot" ("labor_group_name");
+
+-- Every non-empty description and resolution note, trimmed and tagged, with a full-text
+-- index over the note text for /api/service-notes/search. Both are maintained by test_data.py
+-- (rebuilt after a full reload, otherwise updated for the calls whose notes changed).
+CREATE TABLE IF NOT EXISTS "service_note" (
+    "id" INTEGER PRIMARY KEY,
+    "call_id" TEXT NOT NULL,
+    "note_type" TEXT NOT NULL, -- e.g., description, resolution
+    "customer" TEXT,           -- CUSTNMBR
+    "technician" TEXT,         -- Technician_ID
+    "notes" TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_service_note_call_id" ON "service_note" ("call_id");
+CREATE VIRTUAL TABLE IF NOT EXISTS "service_note_fts" USING fts5(
+    "notes", content = 'service_note', content_rowid = 'id', tokenize = 'porter unicode61'
+);
+
+-- Per-table state for incremental ERP syncs run by test_data.py.
+-- watermark_value is the highest value of watermark_column loaded so far.
+CREATE TABLE IF NOT EXISTS "sync_state" (
+    "table_name" TEXT PRIMARY KEY,
+    "watermark_column" TEXT,
+    "watermark_value" TEXT,
+    "last_mode" TEXT, -- e.g., full, incremental
+    "rows_synced" INTEGER,
+    "last_synced_at" TIMESTAMP,
+    "last_full_sync_at" TIMESTAMP
+);
+
+-- Facts about the snapshot as a whole, written by test_data.py before the swap:
+-- 'generation' (incremented on every swap; the API drops cached payloads when it changes),
+-- 'schema_version' and 'built_at'.
+CREATE TABLE IF NOT EXISTS "snapshot_metadata" (
+    "key" TEXT PRIMARY KEY,
+    "value" TEXT
+);
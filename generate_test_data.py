@@ -0,0 +1,348 @@
+"""
+Fills an application database and an ERP snapshot with synthetic data at a chosen scale, so
+the API can be benchmarked (see load_test.py) without a copy of the SQL Server data.
+
+The ERP tables are written to a source SQLite file with SQL Server's space-padded char IDs
+and then loaded by test_data.py exactly as a real sync would be, so the TRIM() lookups,
+service_call_snapshot and the note search index all see realistic input. The application
+database is created from schema.sql and filled with quotes and their revisions, line items,
+subcontractors, checklists, inspections and their results; the schema's triggers keep the
+totals and rollup tables in step as rows go in.
+
+Usage:
+    python generate_test_data.py --calls 20000 --inspections 10000 --seed 7
+    SQLITE_DB_NAME=data/bench.db python generate_test_data.py --force
+    python test_data.py --source-sqlite data/synthetic_erp_source.db  # re-sync from the same source
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+import test_data
+from test_data import (NOTE_TYPE_CODES, NOTES_TABLE, QUERIES_TO_RUN, SQLiteSource, load_table_definitions, process_queries,
+                       quote_identifier, table_columns)
+
+APP_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema.sql")
+
+# --- CONFIGURATION ---
+# SQL Server char(n) columns come back padded to their declared width; these match the ERP.
+PAD_WIDTHS = {
+    "call_id": 17, "customer": 15, "address": 15, "labor_group": 15, "matrix": 15,
+    "equipment": 31, "technician": 11, "user": 15, "item": 31, "location": 11,
+}
+DEFAULT_SCALE = {
+    "calls": 5000, "notes_per_call": 3, "parts": 2000, "locations": 5, "stock_per_location": 800,
+    "quoted_fraction": 0.4, "max_revisions": 3, "max_line_items": 8, "checklists": 10,
+    "items_per_checklist": 25, "inspections": 5000, "months": 24,
+}
+BATCH_SIZE = 5000
+
+LABOR_GROUPS = [("GENSVC", 145.0), ("GENSVC-OT", 217.5), ("ATS", 155.0), ("LOADBANK", 165.0), ("PM", 125.0), ("EMERG", None)]
+LOCATIONS = ["MAIN", "TRUCK1", "TRUCK2", "TRUCK3", "NORTH", "SOUTH", "EAST", "WEST", "TRUCK4", "TRUCK5"]
+MANUFACTURERS = ["KOHLER", "GENERAC", "CAT", "CUMMINS", "MTU", "ASCO", "ZENITH", "RUSSELEC"]
+CUSTOMER_WORDS = ["Memorial", "County", "Regional", "Valley", "Central", "Northside", "Lakeview", "Summit", "Harbor", "Pioneer"]
+CUSTOMER_KINDS = ["Hospital", "Water District", "Data Center", "School District", "Fire Dept", "Credit Union", "Cold Storage"]
+PART_KINDS = ["FILTER", "BELT", "HOSE", "BATTERY", "SENSOR", "RELAY", "GASKET", "PUMP", "STARTER", "THERMOSTAT", "BREAKER"]
+VENDORS = ["Grainger", "Kohler Direct", "Cummins Sales", "Interstate Batteries", "NAPA", "Fastenal"]
+COMPONENTS = ["fuel pump", "fuel filter", "coolant hose", "radiator", "alternator", "starter", "battery charger",
+              "block heater", "controller", "transfer switch", "governor", "fan belt", "oil pressure sender"]
+SYMPTOMS = ["leaking", "failed to start", "showing low voltage", "tripping on overcrank", "cracked", "worn",
+            "not charging", "running hot", "alarming intermittently", "seized"]
+ACTIONS = ["replace", "rebuild", "adjust", "clean and retest", "replace and load test"]
+NOTE_AUTHORS = ["JSMITH", "MLOPEZ", "KNGUYEN", "TBROWN", "AOKAFOR", "RPATEL"]
+QUOTE_STATUSES = ["Draft", "Sent", "Accepted", "Rejected"]
+QUOTE_STATUS_WEIGHTS = [4, 3, 2, 1]
+CHECKLIST_KINDS = ["Generator PM", "ATS Inspection", "Load Bank Test", "Annual Service", "Fuel System", "Cooling System"]
+ITEM_CATEGORIES = ["Engine", "Electrical", "Fuel", "Cooling", "Exhaust", "Controls", "Safety"]
+INSPECTORS = ["Alex Rivera", "Sam Carter", "Jordan Lee", "Casey Morgan", "Taylor Brooks", "Riley Chen"]
+
+
+def pad(value, kind):
+    return str(value).ljust(PAD_WIDTHS[kind])
+
+
+def insert_rows(conn, table, columns, rows):
+    """Inserts rows (dicts, or tuples in column order) in batches. Returns the row count."""
+    statement = (f"INSERT INTO {quote_identifier(table)} ({', '.join(quote_identifier(c) for c in columns)}) "
+                 f"VALUES ({', '.join('?' for _ in columns)})")
+    count, batch = 0, []
+    for row in rows:
+        batch.append(tuple(row.get(c) for c in columns) if isinstance(row, dict) else row)
+        if len(batch) >= BATCH_SIZE:
+            conn.executemany(statement, batch)
+            count, batch = count + len(batch), []
+    if batch:
+        conn.executemany(statement, batch)
+        count += len(batch)
+    return count
+
+
+def call_id(n, calls):
+    """Service call IDs start with '25', like the calls the notes query selects."""
+    return f"25{n:0{max(5, len(str(calls)))}d}"
+
+
+def part_number(n):
+    return f"{PART_KINDS[n % len(PART_KINDS)][:4]}-{n:05d}"
+
+
+def writeup_text(rng):
+    component = rng.choice(COMPONENTS)
+    return (f"Customer reports unit {rng.choice(SYMPTOMS)}. Found {component} {rng.choice(SYMPTOMS)} "
+            f"on {rng.choice(MANUFACTURERS).title()} unit. Recommend {rng.choice(ACTIONS)} {component}, "
+            f"{rng.randint(1, 3)} tech {rng.randint(2, 12)} hours.")
+
+
+def timestamp(day, rng):
+    """A SQL Server style 'YYYY-MM-DD HH:MM:SS' during working hours on day."""
+    return datetime.combine(day, datetime.min.time()).replace(hour=rng.randint(7, 17), minute=rng.randint(0, 59)).isoformat(sep=' ')
+
+
+# --- ERP SOURCE ---
+
+def customers_for(scale):
+    count = max(10, scale["calls"] // 20)
+    return [(f"C{n:05d}", f"{CUSTOMER_WORDS[n % len(CUSTOMER_WORDS)]} {CUSTOMER_KINDS[n % len(CUSTOMER_KINDS)]} {n}")
+            for n in range(count)]
+
+
+def generate_service_calls(scale, rng, customers):
+    """service_call_details rows; about one call in ten has a second equipment row, as the ERP join produces."""
+    today = date.today()
+    for n in range(1, scale["calls"] + 1):
+        customer, name = rng.choice(customers)
+        labor_group = rng.choice(LABOR_GROUPS)[0]
+        install = today - timedelta(days=rng.randint(200, 5000))
+        modified = timestamp(today - timedelta(days=rng.randint(1, 60)), rng)
+        warranty = rng.choice([None, "1900-01-01 00:00:00", timestamp(install + timedelta(days=rng.randint(365, 3650)), rng)])
+        for equipment in range(2 if rng.random() < 0.1 else 1):
+            row = {
+                "SV00300_Service_Call_ID": pad(call_id(n, scale["calls"]), "call_id"),
+                "SV00300_CUSTNMBR": pad(customer, "customer"), "SV00300_ADRSCODE": pad("PRIMARY", "address"),
+                "SV00300_Bill_Customer_Number": pad(customer, "customer"), "SV00200_CUSTNAME": name,
+                "SV00200_Labor_Group_Name": pad(labor_group, "labor_group"), "SV00200_Pricing_Matrix_Name": pad("STANDARD", "matrix"),
+                "PL_CUSTNAME": name, "PL_Labor_Group_Name": pad(labor_group, "labor_group"), "PL_Pricing_Matrix_Name": pad("STANDARD", "matrix"),
+                "BillCustomer_CUSTNAME": name, "SV00302_Equipment_ID": pad(f"EQ{n:06d}-{equipment}", "equipment"),
+                "SV00400_Extended_Warr_Expiration": "1900-01-01 00:00:00", "SV00400_Warranty_Expiration": warranty,
+                "SV00400_Install_Date": timestamp(install, rng), "SV00300_Modified_At": modified,
+            }
+            for kind in ("Generator", "Engine", "ATS"):
+                manufacturer = rng.choice(MANUFACTURERS)
+                row[f"{kind}_Equipment_ID"] = pad(f"{kind[:3].upper()}{n:06d}-{equipment}", "equipment")
+                row[f"{kind}_Wennsoft_Model_Number"] = pad(f"{manufacturer}-{rng.randint(20, 2000)}", "equipment")
+                row[f"{kind}_Wennsoft_Serial_Number"] = pad(f"SN{rng.randint(10 ** 7, 10 ** 8 - 1)}", "equipment")
+            yield row
+
+
+def generate_notes(scale, rng, customers):
+    """sv000805_service_notes rows; the first note of each call is a description, the rest either type."""
+    dex_row_id = 0
+    for n in range(1, scale["calls"] + 1):
+        customer = rng.choice(customers)[0]
+        note_count = max(1, round(rng.gauss(scale["notes_per_call"], 1)))
+        for index in range(note_count):
+            note_type = NOTE_TYPE_CODES["description" if index == 0 or rng.random() < 0.5 else "resolution"]
+            author = rng.choice(NOTE_AUTHORS)
+            dex_row_id += 1
+            yield {
+                "CUSTNMBR": pad(customer, "customer"), "ADRSCODE": pad("PRIMARY", "address"),
+                "Service_Call_ID": pad(call_id(n, scale["calls"]), "call_id"), "Record_Notes": writeup_text(rng),
+                "WS_Note_Type": note_type, "Note_Service_Index": str(index), "USERID": pad(author, "user"),
+                "Technician_ID": pad(f"T{NOTE_AUTHORS.index(author):03d}", "technician"), "Technician_Team": pad("FIELD", "user"),
+                "Note_Author": author, "DEX_ROW_ID": dex_row_id,
+            }
+
+
+def generate_inventory(scale, rng):
+    """iv00102 rows: each location stocks a random subset of the part catalog."""
+    locations = (LOCATIONS * (scale["locations"] // len(LOCATIONS) + 1))[:scale["locations"]]
+    for position, location in enumerate(locations):
+        code = location if position < len(LOCATIONS) else f"{location}{position}"
+        for n in rng.sample(range(scale["parts"]), min(scale["parts"], scale["stock_per_location"])):
+            yield (pad(part_number(n), "item"), pad(code, "location"), float(rng.choice([0, 0, 1, 2, 4, 6, 12, 24])))
+
+
+def generate_overhead_groups(rng):
+    """Two rows per labor group (the first one's rate wins); EMERG has no billing amount."""
+    dex_row_id = 0
+    for name, rate in LABOR_GROUPS:
+        for duplicate in range(2):
+            dex_row_id += 1
+            yield {"Overhead_Group_Code": pad(f"OH{dex_row_id:03d}", "labor_group"), "Labor_Group_Name": pad(name, "labor_group"),
+                   "Billing_Amount": rate if duplicate == 0 or rate is None else rate + 10, "Billing_Description": f"{name} labor",
+                   "USRDAT01": "1900-01-01 00:00:00", "USRDAT02": "1900-01-01 00:00:00", "DEX_ROW_ID": dex_row_id}
+
+
+def generate_pricing_matrix(rng):
+    for n in range(1, 51):
+        yield {"Pricing_Matrix_Name": pad("STANDARD", "matrix"), "WS_Cost_Code": n % 5, "SEQNUMBR": n * 16384,
+               "Billing_Amount": round(rng.uniform(10, 500), 2), "ITEMDESC": f"{rng.choice(PART_KINDS).title()} pricing tier {n}",
+               "Pricing_Markup_Percent": rng.choice([15, 20, 25, 35]), "MODIFDT": timestamp(date.today() - timedelta(days=n), rng),
+               "Modified_Time": "1900-01-01 00:00:00", "MDFUSRID": pad("sa", "user"), "DEX_ROW_ID": n}
+
+
+def write_erp_source(path, scale, rng):
+    """Writes every ERP table the sync reads into a SQLite file. Returns {table: row count}."""
+    definitions = load_table_definitions(test_data.SCHEMA_FILE)
+    customers = customers_for(scale)
+    conn = sqlite3.connect(path)
+    counts = {}
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        with conn:
+            for table in [item["table_name"] for item in QUERIES_TO_RUN]:
+                conn.execute(definitions[table])
+            columns = {table: table_columns(definitions[table]) for table in definitions}
+            counts["sv000123_overhead_groups"] = insert_rows(conn, "sv000123_overhead_groups", columns["sv000123_overhead_groups"], generate_overhead_groups(rng))
+            counts["sv00166_pricing_matrix"] = insert_rows(conn, "sv00166_pricing_matrix", columns["sv00166_pricing_matrix"], generate_pricing_matrix(rng))
+            counts["service_call_details"] = insert_rows(conn, "service_call_details", columns["service_call_details"], generate_service_calls(scale, rng, customers))
+            counts[NOTES_TABLE] = insert_rows(conn, NOTES_TABLE, columns[NOTES_TABLE], generate_notes(scale, rng, customers))
+            counts["iv00102_item_quantity_all"] = insert_rows(conn, "iv00102_item_quantity_all", columns["iv00102_item_quantity_all"], generate_inventory(scale, rng))
+    finally:
+        conn.close()
+    return counts
+
+
+# --- APPLICATION DATABASE ---
+
+def generate_quotes(scale, rng, parts):
+    """Yields (quote row, line item rows, subcontractor rows) for each revision of each quoted call."""
+    today = date.today()
+    quote_id = 0
+    for n in range(1, scale["calls"] + 1):
+        if rng.random() >= scale["quoted_fraction"]:
+            continue
+        # Quotes saved before the API trimmed IDs kept the ERP's padding
+        service_call = call_id(n, scale["calls"])
+        if rng.random() < 0.3:
+            service_call = pad(service_call, "call_id")
+        created = today - timedelta(days=rng.randint(0, scale["months"] * 30))
+        customer = f"Customer {n}"
+        tech_rate = rng.choice(LABOR_GROUPS[:5])[1]
+        for revision in range(1, rng.randint(1, scale["max_revisions"]) + 1):
+            quote_id += 1
+            created += timedelta(days=rng.randint(0, 5))
+            quote = (quote_id, service_call, revision, writeup_text(rng), customer,
+                     rng.choices(QUOTE_STATUSES, QUOTE_STATUS_WEIGHTS)[0], rng.randint(1, 3), rng.choice([2, 4, 6, 8, 12]),
+                     rng.choice([0, 1, 2, 4]), tech_rate, tech_rate, timestamp(min(created, today), rng))
+            lines = []
+            for part in rng.sample(parts, min(len(parts), rng.randint(0, scale["max_line_items"]))):
+                quantity, unit_cost = rng.randint(1, 6), round(rng.uniform(5, 900), 2)
+                lines.append((quote_id, part, f"{part} {rng.choice(COMPONENTS)}", rng.choice(VENDORS),
+                              str(rng.randint(0, 24)), quantity, unit_cost, quantity * unit_cost))
+            subcontractors = [(quote_id, f"{rng.choice(['Crane', 'Fuel', 'Rental'])} service", "555-0100", round(rng.uniform(200, 4000), 2))
+                              for _ in range(rng.choice([0, 0, 0, 0, 1, 2]))]
+            yield quote, lines, subcontractors
+
+
+def write_app_database(path, scale, rng, parts):
+    """Creates the application database from schema.sql and fills it. Returns {table: row count}."""
+    conn = sqlite3.connect(path)
+    counts = {}
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = OFF")
+        with open(APP_SCHEMA_FILE, 'r') as f:
+            conn.executescript(f.read())
+        with conn:
+            quotes, lines, subcontractors = [], [], []
+            for quote, quote_lines, quote_subcontractors in generate_quotes(scale, rng, parts):
+                quotes.append(quote)
+                lines.extend(quote_lines)
+                subcontractors.extend(quote_subcontractors)
+            counts["quote"] = insert_rows(conn, "quote", ["id", "service_call_id", "revision", "description", "customer_name", "status",
+                                                          "tech_count", "tech_hours", "travel_hours", "tech_rate", "travel_rate", "created_at"], quotes)
+            counts["quote_line_item"] = insert_rows(conn, "quote_line_item", ["quote_id", "part_number", "description", "vendor", "on_hand",
+                                                                              "quantity", "unit_cost", "total_cost"], lines)
+            counts["subcontractor"] = insert_rows(conn, "subcontractor", ["quote_id", "contact_name", "contact_details", "cost"], subcontractors)
+
+            # Checklists, each item with its own failure rate so the analytics have something to rank
+            checklists, items = [], {}
+            for c in range(1, scale["checklists"] + 1):
+                checklists.append((c, f"{CHECKLIST_KINDS[(c - 1) % len(CHECKLIST_KINDS)]} {c}", f"Synthetic checklist {c}"))
+                items[c] = [(len(items) * scale["items_per_checklist"] + i, min(0.6, rng.expovariate(12)))
+                            for i in range(1, scale["items_per_checklist"] + 1)]
+            counts["checklists"] = insert_rows(conn, "checklists", ["id", "name", "description"], checklists)
+            counts["inspection_checklist_items"] = insert_rows(
+                conn, "inspection_checklist_items", ["id", "checklist_id", "item_text", "category", "is_required", "display_order"],
+                ((item_id, c, f"Check {rng.choice(COMPONENTS)} ({item_id})", rng.choice(ITEM_CATEGORIES), rng.random() < 0.8, position)
+                 for c, checklist_items in items.items() for position, (item_id, _) in enumerate(checklist_items)))
+
+            today = date.today()
+            inspections, results = [], []
+            for inspection_id in range(1, scale["inspections"] + 1):
+                checklist_id = rng.randint(1, scale["checklists"])
+                failed = False
+                for item_id, failure_rate in items[checklist_id]:
+                    status = "Not Checked" if rng.random() < 0.05 else ("Failed" if rng.random() < failure_rate else "Passed")
+                    failed = failed or status == "Failed"
+                    results.append((inspection_id, item_id, status, "Needs attention" if status == "Failed" else None))
+                inspections.append((inspection_id, str(rng.randint(1, max(1, counts["quote"]))), checklist_id, rng.choice(INSPECTORS),
+                                    timestamp(today - timedelta(days=rng.randint(0, scale["months"] * 30)), rng),
+                                    "Needs Repair" if failed else "Operational", failed, None, "Submitted"))
+            counts["inspections"] = insert_rows(conn, "inspections", ["id", "quote_id", "checklist_id", "inspector_name", "inspection_date",
+                                                                      "unit_status", "repair_quote_needed", "overall_comments", "status"], inspections)
+            counts["inspection_results"] = insert_rows(conn, "inspection_results", ["inspection_id", "checklist_item_id", "status", "comments"], results)
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return counts
+
+
+# --- MAIN ---
+
+def generate(db_path, erp_path, source_path, scale, seed):
+    """Writes the ERP source, syncs it into the ERP snapshot and builds the application database."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    print(f"--- Generating synthetic data (seed {seed}) ---")
+    counts = write_erp_source(source_path, scale, rng)
+    print(f"✅ Wrote the synthetic ERP source '{source_path}' in {time.perf_counter() - started:.1f}s.")
+
+    report = process_queries(QUERIES_TO_RUN, SQLiteSource(source_path), erp_path, full_reload=True)
+    if not report or any(result["status"] != "ok" for result in report) or not os.path.exists(erp_path):
+        print(f"❌ ERROR: The ERP snapshot '{erp_path}' could not be built from the synthetic source.")
+        return False
+
+    app_started = time.perf_counter()
+    parts = [part_number(n) for n in range(scale["parts"])]
+    counts.update(write_app_database(db_path, scale, rng, parts))
+    print(f"✅ Wrote the application database '{db_path}' in {time.perf_counter() - app_started:.1f}s.")
+
+    for table, count in counts.items():
+        print(f"  - {table:<40} {count:>10,}")
+    print(f"--- Done in {time.perf_counter() - started:.1f}s ---")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic application database and ERP snapshot for load testing.")
+    parser.add_argument("--db", default=test_data.SQLITE_DB_NAME, help="Application database to create (default: SQLITE_DB_NAME)")
+    parser.add_argument("--erp-db", help="ERP snapshot to create (default: ERP_DB_NAME)")
+    parser.add_argument("--source", help="Where to write the synthetic ERP source (default: next to the snapshot)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed and scale give the same data")
+    parser.add_argument("--force", action="store_true", help="Replace existing databases")
+    for name, default in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default, dest=name)
+    args = parser.parse_args()
+
+    # Like the API, the snapshot defaults to ERP_DB_NAME, or to erp_snapshot.db next to a --db given here
+    erp_path = args.erp_db or (test_data.ERP_DB_NAME if args.db == test_data.SQLITE_DB_NAME
+                               else os.path.join(os.path.dirname(args.db), "erp_snapshot.db"))
+    source_path = args.source or os.path.join(os.path.dirname(erp_path), "synthetic_erp_source.db")
+    paths = [args.db, erp_path, source_path]
+    existing = [p for p in paths if os.path.exists(p)]
+    if existing and not args.force:
+        parser.error(f"{', '.join(existing)} already exist; pass --force to replace them")
+    for path in paths:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        for suffix in ("", "-wal", "-shm", "-journal", ".building"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    scale = {name: getattr(args, name) for name in DEFAULT_SCALE}
+    raise SystemExit(0 if generate(args.db, erp_path, source_path, scale, args.seed) else 1)
@@ -0,0 +1,419 @@
+"""
+A repeatable load test for the API. Worker threads send a weighted mix of requests (the quote
+sheet's service call lookup, quote saves and listings, the checklist routes, inspection
+submissions, analytics and /summarize) and the run is summarized as throughput and latency
+percentiles per scenario. Results can be saved as JSON and two runs compared for regressions.
+
+Request targets (service calls, quotes, checklists and items) are sampled from the databases
+the API serves, so run generate_test_data.py first or point --db at a real copy. The same
+--seed, scale and concurrency send the same sequence of requests.
+
+Usage:
+    python load_test.py --serve --duration 30 --output baseline.json   # API and stub LLM in-process
+    python load_test.py --url http://localhost:3000 --concurrency 16 --duration 60 --output new.json
+    python load_test.py --compare baseline.json new.json --threshold 10
+
+The quote saves, inspection submissions and checklist edits write to the database, so
+regenerate it (same --seed) before each run that is to be compared. --serve runs the API's
+development server in the same process as the client, which shares its CPU; use it for
+comparing runs, not for absolute capacity.
+
+Against a separately started API, point LOCALAI_URL at localai_stub.py (or set the summarize
+weight to 0 with --mix summarize=0) so /summarize doesn't measure a real model.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import pathlib
+import random
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+from generate_test_data import COMPONENTS, INSPECTORS, ITEM_CATEGORIES, VENDORS
+
+# --- CONFIGURATION ---
+DEFAULT_MIX = {
+    "service_call": 30, "quote_list": 8, "quote_save": 8, "parts_autocomplete": 6, "note_search": 4,
+    "checklist_list": 5, "checklist_get": 14, "checklist_batch": 1, "inspection_submit": 8,
+    "inspection_analytics": 4, "dashboard": 3, "summarize": 3,
+}
+SAMPLE_SIZE = 5000        # Service calls and quotes sampled from the databases as request targets
+HOT_FRACTION = 0.2        # Share of sampled calls that receive HOT_TRAFFIC of the lookups, like a working day's open calls
+HOT_TRAFFIC = 0.8
+REQUEST_TIMEOUT = 60
+PERCENTILES = (50, 95, 99)
+MIN_REGRESSION_MS = 1.0   # Latency changes smaller than this are noise, whatever the percentage
+
+
+# --- REQUEST TARGETS ---
+
+def connect_read_only(path):
+    return sqlite3.connect(f"{pathlib.Path(path).resolve().as_uri()}?mode=ro", uri=True)
+
+
+def load_targets(db_path, erp_path, rng):
+    """Samples what the scenarios request from the application database and the ERP snapshot."""
+    erp = connect_read_only(erp_path)
+    try:
+        calls = erp.execute("SELECT call_id, writeup FROM service_call_snapshot ORDER BY call_id").fetchall()
+    finally:
+        erp.close()
+    conn = connect_read_only(db_path)
+    try:
+        quotes = conn.execute("""
+            SELECT TRIM(service_call_id), MAX(revision), customer_name FROM quote
+            GROUP BY TRIM(service_call_id) ORDER BY 1
+        """).fetchall()
+        items = {}
+        for checklist_id, item_id in conn.execute("SELECT checklist_id, id FROM inspection_checklist_items ORDER BY checklist_id, id"):
+            items.setdefault(checklist_id, []).append(item_id)
+        parts = [part for (part,) in conn.execute("SELECT DISTINCT part_number FROM quote_line_item WHERE part_number IS NOT NULL ORDER BY 1 LIMIT 2000")]
+        quote_ids = [quote_id for (quote_id,) in conn.execute("SELECT id FROM quote ORDER BY id DESC LIMIT ?", (SAMPLE_SIZE,))]
+    finally:
+        conn.close()
+    if not calls or not items:
+        raise ValueError("no service calls or checklists to request; run generate_test_data.py first")
+
+    calls = rng.sample(calls, min(SAMPLE_SIZE, len(calls)))
+    return {
+        "calls": [call for call, _ in calls],
+        "hot_calls": [call for call, _ in calls[:max(1, int(len(calls) * HOT_FRACTION))]],
+        "writeups": [writeup for _, writeup in calls if writeup],
+        "quotes": rng.sample(quotes, min(SAMPLE_SIZE, len(quotes))),
+        "quote_ids": quote_ids or [1],
+        "checklists": items,
+        "parts": parts or ["FILT"],
+    }
+
+
+# --- SCENARIOS ---
+# Each scenario picks its request with the worker's rng and returns (method, path, JSON body).
+
+def pick_call(targets, rng):
+    return rng.choice(targets["hot_calls"] if rng.random() < HOT_TRAFFIC else targets["calls"])
+
+
+def scenario_service_call(targets, rng):
+    return "GET", f"/api/service-call/{pick_call(targets, rng)}", None
+
+
+def scenario_quote_list(targets, rng):
+    query = rng.choice(["", "&status=Draft", "&sort=total", f"&serviceCallPrefix={pick_call(targets, rng)[:5]}",
+                        f"&from={(date.today() - timedelta(days=90)).isoformat()}"])
+    return "GET", f"/api/quotes?limit=25{query}", None
+
+
+def scenario_quote_save(targets, rng):
+    """Re-saves the latest revision of a quoted call (the autosave path), sometimes as a new revision."""
+    if targets["quotes"]:
+        service_call, revision, customer = rng.choice(targets["quotes"])
+    else:
+        service_call, revision, customer = pick_call(targets, rng), 1, "Load Test"
+    parts = [{"part": rng.choice(targets["parts"]), "desc": rng.choice(COMPONENTS), "vendor": rng.choice(VENDORS),
+              "onHand": str(rng.randint(0, 12)), "qty": rng.randint(1, 4), "unitCost": round(rng.uniform(5, 500), 2)}
+             for _ in range(rng.randint(0, 6))]
+    return "POST", "/api/quote", {
+        "serviceCallId": service_call, "revision": revision + (1 if rng.random() < 0.2 else 0),
+        "description": f"Replace {rng.choice(COMPONENTS)}", "customer": {"name": customer},
+        "labor": {"techCount": rng.randint(1, 2), "techHours": rng.choice([2, 4, 8]), "travelHours": rng.choice([0, 1, 2]),
+                  "techRate": 145.0, "travelRate": 145.0},
+        "parts": parts, "subcontractors": [],
+    }
+
+
+def scenario_parts_autocomplete(targets, rng):
+    part = rng.choice(targets["parts"])
+    return "GET", f"/api/parts/autocomplete?prefix={part[:rng.randint(1, len(part))]}", None
+
+
+def scenario_note_search(targets, rng):
+    return "GET", f"/api/service-notes/search?q={rng.choice(COMPONENTS).split()[-1]}", None
+
+
+def scenario_checklist_list(targets, rng):
+    return "GET", "/api/checklists", None
+
+
+def scenario_checklist_get(targets, rng):
+    return "GET", f"/api/checklists/{rng.choice(list(targets['checklists']))}", None
+
+
+def scenario_checklist_batch(targets, rng):
+    """An admin edit: recategorizes one item, which invalidates the checklist's cached payload."""
+    checklist_id = rng.choice(list(targets["checklists"]))
+    item_id = rng.choice(targets["checklists"][checklist_id])
+    return "PATCH", f"/api/checklists/{checklist_id}/items", {"update": [{"id": item_id, "category": rng.choice(ITEM_CATEGORIES)}]}
+
+
+def scenario_inspection_submit(targets, rng):
+    checklist_id = rng.choice(list(targets["checklists"]))
+    results = [{"checklist_item_id": item_id, "status": rng.choices(["Passed", "Failed", "Not Checked"], [90, 6, 4])[0]}
+               for item_id in targets["checklists"][checklist_id]]
+    return "POST", "/api/inspections", {
+        "quote_id": str(rng.choice(targets["quote_ids"])), "checklist_id": checklist_id, "inspector_name": rng.choice(INSPECTORS),
+        "unit_status": "Operational", "repair_quote_needed": False, "overall_comments": "Load test", "results": results,
+    }
+
+
+def scenario_inspection_analytics(targets, rng):
+    days = rng.choice([30, 90, 365])
+    date_from = (date.today() - timedelta(days=days)).isoformat()
+    return "GET", f"/api/inspections/analytics?checklistId={rng.choice(list(targets['checklists']))}&from={date_from}", None
+
+
+def scenario_dashboard(targets, rng):
+    return "GET", "/api/dashboard", None
+
+
+def scenario_summarize(targets, rng):
+    return "POST", "/summarize", {"writeup": rng.choice(targets["writeups"] or ["Replace fuel pump."])}
+
+
+SCENARIOS = {name: globals()[f"scenario_{name}"] for name in DEFAULT_MIX}
+
+
+# --- RUNNER ---
+
+class Recorder:
+    """One worker's latencies (seconds), error counts and status codes per scenario."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, scenario, seconds, status):
+        self.latencies.setdefault(scenario, []).append(seconds)
+        codes = self.statuses.setdefault(scenario, {})
+        codes[str(status)] = codes.get(str(status), 0) + 1
+        if status == "error" or status >= 400:
+            self.errors[scenario] = self.errors.get(scenario, 0) + 1
+
+
+def run_worker(index, base_url, targets, mix, seed, first_start, measure_from, stop_at, interval, recorder):
+    """
+    Sends requests until stop_at. Without a target rate (interval None) each request starts when
+    the last one finishes; with one, requests are scheduled every interval seconds and latency is
+    measured from the scheduled start, so a stalled server isn't hidden by the client waiting on it.
+    """
+    rng = random.Random(seed * 1000 + index)
+    names, weights = list(mix), list(mix.values())
+    session = requests.Session()
+    next_start = first_start
+    while True:
+        if interval:
+            delay = next_start - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        started = next_start if interval else time.perf_counter()
+        if started >= stop_at:
+            break
+        scenario = rng.choices(names, weights)[0]
+        method, path, body = SCENARIOS[scenario](targets, rng)
+        try:
+            response = session.request(method, base_url + path, json=body, timeout=REQUEST_TIMEOUT)
+            status = response.status_code
+        except requests.RequestException:
+            status = "error"
+        finished = time.perf_counter()
+        if started >= measure_from:
+            recorder.record(scenario, finished - started, status)
+        if interval:
+            next_start += interval
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize_latencies(latencies, errors, seconds):
+    latencies = sorted(latencies)
+    summary = {"requests": len(latencies), "errors": errors, "throughput": len(latencies) / seconds if seconds else 0}
+    for p in PERCENTILES:
+        value = percentile(latencies, p)
+        summary[f"p{p}_ms"] = round(value * 1000, 3) if value is not None else None
+    summary["max_ms"] = round(latencies[-1] * 1000, 3) if latencies else None
+    return summary
+
+
+def run_load_test(base_url, targets, mix, concurrency, duration, warmup, rate, seed):
+    """Runs the workers and returns the results dict that --output saves."""
+    recorders = [Recorder() for _ in range(concurrency)]
+    begin = time.perf_counter()
+    measure_from = begin + warmup
+    stop_at = measure_from + duration
+    interval = concurrency / rate if rate else None
+    threads = [
+        threading.Thread(target=run_worker, name=f"load-{i}",
+                         args=(i, base_url, targets, mix, seed, begin + (i / rate if rate else 0), measure_from, stop_at,
+                               interval, recorders[i]))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    scenarios, statuses = {}, {}
+    all_latencies, all_errors = [], 0
+    for name in mix:
+        latencies = [value for r in recorders for value in r.latencies.get(name, [])]
+        errors = sum(r.errors.get(name, 0) for r in recorders)
+        if not latencies:
+            continue
+        scenarios[name] = summarize_latencies(latencies, errors, duration)
+        statuses[name] = {}
+        for r in recorders:
+            for code, count in r.statuses.get(name, {}).items():
+                statuses[name][code] = statuses[name].get(code, 0) + count
+        scenarios[name]["statuses"] = statuses[name]
+        all_latencies.extend(latencies)
+        all_errors += errors
+    return {
+        "meta": {"url": base_url, "started_at": datetime.now().isoformat(sep=' ', timespec='seconds'), "duration": duration,
+                 "warmup": warmup, "concurrency": concurrency, "rate": rate, "seed": seed, "mix": mix},
+        "scenarios": scenarios,
+        "total": summarize_latencies(all_latencies, all_errors, duration),
+    }
+
+
+def print_results(results):
+    print(f"{'Scenario':<22} {'Requests':>9} {'Errors':>7} {'Req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Max ms':>8}")
+    rows = list(results["scenarios"].items()) + [("TOTAL", results["total"])]
+    for name, s in rows:
+        print(f"{name:<22} {s['requests']:>9,} {s['errors']:>7,} {s['throughput']:>8.1f} "
+              f"{s['p50_ms'] or 0:>8.2f} {s['p95_ms'] or 0:>8.2f} {s['p99_ms'] or 0:>8.2f} {s['max_ms'] or 0:>8.2f}")
+
+
+# --- COMPARISON ---
+
+def compare_results(baseline, current, threshold):
+    """
+    Compares two saved runs. A scenario regresses when a latency percentile grows by more than
+    threshold percent (and MIN_REGRESSION_MS) or its error rate rises by over a percentage point;
+    the run regresses when total throughput drops by more than threshold percent.
+    Returns a list of regression descriptions; empty means no regression.
+    """
+    regressions = []
+    for key in ("concurrency", "rate", "mix"):
+        if baseline["meta"].get(key) != current["meta"].get(key):
+            print(f"⚠️ The runs used a different {key}; the comparison may not be meaningful.")
+
+    print(f"{'Scenario':<22} {'Metric':<10} {'Baseline':>10} {'Current':>10} {'Change':>8}")
+    names = list(baseline["scenarios"]) + [n for n in current["scenarios"] if n not in baseline["scenarios"]] + ["TOTAL"]
+    for name in names:
+        before = baseline["total"] if name == "TOTAL" else baseline["scenarios"].get(name)
+        after = current["total"] if name == "TOTAL" else current["scenarios"].get(name)
+        if before is None or after is None:
+            print(f"{name:<22} {'(only in ' + ('current' if before is None else 'baseline') + ' run)'}")
+            continue
+        for metric in [f"p{p}_ms" for p in PERCENTILES] + (["throughput"] if name == "TOTAL" else []):
+            old, new = before[metric], after[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            flag = ""
+            if metric == "throughput" and change < -threshold:
+                flag = " ❌"
+                regressions.append(f"total throughput fell {-change:.1f}% ({old:.1f} -> {new:.1f} req/s)")
+            elif metric != "throughput" and change > threshold and new - old > MIN_REGRESSION_MS:
+                flag = " ❌"
+                regressions.append(f"{name} {metric[:-3]} rose {change:.1f}% ({old:.2f} -> {new:.2f} ms)")
+            print(f"{name:<22} {metric:<10} {old:>10.2f} {new:>10.2f} {change:>+7.1f}%{flag}")
+        old_rate = before["errors"] / before["requests"] if before["requests"] else 0
+        new_rate = after["errors"] / after["requests"] if after["requests"] else 0
+        if new_rate - old_rate > 0.01:
+            regressions.append(f"{name} error rate rose from {old_rate:.1%} to {new_rate:.1%}")
+    return regressions
+
+
+# --- MAIN ---
+
+def parse_mix(text):
+    """'service_call=50,summarize=0' -> DEFAULT_MIX with those weights replaced."""
+    mix = dict(DEFAULT_MIX)
+    for part in filter(None, (text or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise ValueError(f"unknown scenario '{name.strip()}'; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def start_servers(db_path, erp_path):
+    """Starts the stub LLM and the API in this process on free ports. Returns the API's base URL."""
+    from werkzeug.serving import make_server
+
+    import localai_stub
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING) # No per-request access log
+
+    stub = localai_stub.run_stub(0, token_delay=0.0, first_token_delay=0.05)
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    # api_server reads its configuration when imported
+    os.environ["LOCALAI_URL"] = f"http://127.0.0.1:{stub.server_address[1]}/v1/chat/completions"
+    os.environ["SQLITE_DB_NAME"], os.environ["ERP_DB_NAME"] = os.path.abspath(db_path), os.path.abspath(erp_path)
+    os.chdir(os.path.dirname(os.path.abspath(__file__))) # setup_database() reads schema.sql from the working directory
+    import api_server
+
+    server = make_server("127.0.0.1", 0, api_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+if __name__ == "__main__":
+    db_default = os.environ.get("SQLITE_DB_NAME", "test_data_trim.db")
+    parser = argparse.ArgumentParser(description="Load test the API and report throughput and latency percentiles.")
+    parser.add_argument("--url", default="http://localhost:3000", help="API base URL")
+    parser.add_argument("--serve", action="store_true", help="Start the API and a stub LLM in this process instead of using --url")
+    parser.add_argument("--db", default=db_default, help="Application database to sample targets from (default: SQLITE_DB_NAME)")
+    parser.add_argument("--erp-db", help="ERP snapshot to sample targets from (default: ERP_DB_NAME)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Worker threads")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to measure")
+    parser.add_argument("--warmup", type=float, default=5, help="Seconds of unmeasured requests first, to fill caches")
+    parser.add_argument("--rate", type=float, help="Target requests/sec across all workers (default: as fast as responses allow)")
+    parser.add_argument("--mix", help="Scenario weights to change, e.g. 'summarize=0,quote_save=20'")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for targets and the request sequence")
+    parser.add_argument("--output", help="Save the results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two saved runs and exit")
+    parser.add_argument("--threshold", type=float, default=10, help="Percent change counted as a regression by --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            baseline = json.load(f)
+        with open(args.compare[1]) as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.threshold)
+        for regression in regressions:
+            print(f"❌ {regression}")
+        if not regressions:
+            print(f"✅ No regressions beyond {args.threshold:g}%.")
+        sys.exit(1 if regressions else 0)
+
+    erp_path = args.erp_db or os.environ.get("ERP_DB_NAME", os.path.join(os.path.dirname(args.db), "erp_snapshot.db"))
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    targets = load_targets(args.db, erp_path, random.Random(args.seed))
+    output = os.path.abspath(args.output) if args.output else None # --serve changes the working directory
+    base_url = start_servers(args.db, erp_path) if args.serve else args.url.rstrip("/")
+    print(f"--- Load test: {base_url}, {args.concurrency} workers, {args.duration:g}s "
+          f"({args.warmup:g}s warmup), {f'{args.rate:g} req/s' if args.rate else 'closed loop'} ---")
+    results = run_load_test(base_url, targets, mix, args.concurrency, args.duration, args.warmup, args.rate, args.seed)
+    print_results(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"✅ Saved results to '{output}'.")
+    if results["total"]["errors"]:
+        print(f"⚠️ {results['total']['errors']:,} requests failed; see 'statuses' in the results for the codes.")
@@ -0,0 +1,97 @@
+"""
+A stand-in for the LocalAI server, for exercising the /summarize endpoints without a GPU.
+
+It serves the OpenAI-compatible /v1/chat/completions route, in both the normal and the
+streaming ("stream": true) form, and always answers with the same canned JSON summary.
+
+Usage:
+    python localai_stub.py --port 4444 --token-delay 0.02
+    LOCALAI_URL=http://localhost:4444/v1/chat/completions python api_server.py
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_REPLY = json.dumps({
+    "customer_description": "quote to remove and replace the fuel pump with a new fuel pump and replace the fuel filter",
+    "tech_count": 1,
+    "tech_hours": 4,
+    "travel_days": 0
+})
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so the API's pooled session can reuse connections
+
+    def do_POST(self):
+        if self.path != "/v1/chat/completions":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.server.first_token_delay)
+        try:
+            if body.get("stream"):
+                self._send_stream(body.get("model"))
+            else:
+                self._send_completion(body.get("model"))
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True # The client hung up mid-stream
+
+    def _send_completion(self, model):
+        time.sleep(self.server.token_delay * len(self._tokens()))
+        payload = json.dumps({
+            "object": "chat.completion",
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": CANNED_REPLY}, "finish_reason": "stop"}]
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, model):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in self._tokens():
+            chunk = {"object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            time.sleep(self.server.token_delay)
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    @staticmethod
+    def _tokens():
+        # Roughly word-sized pieces, like a real tokenizer would emit
+        return [CANNED_REPLY[i:i + 4] for i in range(0, len(CANNED_REPLY), 4)]
+
+    def log_message(self, format, *args):
+        pass # Keep load tests quiet
+
+
+def run_stub(port, token_delay=0.0, first_token_delay=0.0):
+    """Creates the stub server. Call serve_forever() on the result (e.g. from a thread)."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), StubHandler)
+    server.daemon_threads = True
+    server.token_delay = token_delay
+    server.first_token_delay = first_token_delay
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub LocalAI chat completions server.")
+    parser.add_argument("--port", type=int, default=4444)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="Seconds before the first token")
+    args = parser.parse_args()
+    print(f"--- Stub LocalAI listening on port {args.port} ---")
+    run_stub(args.port, args.token_delay, args.first_token_delay).serve_forever()
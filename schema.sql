@@ -1,189 +1,3 @@
-CREATE TABLE IF NOT EXISTS "equipment_all_types" (
-"ADRSCODE" TEXT,
-  "CUSTNMBR" TEXT,
-  "Equipment_ID" TEXT,
-  "Wennsoft_Region" TEXT,
-  "Wennsoft_Branch" TEXT,
-  "Wennsoft_Master_Equip_ID" TEXT,
-  "Manufacturer_ID" TEXT,
-  "Equipment_Type" TEXT,
-  "Wennsoft_Model_Number" TEXT,
-  "Wennsoft_Serial_Number" TEXT,
-  "Equip_Description_Long" TEXT,
-  "Installed_By_Long_Desc" TEXT,
-  "Extended_Warranty_Type" TEXT,
-  "Extended_Warr_Expiration" TIMESTAMP,
-  "Warranty_Expiration" TIMESTAMP,
-  "Install_Date" TIMESTAMP,
-  "Inactive_Retired_Flag" INTEGER
-);
-CREATE TABLE IF NOT EXISTS "equipment_ats" (
-"ADRSCODE" TEXT,
-  "CUSTNMBR" TEXT,
-  "Equipment_ID" TEXT,
-  "Wennsoft_Region" TEXT,
-  "Wennsoft_Branch" TEXT,
-  "Wennsoft_Master_Equip_ID" TEXT,
-  "Manufacturer_ID" TEXT,
-  "Equipment_Type" TEXT,
-  "Wennsoft_Model_Number" TEXT,
-  "Wennsoft_Serial_Number" TEXT,
-  "Equip_Description_Long" TEXT,
-  "Installed_By_Long_Desc" TEXT,
-  "Extended_Warranty_Type" TEXT,
-  "Extended_Warr_Expiration" TIMESTAMP,
-  "Warranty_Expiration" TIMESTAMP,
-  "Install_Date" TIMESTAMP,
-  "Inactive_Retired_Flag" INTEGER
-);
-CREATE TABLE IF NOT EXISTS "equipment_generator" (
-"ADRSCODE" TEXT,
-  "CUSTNMBR" TEXT,
-  "Equipment_ID" TEXT,
-  "Wennsoft_Region" TEXT,
-  "Wennsoft_Branch" TEXT,
-  "Wennsoft_Master_Equip_ID" TEXT,
-  "Manufacturer_ID" TEXT,
-  "Equipment_Type" TEXT,
-  "Wennsoft_Model_Number" TEXT,
-  "Wennsoft_Serial_Number" TEXT,
-  "Equip_Description_Long" TEXT,
-  "Installed_By_Long_Desc" TEXT,
-  "Extended_Warranty_Type" TEXT,
-  "Extended_Warr_Expiration" TIMESTAMP,
-  "Warranty_Expiration" TIMESTAMP,
-  "Install_Date" TIMESTAMP,
-  "Inactive_Retired_Flag" INTEGER
-);
-CREATE TABLE IF NOT EXISTS "equipment_engine" (
-"ADRSCODE" TEXT,
-  "CUSTNMBR" TEXT,
-  "Equipment_ID" TEXT,
-  "Wennsoft_Region" TEXT,
-  "Wennsoft_Branch" TEXT,
-  "Wennsoft_Master_Equip_ID" TEXT,
-  "Manufacturer_ID" TEXT,
-  "Equipment_Type" TEXT,
-  "Wennsoft_Model_Number" TEXT,
-  "Wennsoft_Serial_Number" TEXT,
-  "Equip_Description_Long" TEXT,
-  "Installed_By_Long_Desc" TEXT,
-  "Extended_Warranty_Type" TEXT,
-  "Extended_Warr_Expiration" TIMESTAMP,
-  "Warranty_Expiration" TIMESTAMP,
-  "Install_Date" TIMESTAMP,
-  "Inactive_Retired_Flag" INTEGER
-);
-CREATE TABLE IF NOT EXISTS "sv000123_overhead_groups" (
-"Overhead_Group_Code" TEXT,
-  "Labor_Group_Name" TEXT,
-  "DEPRTMNT" TEXT,
-  "JOBTITLE" TEXT,
-  "PAYRCORD" TEXT,
-  "Billing_Amount" REAL,
-  "Billing_Description" TEXT,
-  "Wennsoft_Affiliate" TEXT,
-  "Wennsoft_Region" TEXT,
-  "Wennsoft_Branch" TEXT,
-  "USERID" TEXT,
-  "Technician_ID" TEXT,
-  "Technician_Team" TEXT,
-  "User_Define_1" TEXT,
-  "User_Define_2" TEXT,
-  "USRDAT01" TIMESTAMP,
-  "USRDAT02" TIMESTAMP,
-  "User_Defined_Dollar_1" REAL,
-  "User_Defined_Dollar_2" REAL,
-  "User_Def_Integer_1" INTEGER,
-  "User_Def_Integer_2" INTEGER,
-  "WSReserved_CB1" INTEGER,
-  "WSReserved_CB2" INTEGER,
-  "DEX_ROW_ID" INTEGER
-);
-CREATE TABLE IF NOT EXISTS "sv00166_pricing_matrix" (
-"Pricing_Matrix_Name" TEXT,
-  "WS_Cost_Code" INTEGER,
-  "WS_Other_Cost_Sub_Code" INTEGER,
-  "Price_Matrix_Entry_1" TEXT,
-  "Price_Matrix_Entry_2" TEXT,
-  "Price_Matrix_Entry_3" TEXT,
-  "Price_Matrix_Entry_4" TEXT,
-  "Price_Matrix_Entry_5" TEXT,
-  "Price_Matrix_Entry_6" TEXT,
-  "Price_Matrix_Entry_7" TEXT,
-  "SEQNUMBR" INTEGER,
-  "WS_Billing_Method" INTEGER,
-  "Billing_Amount" REAL,
-  "ITEMDESC" TEXT,
-  "Pricing_Markup_Amount" REAL,
-  "Pricing_Markup_Percent" INTEGER,
-  "Pricing_Amount_1" REAL,
-  "Pricing_Amount_2" REAL,
-  "WS_Bill_Cost_Code" INTEGER,
-  "WS_Bill_Other_Cost_Code" INTEGER,
-  "Min_Amount_Total" REAL,
-  "Max_Amount_Total" REAL,
-  "MODIFDT" TIMESTAMP,
-  "Modified_Time" TIMESTAMP,
-  "MDFUSRID" TEXT,
-  "DEX_ROW_ID" INTEGER
-);
-CREATE TABLE IF NOT EXISTS "service_call_details" (
-"SV00300_Service_Call_ID" TEXT,
-  "SV00300_CUSTNMBR" TEXT,
-  "SV00300_ADRSCODE" TEXT,
-  "SV00300_Bill_Customer_Number" TEXT,
-  "SV00200_CUSTNAME" TEXT,
-  "SV00200_Labor_Group_Name" TEXT,
-  "SV00200_Pricing_Matrix_Name" TEXT,
-  "PL_CUSTNAME" TEXT,
-  "PL_Labor_Group_Name" TEXT,
-  "PL_Pricing_Matrix_Name" TEXT,
-  "BillCustomer_CUSTNAME" TEXT,
-  "SV00302_Equipment_ID" TEXT,
-  "Generator_Equipment_ID" TEXT,
-  "Generator_Wennsoft_Model_Number" TEXT,
-  "Generator_Wennsoft_Serial_Number" TEXT,
-  "Engine_Equipment_ID" TEXT,
-  "Engine_Wennsoft_Model_Number" TEXT,
-  "Engine_Wennsoft_Serial_Number" TEXT,
-  "ATS_Equipment_ID" TEXT,
-  "ATS_Wennsoft_Model_Number" TEXT,
-  "ATS_Wennsoft_Serial_Number" TEXT,
-  "SV00400_Extended_Warr_Expiration" TIMESTAMP,
-  "SV00400_Warranty_Expiration" TIMESTAMP,
-  "SV00400_Install_Date" TIMESTAMP
-);
-CREATE TABLE IF NOT EXISTS "sv000805_service_notes_resolution" (
-"CUSTNMBR" TEXT,
-  "ADRSCODE" TEXT,
-  "Service_Call_ID" TEXT,
-  "Record_Notes" TEXT,
-  "WS_Note_Type" TEXT,
-  "Note_Service_Index" TEXT,
-  "USERID" TEXT,
-  "Technician_ID" TEXT,
-  "Technician_Team" TEXT,
-  "Note_Author" TEXT
-);
-CREATE TABLE IF NOT EXISTS "sv000805_service_notes_description" (
-"CUSTNMBR" TEXT,
-  "ADRSCODE" TEXT,
-  "Service_Call_ID" TEXT,
-  "Record_Notes" TEXT,
-  "WS_Note_Type" TEXT,
-  "Note_Service_Index" TEXT,
-  "USERID" TEXT,
-  "Technician_ID" TEXT,
-  "Technician_Team" TEXT,
-  "Note_Author" TEXT
-);
-CREATE TABLE IF NOT EXISTS "iv00102_item_quantity_all" (
-"ITEMNMBR" TEXT,
-  "LOCNCODE" TEXT,
-  "QTYONHND" REAL
-);
-
 -- Tables for Inspection Feature
 CREATE TABLE IF NOT EXISTS "checklists" (
     "id" INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -232,7 +46,468 @@ CREATE TABLE IF NOT EXISTS "inspection_photos" (
     "id" INTEGER PRIMARY KEY AUTOINCREMENT,
     "inspection_id" INTEGER NOT NULL,
     "file_path" TEXT NOT NULL,
+    "content_hash" TEXT, -- Set for photos uploaded through the API; see photo_blob
     "description" TEXT,
     "uploaded_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY ("inspection_id") REFERENCES "inspections"("id") ON DELETE CASCADE
 );
+
+-- Tables for Quote Feature
+CREATE TABLE IF NOT EXISTS "quote" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "service_call_id" TEXT NOT NULL,
+    "revision" INTEGER NOT NULL,
+    "description" TEXT,
+    "customer_name" TEXT,
+    "status" TEXT NOT NULL DEFAULT 'Draft',
+    "tech_count" REAL,
+    "tech_hours" REAL,
+    "travel_hours" REAL,
+    "tech_rate" REAL,
+    "travel_rate" REAL,
+    "created_at" TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS "quote_line_item" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "quote_id" INTEGER NOT NULL,
+    "part_number" TEXT,
+    "description" TEXT,
+    "vendor" TEXT,
+    "on_hand" TEXT,
+    "quantity" REAL,
+    "unit_cost" REAL,
+    "total_cost" REAL,
+    FOREIGN KEY ("quote_id") REFERENCES "quote"("id") ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "subcontractor" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "quote_id" INTEGER NOT NULL,
+    "contact_name" TEXT,
+    "contact_details" TEXT,
+    "cost" REAL,
+    FOREIGN KEY ("quote_id") REFERENCES "quote"("id") ON DELETE CASCADE
+);
+
+-- Indexes for hot lookups. (ERP table indexes live in erp_schema.sql.)
+-- Service call IDs are compared with TRIM() to match the space-padded ERP IDs, so the quote
+-- lookup is an expression index the planner can match directly.
+CREATE INDEX IF NOT EXISTS "idx_quote_call_id_revision" ON "quote" (TRIM("service_call_id"), "revision");
+CREATE INDEX IF NOT EXISTS "idx_quote_line_item_quote_id" ON "quote_line_item" ("quote_id");
+-- A part's most recent quote line, for the parts autocomplete index
+CREATE INDEX IF NOT EXISTS "idx_quote_line_item_part_number" ON "quote_line_item" (TRIM("part_number"), "id");
+CREATE INDEX IF NOT EXISTS "idx_subcontractor_quote_id" ON "subcontractor" ("quote_id");
+-- Per-item failure rates (/api/inspections/analytics): inspections of a checklist in a date range,
+-- then their results read from the covering index alone. It also serves lookups by inspection_id,
+-- so the single-column index it supersedes is dropped.
+CREATE INDEX IF NOT EXISTS "idx_inspection_results_item_status" ON "inspection_results" ("inspection_id", "checklist_item_id", "status");
+DROP INDEX IF EXISTS "idx_inspection_results_inspection_id";
+CREATE INDEX IF NOT EXISTS "idx_inspections_checklist_date" ON "inspections" ("checklist_id", "inspection_date");
+CREATE INDEX IF NOT EXISTS "idx_inspection_photos_inspection_id" ON "inspection_photos" ("inspection_id");
+CREATE INDEX IF NOT EXISTS "idx_checklist_items_checklist_id" ON "inspection_checklist_items" ("checklist_id", "display_order");
+
+-- Per-quote money totals for the quote listing, kept current by the triggers below so a page
+-- sorted by total is an index walk rather than an aggregate over every quote's lines.
+-- labor_total = tech_count * tech_hours * tech_rate + travel_hours * travel_rate, and
+-- total = parts + subcontractors + labor (before the fee and surcharge the quote sheet adds).
+-- Sums are recomputed per quote rather than adjusted by deltas, so they stay exactly equal
+-- to a SUM() over the base rows.
+CREATE TABLE IF NOT EXISTS "quote_totals" (
+    "quote_id" INTEGER PRIMARY KEY REFERENCES "quote"("id") ON DELETE CASCADE,
+    "parts_total" REAL NOT NULL DEFAULT 0,
+    "subcontractor_total" REAL NOT NULL DEFAULT 0,
+    "labor_total" REAL NOT NULL DEFAULT 0,
+    "total" REAL NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_quote_insert" AFTER INSERT ON "quote" BEGIN
+    INSERT OR REPLACE INTO "quote_totals" ("quote_id", "labor_total")
+    VALUES (new."id", COALESCE(new."tech_count" * new."tech_hours" * new."tech_rate", 0) + COALESCE(new."travel_hours" * new."travel_rate", 0));
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" = new."id";
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_quote_update"
+AFTER UPDATE OF "tech_count", "tech_hours", "tech_rate", "travel_hours", "travel_rate" ON "quote" BEGIN
+    UPDATE "quote_totals"
+    SET "labor_total" = COALESCE(new."tech_count" * new."tech_hours" * new."tech_rate", 0) + COALESCE(new."travel_hours" * new."travel_rate", 0)
+    WHERE "quote_id" = new."id";
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" = new."id";
+END;
+
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_line_insert" AFTER INSERT ON "quote_line_item" BEGIN
+    UPDATE "quote_totals" SET "parts_total" = (SELECT COALESCE(SUM("total_cost"), 0) FROM "quote_line_item" WHERE "quote_id" = new."quote_id")
+    WHERE "quote_id" = new."quote_id";
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" = new."quote_id";
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_line_update" AFTER UPDATE OF "quote_id", "total_cost" ON "quote_line_item" BEGIN
+    UPDATE "quote_totals" SET "parts_total" = (SELECT COALESCE(SUM("total_cost"), 0) FROM "quote_line_item" WHERE "quote_id" = "quote_totals"."quote_id")
+    WHERE "quote_id" IN (old."quote_id", new."quote_id");
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" IN (old."quote_id", new."quote_id");
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_line_delete" AFTER DELETE ON "quote_line_item" BEGIN
+    UPDATE "quote_totals" SET "parts_total" = (SELECT COALESCE(SUM("total_cost"), 0) FROM "quote_line_item" WHERE "quote_id" = old."quote_id")
+    WHERE "quote_id" = old."quote_id";
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" = old."quote_id";
+END;
+
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_subcontractor_insert" AFTER INSERT ON "subcontractor" BEGIN
+    UPDATE "quote_totals" SET "subcontractor_total" = (SELECT COALESCE(SUM("cost"), 0) FROM "subcontractor" WHERE "quote_id" = new."quote_id")
+    WHERE "quote_id" = new."quote_id";
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" = new."quote_id";
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_subcontractor_update" AFTER UPDATE OF "quote_id", "cost" ON "subcontractor" BEGIN
+    UPDATE "quote_totals" SET "subcontractor_total" = (SELECT COALESCE(SUM("cost"), 0) FROM "subcontractor" WHERE "quote_id" = "quote_totals"."quote_id")
+    WHERE "quote_id" IN (old."quote_id", new."quote_id");
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" IN (old."quote_id", new."quote_id");
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_quote_totals_subcontractor_delete" AFTER DELETE ON "subcontractor" BEGIN
+    UPDATE "quote_totals" SET "subcontractor_total" = (SELECT COALESCE(SUM("cost"), 0) FROM "subcontractor" WHERE "quote_id" = old."quote_id")
+    WHERE "quote_id" = old."quote_id";
+    UPDATE "quote_totals" SET "total" = "parts_total" + "subcontractor_total" + "labor_total" WHERE "quote_id" = old."quote_id";
+END;
+
+-- Backfill quotes saved before quote_totals existed (a no-op once every quote has a row)
+INSERT INTO "quote_totals" ("quote_id", "parts_total", "subcontractor_total", "labor_total", "total")
+SELECT "id", "parts_total", "subcontractor_total", "labor_total", "parts_total" + "subcontractor_total" + "labor_total"
+FROM (
+    SELECT q."id",
+           (SELECT COALESCE(SUM("total_cost"), 0) FROM "quote_line_item" WHERE "quote_id" = q."id") AS "parts_total",
+           (SELECT COALESCE(SUM("cost"), 0) FROM "subcontractor" WHERE "quote_id" = q."id") AS "subcontractor_total",
+           COALESCE(q."tech_count" * q."tech_hours" * q."tech_rate", 0) + COALESCE(q."travel_hours" * q."travel_rate", 0) AS "labor_total"
+    FROM "quote" q
+    WHERE NOT EXISTS (SELECT 1 FROM "quote_totals" t WHERE t."quote_id" = q."id")
+);
+
+-- Keyset pagination for the quote listing: each sort order has an index whose key ends in the
+-- quote id, so "rows after (value, id)" is a seek and page N costs the same as page 1. The
+-- created-date indexes also carry the filter and display columns, so those pages never touch
+-- the quote table itself.
+CREATE INDEX IF NOT EXISTS "idx_quote_created_at" ON "quote" ("created_at", "id", "status", "customer_name", "service_call_id", "revision");
+CREATE INDEX IF NOT EXISTS "idx_quote_status_created_at" ON "quote" ("status", "created_at", "id", "customer_name", "service_call_id", "revision");
+CREATE INDEX IF NOT EXISTS "idx_quote_totals_total" ON "quote_totals" ("total", "quote_id");
+
+-- Dashboard rollups, kept current by the triggers below so /api/dashboard never scans the base
+-- tables. Money is summed in integer cents (each quote's total rounded to the cent), so the
+-- running sums are exact and always equal a recompute; `python api_server.py --check-rollups`
+-- verifies that and --rebuild-rollups recomputes them. Months are 'YYYY-MM' of the quote's
+-- created_at and the inspection's inspection_date.
+-- Deleting a quote or inspection subtracts its whole contribution in a BEFORE DELETE trigger;
+-- by the time ON DELETE CASCADE removes the children, the parent row is gone, so the child
+-- triggers (which look the parent up) do nothing.
+CREATE TABLE IF NOT EXISTS "dashboard_quote_rollup" (
+    "month" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "quote_count" INTEGER NOT NULL DEFAULT 0,
+    "total_cents" INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("month", "status")
+);
+
+CREATE TABLE IF NOT EXISTS "dashboard_inspection_rollup" (
+    "month" TEXT NOT NULL,
+    "checklist_id" INTEGER NOT NULL,
+    "inspection_count" INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("month", "checklist_id")
+);
+
+CREATE TABLE IF NOT EXISTS "dashboard_inspection_result_rollup" (
+    "month" TEXT NOT NULL,
+    "checklist_id" INTEGER NOT NULL,
+    "status" TEXT NOT NULL, -- inspection_results.status: Passed, Failed, Not Checked, ...
+    "result_count" INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("month", "checklist_id", "status")
+);
+
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_quote_insert" AFTER INSERT ON "quote" BEGIN
+    INSERT INTO "dashboard_quote_rollup" ("month", "status", "quote_count")
+    VALUES (COALESCE(strftime('%Y-%m', new."created_at"), 'unknown'), new."status", 1)
+    ON CONFLICT DO UPDATE SET "quote_count" = "quote_count" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_quote_delete" BEFORE DELETE ON "quote" BEGIN
+    UPDATE "dashboard_quote_rollup"
+    SET "quote_count" = "quote_count" - 1,
+        "total_cents" = "total_cents" - COALESCE((SELECT CAST(ROUND("total" * 100) AS INTEGER) FROM "quote_totals" WHERE "quote_id" = old."id"), 0)
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."created_at"), 'unknown') AND "status" = old."status";
+    DELETE FROM "dashboard_quote_rollup"
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."created_at"), 'unknown') AND "status" = old."status" AND "quote_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_quote_move" AFTER UPDATE OF "status", "created_at" ON "quote" BEGIN
+    UPDATE "dashboard_quote_rollup"
+    SET "quote_count" = "quote_count" - 1,
+        "total_cents" = "total_cents" - COALESCE((SELECT CAST(ROUND("total" * 100) AS INTEGER) FROM "quote_totals" WHERE "quote_id" = old."id"), 0)
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."created_at"), 'unknown') AND "status" = old."status";
+    INSERT INTO "dashboard_quote_rollup" ("month", "status", "quote_count", "total_cents")
+    VALUES (COALESCE(strftime('%Y-%m', new."created_at"), 'unknown'), new."status", 1,
+            COALESCE((SELECT CAST(ROUND("total" * 100) AS INTEGER) FROM "quote_totals" WHERE "quote_id" = new."id"), 0))
+    ON CONFLICT DO UPDATE SET "quote_count" = "quote_count" + 1, "total_cents" = "total_cents" + excluded."total_cents";
+    DELETE FROM "dashboard_quote_rollup"
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."created_at"), 'unknown') AND "status" = old."status" AND "quote_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_quote_total" AFTER UPDATE OF "total" ON "quote_totals" BEGIN
+    INSERT INTO "dashboard_quote_rollup" ("month", "status", "total_cents")
+    SELECT COALESCE(strftime('%Y-%m', "created_at"), 'unknown'), "status",
+           CAST(ROUND(new."total" * 100) AS INTEGER) - CAST(ROUND(old."total" * 100) AS INTEGER)
+    FROM "quote" WHERE "id" = new."quote_id"
+    ON CONFLICT DO UPDATE SET "total_cents" = "total_cents" + excluded."total_cents";
+END;
+
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_inspection_insert" AFTER INSERT ON "inspections" BEGIN
+    INSERT INTO "dashboard_inspection_rollup" ("month", "checklist_id", "inspection_count")
+    VALUES (COALESCE(strftime('%Y-%m', new."inspection_date"), 'unknown'), new."checklist_id", 1)
+    ON CONFLICT DO UPDATE SET "inspection_count" = "inspection_count" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_inspection_delete" BEFORE DELETE ON "inspections" BEGIN
+    UPDATE "dashboard_inspection_rollup" SET "inspection_count" = "inspection_count" - 1
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown') AND "checklist_id" = old."checklist_id";
+    UPDATE "dashboard_inspection_result_rollup"
+    SET "result_count" = "result_count" - (SELECT COUNT(*) FROM "inspection_results" r
+                                           WHERE r."inspection_id" = old."id" AND r."status" = "dashboard_inspection_result_rollup"."status")
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown') AND "checklist_id" = old."checklist_id";
+    DELETE FROM "dashboard_inspection_rollup" WHERE "inspection_count" = 0;
+    DELETE FROM "dashboard_inspection_result_rollup" WHERE "result_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_inspection_move" AFTER UPDATE OF "inspection_date", "checklist_id" ON "inspections" BEGIN
+    UPDATE "dashboard_inspection_rollup" SET "inspection_count" = "inspection_count" - 1
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown') AND "checklist_id" = old."checklist_id";
+    UPDATE "dashboard_inspection_result_rollup"
+    SET "result_count" = "result_count" - (SELECT COUNT(*) FROM "inspection_results" r
+                                           WHERE r."inspection_id" = old."id" AND r."status" = "dashboard_inspection_result_rollup"."status")
+    WHERE "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown') AND "checklist_id" = old."checklist_id";
+    INSERT INTO "dashboard_inspection_rollup" ("month", "checklist_id", "inspection_count")
+    VALUES (COALESCE(strftime('%Y-%m', new."inspection_date"), 'unknown'), new."checklist_id", 1)
+    ON CONFLICT DO UPDATE SET "inspection_count" = "inspection_count" + 1;
+    INSERT INTO "dashboard_inspection_result_rollup" ("month", "checklist_id", "status", "result_count")
+    SELECT COALESCE(strftime('%Y-%m', new."inspection_date"), 'unknown'), new."checklist_id", "status", COUNT(*)
+    FROM "inspection_results" WHERE "inspection_id" = new."id" GROUP BY "status"
+    ON CONFLICT DO UPDATE SET "result_count" = "result_count" + excluded."result_count";
+    DELETE FROM "dashboard_inspection_rollup" WHERE "inspection_count" = 0;
+    DELETE FROM "dashboard_inspection_result_rollup" WHERE "result_count" = 0;
+END;
+
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_result_insert" AFTER INSERT ON "inspection_results" BEGIN
+    INSERT INTO "dashboard_inspection_result_rollup" ("month", "checklist_id", "status", "result_count")
+    SELECT COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown'), "checklist_id", new."status", 1
+    FROM "inspections" WHERE "id" = new."inspection_id"
+    ON CONFLICT DO UPDATE SET "result_count" = "result_count" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_result_delete" AFTER DELETE ON "inspection_results" BEGIN
+    UPDATE "dashboard_inspection_result_rollup" SET "result_count" = "result_count" - 1
+    WHERE ("month", "checklist_id") = (SELECT COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown'), "checklist_id"
+                                       FROM "inspections" WHERE "id" = old."inspection_id")
+      AND "status" = old."status";
+    DELETE FROM "dashboard_inspection_result_rollup" WHERE "result_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_dashboard_result_update" AFTER UPDATE OF "status", "inspection_id" ON "inspection_results" BEGIN
+    UPDATE "dashboard_inspection_result_rollup" SET "result_count" = "result_count" - 1
+    WHERE ("month", "checklist_id") = (SELECT COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown'), "checklist_id"
+                                       FROM "inspections" WHERE "id" = old."inspection_id")
+      AND "status" = old."status";
+    INSERT INTO "dashboard_inspection_result_rollup" ("month", "checklist_id", "status", "result_count")
+    SELECT COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown'), "checklist_id", new."status", 1
+    FROM "inspections" WHERE "id" = new."inspection_id"
+    ON CONFLICT DO UPDATE SET "result_count" = "result_count" + 1;
+    DELETE FROM "dashboard_inspection_result_rollup" WHERE "result_count" = 0;
+END;
+
+-- Per-item result counts by checklist and month for /api/inspections/analytics, maintained the
+-- same way as the dashboard rollups (and checked and rebuilt with them). Whole months of a date
+-- range are read from here; partial months at either end come from inspection_results.
+-- Zero rows are deleted by their full key, since this table grows with checklist size.
+CREATE TABLE IF NOT EXISTS "inspection_item_result_rollup" (
+    "checklist_id" INTEGER NOT NULL,
+    "month" TEXT NOT NULL,
+    "checklist_item_id" INTEGER NOT NULL,
+    "status" TEXT NOT NULL,
+    "result_count" INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY ("checklist_id", "month", "checklist_item_id", "status")
+);
+
+CREATE TRIGGER IF NOT EXISTS "trg_item_rollup_result_insert" AFTER INSERT ON "inspection_results" BEGIN
+    INSERT INTO "inspection_item_result_rollup" ("checklist_id", "month", "checklist_item_id", "status", "result_count")
+    SELECT "checklist_id", COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown'), new."checklist_item_id", new."status", 1
+    FROM "inspections" WHERE "id" = new."inspection_id"
+    ON CONFLICT DO UPDATE SET "result_count" = "result_count" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_item_rollup_result_delete" AFTER DELETE ON "inspection_results" BEGIN
+    UPDATE "inspection_item_result_rollup" SET "result_count" = "result_count" - 1
+    WHERE ("checklist_id", "month") = (SELECT "checklist_id", COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown')
+                                       FROM "inspections" WHERE "id" = old."inspection_id")
+      AND "checklist_item_id" = old."checklist_item_id" AND "status" = old."status";
+    DELETE FROM "inspection_item_result_rollup"
+    WHERE ("checklist_id", "month") = (SELECT "checklist_id", COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown')
+                                       FROM "inspections" WHERE "id" = old."inspection_id")
+      AND "checklist_item_id" = old."checklist_item_id" AND "status" = old."status" AND "result_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_item_rollup_result_update" AFTER UPDATE OF "status", "inspection_id", "checklist_item_id" ON "inspection_results" BEGIN
+    UPDATE "inspection_item_result_rollup" SET "result_count" = "result_count" - 1
+    WHERE ("checklist_id", "month") = (SELECT "checklist_id", COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown')
+                                       FROM "inspections" WHERE "id" = old."inspection_id")
+      AND "checklist_item_id" = old."checklist_item_id" AND "status" = old."status";
+    INSERT INTO "inspection_item_result_rollup" ("checklist_id", "month", "checklist_item_id", "status", "result_count")
+    SELECT "checklist_id", COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown'), new."checklist_item_id", new."status", 1
+    FROM "inspections" WHERE "id" = new."inspection_id"
+    ON CONFLICT DO UPDATE SET "result_count" = "result_count" + 1;
+    DELETE FROM "inspection_item_result_rollup"
+    WHERE ("checklist_id", "month") = (SELECT "checklist_id", COALESCE(strftime('%Y-%m', "inspection_date"), 'unknown')
+                                       FROM "inspections" WHERE "id" = old."inspection_id")
+      AND "checklist_item_id" = old."checklist_item_id" AND "status" = old."status" AND "result_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_item_rollup_inspection_delete" BEFORE DELETE ON "inspections" BEGIN
+    UPDATE "inspection_item_result_rollup"
+    SET "result_count" = "result_count" - (SELECT COUNT(*) FROM "inspection_results" r
+                                           WHERE r."inspection_id" = old."id"
+                                             AND r."checklist_item_id" = "inspection_item_result_rollup"."checklist_item_id"
+                                             AND r."status" = "inspection_item_result_rollup"."status")
+    WHERE "checklist_id" = old."checklist_id" AND "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown');
+    DELETE FROM "inspection_item_result_rollup"
+    WHERE "checklist_id" = old."checklist_id" AND "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown')
+      AND "result_count" = 0;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_item_rollup_inspection_move" AFTER UPDATE OF "inspection_date", "checklist_id" ON "inspections" BEGIN
+    UPDATE "inspection_item_result_rollup"
+    SET "result_count" = "result_count" - (SELECT COUNT(*) FROM "inspection_results" r
+                                           WHERE r."inspection_id" = old."id"
+                                             AND r."checklist_item_id" = "inspection_item_result_rollup"."checklist_item_id"
+                                             AND r."status" = "inspection_item_result_rollup"."status")
+    WHERE "checklist_id" = old."checklist_id" AND "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown');
+    INSERT INTO "inspection_item_result_rollup" ("checklist_id", "month", "checklist_item_id", "status", "result_count")
+    SELECT new."checklist_id", COALESCE(strftime('%Y-%m', new."inspection_date"), 'unknown'), "checklist_item_id", "status", COUNT(*)
+    FROM "inspection_results" WHERE "inspection_id" = new."id" GROUP BY "checklist_item_id", "status"
+    ON CONFLICT DO UPDATE SET "result_count" = "result_count" + excluded."result_count";
+    DELETE FROM "inspection_item_result_rollup"
+    WHERE "checklist_id" = old."checklist_id" AND "month" = COALESCE(strftime('%Y-%m', old."inspection_date"), 'unknown')
+      AND "result_count" = 0;
+END;
+
+-- Version stamps used to validate cached API payloads across gunicorn workers.
+-- service_call_version is bumped by save_quote for the call it touched; the ERP side of the
+-- stamp is the snapshot generation (see snapshot_metadata in erp_schema.sql).
+CREATE TABLE IF NOT EXISTS "service_call_version" (
+    "service_call_id" TEXT PRIMARY KEY,
+    "version" INTEGER NOT NULL DEFAULT 0
+);
+
+-- checklist_version is bumped by the triggers below on any change to a checklist or its items
+-- and stamps the cached GET /api/checklists/<id> payload. (updated_at only has one-second
+-- resolution and a deleted item leaves no timestamp behind, so it can't serve as the version.)
+CREATE TABLE IF NOT EXISTS "checklist_version" (
+    "checklist_id" INTEGER PRIMARY KEY,
+    "version" INTEGER NOT NULL DEFAULT 0
+);
+CREATE TRIGGER IF NOT EXISTS "trg_checklist_version_update" AFTER UPDATE ON "checklists" BEGIN
+    INSERT INTO "checklist_version" ("checklist_id", "version") VALUES (new."id", 1)
+    ON CONFLICT DO UPDATE SET "version" = "version" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_checklist_version_delete" AFTER DELETE ON "checklists" BEGIN
+    INSERT INTO "checklist_version" ("checklist_id", "version") VALUES (old."id", 1)
+    ON CONFLICT DO UPDATE SET "version" = "version" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_checklist_version_item_insert" AFTER INSERT ON "inspection_checklist_items" BEGIN
+    INSERT INTO "checklist_version" ("checklist_id", "version") VALUES (new."checklist_id", 1)
+    ON CONFLICT DO UPDATE SET "version" = "version" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_checklist_version_item_update" AFTER UPDATE ON "inspection_checklist_items" BEGIN
+    INSERT INTO "checklist_version" ("checklist_id", "version")
+    SELECT "checklist_id", 1 FROM (SELECT old."checklist_id" AS "checklist_id" UNION SELECT new."checklist_id") WHERE true
+    ON CONFLICT DO UPDATE SET "version" = "version" + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_checklist_version_item_delete" AFTER DELETE ON "inspection_checklist_items" BEGIN
+    INSERT INTO "checklist_version" ("checklist_id", "version") VALUES (old."checklist_id", 1)
+    ON CONFLICT DO UPDATE SET "version" = "version" + 1;
+END;
+
+-- Trimmed part numbers whose quote lines were inserted, edited in place or deleted, in order.
+-- PartsIndex in api_server.py re-reads the latest line of just the parts logged since the last
+-- seq it applied. Only the newest 10000 changes are kept; a worker that falls further behind
+-- than that rebuilds its index. (Replaces the table_version edit counter.)
+DROP TRIGGER IF EXISTS "trg_table_version_quote_line_item";
+DROP TABLE IF EXISTS "table_version";
+CREATE TABLE IF NOT EXISTS "quote_line_part_change" (
+    "seq" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "part_number" TEXT NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS "trg_part_change_prune" AFTER INSERT ON "quote_line_part_change" BEGIN
+    DELETE FROM "quote_line_part_change" WHERE "seq" <= new."seq" - 10000;
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_part_change_line_insert" AFTER INSERT ON "quote_line_item"
+WHEN TRIM(COALESCE(new."part_number", '')) != '' BEGIN
+    INSERT INTO "quote_line_part_change" ("part_number") VALUES (TRIM(new."part_number"));
+END;
+CREATE TRIGGER IF NOT EXISTS "trg_part_change_line_update"
+AFTER UPDATE OF "part_number", "description", "vendor", "unit_cost" ON "quote_line_item"
+WHEN (old."part_number", old."description", old."vendor", old."unit_cost")
+     IS NOT (new."part_number", new."description", new."vendor", new."unit_cost") BEGIN
+    INSERT INTO "quote_line_part_change" ("part_number")
+    SELECT TRIM("part_number") FROM (SELECT old."part_number" AS "part_number" UNION SELECT new."part_number")
+    WHERE TRIM(COALESCE("part_number", '')) != '';
+END;
+-- Also fires for the lines of a deleted quote (ON DELETE CASCADE)
+CREATE TRIGGER IF NOT EXISTS "trg_part_change_line_delete" AFTER DELETE ON "quote_line_item"
+WHEN TRIM(COALESCE(old."part_number", '')) != '' BEGIN
+    INSERT INTO "quote_line_part_change" ("part_number") VALUES (TRIM(old."part_number"));
+END;
+
+-- Responses to POST /api/quote requests that carried an Idempotency-Key header, so a client
+-- retry is answered from here instead of saving again. Pruned after QUOTE_IDEMPOTENCY_TTL.
+CREATE TABLE IF NOT EXISTS "quote_save_request" (
+    "key" TEXT PRIMARY KEY,
+    "request_hash" TEXT NOT NULL, -- SHA-256 of the request body; a reused key with a different body is rejected
+    "response" TEXT NOT NULL, -- JSON
+    "created_at" REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_quote_save_request_created_at" ON "quote_save_request" ("created_at");
+
+-- Queue for asynchronous /summarize/jobs requests, shared by all API workers.
+-- Timestamps are Unix epoch seconds so wait and LLM latency can be computed directly.
+CREATE TABLE IF NOT EXISTS "summarize_job" (
+    "id" TEXT PRIMARY KEY,
+    "status" TEXT NOT NULL DEFAULT 'queued', -- e.g., queued, running, done, failed
+    "writeup" TEXT NOT NULL,
+    "bypass_cache" BOOLEAN NOT NULL DEFAULT 0,
+    "result" TEXT, -- JSON
+    "error" TEXT,
+    "created_at" REAL NOT NULL,
+    "started_at" REAL,
+    "finished_at" REAL
+);
+CREATE INDEX IF NOT EXISTS "idx_summarize_job_status" ON "summarize_job" ("status", "created_at");
+
+-- Persistent, content-addressed cache of LLM completions (see LLMResponseCache in api_server.py).
+-- "key" is a SHA-256 of the normalized prompt, model name and generation parameters.
+CREATE TABLE IF NOT EXISTS "llm_cache" (
+    "key" TEXT PRIMARY KEY,
+    "model" TEXT NOT NULL,
+    "content" TEXT NOT NULL,
+    "llm_seconds" REAL,
+    "hit_count" INTEGER NOT NULL DEFAULT 0,
+    "created_at" REAL NOT NULL,
+    "last_used_at" REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "idx_llm_cache_last_used" ON "llm_cache" ("last_used_at");
+
+-- Inspection photos uploaded through the API, one row per distinct file: uploads are stored
+-- under their SHA-256, so a duplicate upload reuses the existing row and files. The derivative_*
+-- columns double as the queue for the background thumbnail workers (see PhotoDerivativeQueue in
+-- api_server.py). Paths are relative to PHOTO_STORAGE_DIR; timestamps are Unix epoch seconds.
+CREATE TABLE IF NOT EXISTS "photo_blob" (
+    "content_hash" TEXT PRIMARY KEY,
+    "file_path" TEXT NOT NULL,
+    "content_type" TEXT NOT NULL,
+    "size_bytes" INTEGER NOT NULL,
+    "thumbnail_path" TEXT,
+    "preview_path" TEXT,
+    "derivative_status" TEXT NOT NULL DEFAULT 'queued', -- e.g., queued, running, done, failed, skipped
+    "derivative_error" TEXT,
+    "uploaded_at" REAL NOT NULL,
+    "derive_started_at" REAL,
+    "derived_at" REAL
+);
+CREATE INDEX IF NOT EXISTS "idx_photo_blob_derivative_status" ON "photo_blob" ("derivative_status", "uploaded_at");
+
+-- Latest metrics snapshot of each API worker process (see Metrics in api_server.py). /metrics
+-- sums the rows, so a scrape through any worker covers them all. Workers that are gone are
+-- folded into the 'retired' row, which keeps their totals.
+CREATE TABLE IF NOT EXISTS "metrics_worker" (
+    "worker" TEXT PRIMARY KEY, -- "<pid>-<random suffix>", unique per process, or 'retired'
+    "snapshot" TEXT NOT NULL,  -- JSON list of [name, labels, value]
+    "updated_at" REAL NOT NULL
+);
@@ -1,8 +1,25 @@
+import argparse
+import os
+import pathlib
+import queue
 import sqlite3
-import pyodbc
-import pandas as pd
 import re
+import sys
+import threading
+import time
+import tracemalloc
 import traceback
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import pyodbc
+except ImportError: # Only needed when reading from SQL Server; see SQLiteSource
+    pyodbc = None
+try:
+    import resource
+except ImportError: # Not available on Windows; peak RSS is then reported as 0
+    resource = None
 
 # --- 1. CONFIGURATION ---
 # Update these details to match your SQL Server connection
@@ -12,11 +29,44 @@ DATABASE = "KINSL"   # The database name
 CONNECTION_STRING = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};Trusted_Connection=yes;"
 # SQL_AUTH_CONNECTION_STRING = f"DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SQL_SERVER};DATABASE={DATABASE};UID=your_username;PWD=your_password;"
 
-# Name for the output SQLite database file
-SQLITE_DB_NAME = "test_data_trim.db"
+# The API's application database. ERP data goes into a separate snapshot file next to it
+# (the API reads the same SQLITE_DB_NAME and ERP_DB_NAME variables).
+SQLITE_DB_NAME = os.environ.get("SQLITE_DB_NAME", "test_data_trim.db")
+ERP_DB_NAME = os.environ.get("ERP_DB_NAME", os.path.join(os.path.dirname(SQLITE_DB_NAME), "erp_snapshot.db"))
+
+# ERP schema shared with the API; target table definitions come from here, and it is
+# re-applied after each load to restore indexes
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "erp_schema.sql")
+ERP_SCHEMA_VERSION = 3 # Bump (here and in api_server.py) when erp_schema.sql changes incompatibly
+
+# A new snapshot is rejected if any synced table lost more than this fraction of its rows
+# compared to the live snapshot, which usually means a truncated or failed extract.
+ETL_MAX_SHRINK = float(os.environ.get("ETL_MAX_SHRINK", "0.5"))
+
+# Rows fetched from SQL Server and written to SQLite per round trip. Memory use is
+# bounded by this, not by the size of the largest table.
+ETL_BATCH_SIZE = int(os.environ.get("ETL_BATCH_SIZE", "5000"))
+
+# Parallel extraction: tables are extracted concurrently over a pool of ETL_WORKERS source
+# connections, while a single writer loads them into SQLite one table at a time. Each table
+# buffers at most ETL_QUEUE_BATCHES batches between its extractor and the writer.
+ETL_WORKERS = int(os.environ.get("ETL_WORKERS", "3"))
+ETL_QUEUE_BATCHES = int(os.environ.get("ETL_QUEUE_BATCHES", "4"))
+ETL_MAX_RETRIES = int(os.environ.get("ETL_MAX_RETRIES", "3")) # Retries per table on transient source errors
+
+# Tables whose watermark can't see every change (edits to joined tables, deleted rows) are
+# reloaded in full by the first run after their last full reload is this many hours old.
+ETL_FULL_RELOAD_HOURS = float(os.environ.get("ETL_FULL_RELOAD_HOURS", "24"))
 
 # --- 2. QUERIES AND TABLE NAMES ---
 # All queries are now active.
+#
+# Incremental sync: each table may name a "watermark" column. After a load, the highest value
+# of that column is recorded in the sync_state table, and the next incremental run only pulls
+# source rows at or above it. Fetched rows replace the existing rows that share their
+# "key_columns". Tables without a reliable change-tracking column (watermark None) are always
+# reloaded in full, and tables with a "full_reload_hours" are also reloaded in full once their
+# last full reload is that old. Run with --full to force a complete reload of every table.
 
 QUERIES_TO_RUN = [
     {
@@ -30,7 +80,10 @@ QUERIES_TO_RUN = [
                [User_Def_Integer_1], [User_Def_Integer_2], [WSReserved_CB1], 
                [WSReserved_CB2], [DEX_ROW_ID] 
         FROM [KINSL].[dbo].[SV000123]
-        """
+        """,
+        # Small, and rate edits don't change DEX_ROW_ID, so it is always reloaded in full
+        "key_columns": ["DEX_ROW_ID"],
+        "watermark": None
     },
     {
         "table_name": "sv00166_pricing_matrix",
@@ -44,7 +97,9 @@ QUERIES_TO_RUN = [
                [WS_Bill_Other_Cost_Code], [Min_Amount_Total], [Max_Amount_Total], 
                [MODIFDT], [Modified_Time], [MDFUSRID], [DEX_ROW_ID] 
         FROM [KINSL].[dbo].[SV00166]
-        """
+        """,
+        "key_columns": ["DEX_ROW_ID"],
+        "watermark": "MODIFDT"
     },
     {
        "table_name": "service_call_details",
@@ -76,7 +131,9 @@ QUERIES_TO_RUN = [
             -- Warranty Information
             SV00400.[Extended_Warr_Expiration] AS SV00400_Extended_Warr_Expiration,
             SV00400.[Warranty_Expiration] AS SV00400_Warranty_Expiration,
-            SV00400.[Install_Date] AS SV00400_Install_Date
+            SV00400.[Install_Date] AS SV00400_Install_Date,
+            -- Change tracking: when the service call was last modified, as sortable text
+            CONVERT(char(19), SV00300.[MODIFDT] + SV00300.[Modified_Time], 120) AS SV00300_Modified_At
         FROM [KINSL]..SV00300 WITH (NOLOCK)
         LEFT JOIN [KINSL]..SV00200 WITH (NOLOCK) ON SV00200.[ADRSCODE] = SV00300.[ADRSCODE] AND SV00200.[CUSTNMBR] = SV00300.[CUSTNMBR]
         LEFT JOIN [KINSL]..SV00302 WITH (NOLOCK) ON SV00302.[Service_Call_ID] = SV00300.[Service_Call_ID]
@@ -92,23 +149,37 @@ QUERIES_TO_RUN = [
         LEFT JOIN [KINSL]..RM00101 AS BILLCUSTOMER WITH (NOLOCK) ON SV00300.Bill_Customer_Number = BILLCUSTOMER.CUSTNMBR
         WHERE
         SV00300.Service_Call_ID like '25%'
-       """
+       """,
+       # Re-fetches every call modified since the last sync, with all of its equipment rows.
+       # Edits to the joined customer and equipment tables don't touch SV00300, so those
+       # are picked up by the periodic full reload.
+       "key_columns": ["SV00300_Service_Call_ID"],
+       "watermark": "SV00300_Modified_At",
+       "full_reload_hours": ETL_FULL_RELOAD_HOURS
     },
     {
       "table_name": "sv000805_service_notes",
       "query": """
       SELECT [CUSTNMBR], [ADRSCODE], [Service_Call_ID], [Record_Notes], [WS_Note_Type],
-             [Note_Service_Index], [USERID], [Technician_ID], [Technician_Team], [Note_Author]
+             [Note_Service_Index], [USERID], [Technician_ID], [Technician_Team], [Note_Author], [DEX_ROW_ID]
       FROM [KINSL].[dbo].[SV000805]
       WHERE Service_Call_ID like '25%'
-      """
+      """,
+      # New notes get a higher DEX_ROW_ID whichever call they belong to. Edited and deleted
+      # notes keep or lose theirs, so those are picked up by the periodic full reload.
+      "key_columns": ["DEX_ROW_ID"],
+      "watermark": "DEX_ROW_ID",
+      "full_reload_hours": ETL_FULL_RELOAD_HOURS
     },
     {
       "table_name": "iv00102_item_quantity_all",
       "query": """
       SELECT IV00102.ITEMNMBR, IV00102.LOCNCODE, IV00102.QTYONHND
       FROM IV00102
-      """
+      """,
+      # IV00102 has no modified-date column, so quantity changes can only be seen by a full reload
+      "key_columns": ["ITEMNMBR", "LOCNCODE"],
+      "watermark": None
     }
 ]
 
@@ -133,55 +204,949 @@ def clean_and_extract_sql(power_query_string):
     return ' '.join(sql_query.split())
 
 
-def process_queries(query_list, sql_conn_str, sqlite_db):
+def to_sqlite_value(value):
+    """Converts a value from the SQL Server driver into the form pandas' to_sql would have stored."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def quote_identifier(name):
+    """Quotes a column or table name for SQLite."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_sync_state(sqlite_conn, item):
+    """
+    Returns the recorded watermark value to sync a table from incrementally, or None if it must
+    be reloaded in full: it has never been synced, it was synced on a different watermark
+    column, or its last full reload is older than its "full_reload_hours".
+    """
+    hours = item.get("full_reload_hours")
+    row = sqlite_conn.execute(
+        """SELECT watermark_value FROM sync_state WHERE table_name = ? AND watermark_column = ?
+           AND (? IS NULL OR last_full_sync_at >= datetime('now', ?))""",
+        (item["table_name"], item.get("watermark"), hours, f"-{hours or 0} hours")
+    ).fetchone()
+    return row[0] if row else None
+
+
+def save_sync_state(sqlite_conn, table_name, watermark_column, mode, rows_synced):
+    """Records the table's new high-water mark (read back from the loaded data) in sync_state."""
+    watermark_value = None
+    if watermark_column:
+        watermark_value = sqlite_conn.execute(
+            f"SELECT MAX({quote_identifier(watermark_column)}) FROM {quote_identifier(table_name)}"
+        ).fetchone()[0]
+    sqlite_conn.execute(
+        """INSERT INTO sync_state (table_name, watermark_column, watermark_value, last_mode, rows_synced,
+                                   last_synced_at, last_full_sync_at)
+           VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CASE WHEN ? = 'full' THEN CURRENT_TIMESTAMP END)
+           ON CONFLICT(table_name) DO UPDATE SET
+               watermark_column = excluded.watermark_column, watermark_value = excluded.watermark_value,
+               last_mode = excluded.last_mode, rows_synced = excluded.rows_synced,
+               last_synced_at = excluded.last_synced_at,
+               last_full_sync_at = COALESCE(excluded.last_full_sync_at, sync_state.last_full_sync_at)""",
+        (table_name, watermark_column, watermark_value, mode, rows_synced, mode)
+    )
+
+
+def build_incremental_query(query, watermark_column):
+    """Wraps a source query so it only returns rows at or above the given watermark parameter."""
+    return f"SELECT * FROM ({query}) AS src WHERE src.[{watermark_column}] >= ?"
+
+
+def load_table_definitions(schema_file):
+    """Returns {table_name: CREATE TABLE statement} for every table defined in the schema file."""
+    with open(schema_file, 'r') as f:
+        schema = f.read()
+    pattern = re.compile(r'CREATE TABLE IF NOT EXISTS "(\w+)" \(.*?\n\);', re.DOTALL)
+    return {match.group(1): match.group(0) for match in pattern.finditer(schema)}
+
+
+def table_columns(ddl):
+    """Column names of a CREATE TABLE statement from erp_schema.sql, in order."""
+    return re.findall(r'^\s*"(\w+)"', ddl, re.MULTILINE)
+
+
+def create_target_table(sqlite_conn, table_name, columns, table_definitions):
     """
-    Executes each query against SQL Server and writes the result to SQLite.
+    Creates the target table from its erp_schema.sql definition. Tables missing from the
+    schema fall back to untyped columns named after the source result set.
     """
-    print(f"--- Starting Data Transfer ---")
-    print(f"Source:      SQL Server '{SQL_SERVER}', Database '{DATABASE}'")
-    print(f"Destination: SQLite file '{sqlite_db}'\n")
+    ddl = table_definitions.get(table_name)
+    if ddl is None:
+        print(f"  - ⚠️ '{table_name}' is not defined in erp_schema.sql; creating it from the query's columns.")
+        ddl = f"CREATE TABLE {quote_identifier(table_name)} ({', '.join(quote_identifier(c) for c in columns)})"
+    sqlite_conn.execute(ddl)
+
+
+def insert_sql(table_name, columns):
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT INTO {quote_identifier(table_name)} ({', '.join(quote_identifier(c) for c in columns)}) VALUES ({placeholders})"
+
+
+def fetch_batches(cursor, batch_size):
+    """Yields converted rows from a source cursor in lists of at most batch_size."""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [tuple(to_sqlite_value(v) for v in row) for row in rows]
+
+
+def upsert_rows(sqlite_conn, table_name, columns, rows, key_columns):
+    """
+    Replaces existing rows that share a natural key with the fetched rows, then inserts them.
+    Delete-then-insert handles keys that map to several rows (e.g. all notes for a call).
+    """
+    table = quote_identifier(table_name)
+    key_positions = [columns.index(k) for k in key_columns]
+    keys = {tuple(row[i] for i in key_positions) for row in rows}
+    where = " AND ".join(f"{quote_identifier(k)} = ?" for k in key_columns)
+    sqlite_conn.executemany(f"DELETE FROM {table} WHERE {where}", list(keys))
+    sqlite_conn.executemany(insert_sql(table_name, columns), rows)
+
+
+def peak_rss_mb():
+    """The process's peak resident set size so far, in MB."""
+    if resource is None:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024) # Bytes on macOS, KB elsewhere
+
+
+def reset_memory_peak(trace_memory):
+    if trace_memory:
+        tracemalloc.reset_peak()
+
+
+def read_memory_peak(trace_memory):
+    """
+    Peak memory in MB since reset_memory_peak: Python allocations when tracing, otherwise the
+    process's peak RSS so far (which can't be reset, so it shows which table raised it).
+    """
+    if trace_memory:
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    return peak_rss_mb()
+
+
+# --- 3. SOURCE ADAPTERS ---
+
+class ODBCSource:
+    """Reads ERP tables from SQL Server through pyodbc using the queries in QUERIES_TO_RUN."""
+
+    # Connection failures, timeouts and deadlock victims are worth retrying
+    TRANSIENT_SQLSTATES = {"08S01", "08001", "40001", "HYT00", "HYT01"}
+
+    def __init__(self, connection_string):
+        self.connection_string = connection_string
+
+    def describe(self):
+        return f"SQL Server '{SQL_SERVER}', Database '{DATABASE}'"
+
+    def connect(self):
+        if pyodbc is None:
+            raise RuntimeError("pyodbc is not installed; it is required to read from SQL Server.")
+        return pyodbc.connect(self.connection_string)
+
+    def query_for(self, item):
+        return item["query"]
+
+    def is_transient(self, error):
+        return pyodbc is not None and isinstance(error, pyodbc.Error) and error.args[0] in self.TRANSIENT_SQLSTATES
+
+    def describe_error(self, error):
+        if pyodbc is not None and isinstance(error, pyodbc.Error):
+            return f"SQLSTATE: {error.args[0]}. Details: {error}"
+        return str(error)
+
+
+class SQLiteSource:
+    """
+    Reads ERP tables from another SQLite file that already holds them under their target
+    names (e.g. a copy of a previous extract, or synthetic data). Lets the sync be run and
+    tested without SQL Server or pyodbc.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def describe(self):
+        return f"SQLite file '{self.path}'"
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def query_for(self, item):
+        return f"SELECT * FROM {quote_identifier(item['table_name'])}"
+
+    def is_transient(self, error):
+        return isinstance(error, sqlite3.OperationalError) and ("locked" in str(error) or "busy" in str(error))
+
+    def describe_error(self, error):
+        return str(error)
+
+
+# --- 4. EXTRACTION AND LOADING ---
+# Each table is a job. An extractor thread runs the source query and streams messages into
+# the job's bounded queue; the writer (the calling thread) applies them to SQLite:
+#   ("begin", columns, query_seconds)  open the table's transaction and prepare the target
+#   ("rows", rows)                     insert or upsert one batch
+#   ("commit", attempts)               record sync state and commit
+#   ("abort", error, will_retry)       roll back; the extractor starts over if will_retry
+
+def extractor_worker(source, work_queue, ready_queue, batch_size, max_retries):
+    """Runs in an extractor thread, processing table jobs over one reused source connection."""
+    conn = None
+    while True:
+        job = work_queue.get()
+        if job is None:
+            break
+        announced = False
+
+        def send(message):
+            nonlocal announced
+            job["queue"].put(message)
+            if not announced:
+                ready_queue.put(job) # Tell the writer this table has something to consume
+                announced = True
+
+        for attempt in range(1, max_retries + 2):
+            started = time.perf_counter()
+            try:
+                if conn is None:
+                    conn = source.connect()
+                cursor = conn.cursor()
+                query = source.query_for(job["item"])
+                if job["mode"] == "incremental":
+                    cursor.execute(build_incremental_query(query, job["item"]["watermark"]), (job["watermark_value"],))
+                else:
+                    cursor.execute(query)
+                send(("begin", [d[0] for d in cursor.description], time.perf_counter() - started))
+                for rows in fetch_batches(cursor, batch_size):
+                    send(("rows", rows))
+                send(("commit", attempt))
+                break
+            except Exception as e:
+                will_retry = source.is_transient(e) and attempt <= max_retries
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None # Reconnect for the next attempt or table
+                send(("abort", e, will_retry))
+                if not will_retry:
+                    break
+                time.sleep(min(30, 2 ** attempt)) # Back off before retrying
+    if conn is not None:
+        conn.close()
+
+
+def write_table(sqlite_conn, job, table_definitions, source):
+    """
+    Consumes one table's messages in the writer thread. The whole table is applied in one
+    transaction, so readers see either the old rows or the complete new set.
+    Returns the number of rows written; raises if the table could not be synced.
+    """
+    item = job["item"]
+    table_name = item["table_name"]
+    rows_written = 0
+    while True:
+        message = job["queue"].get()
+        kind = message[0]
+        if kind == "begin":
+            columns, job["query_seconds"] = message[1], message[2]
+            rows_written = 0
+            job["changed_call_ids"] = set()
+            sqlite_conn.execute("BEGIN")
+            if job["mode"] == "incremental":
+                sqlite_conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {quote_identifier('idx_' + table_name + '_sync_key')} "
+                    f"ON {quote_identifier(table_name)} ({', '.join(quote_identifier(k) for k in item['key_columns'])})"
+                )
+            else:
+                sqlite_conn.execute(f"DROP TABLE IF EXISTS {quote_identifier(table_name)}")
+                create_target_table(sqlite_conn, table_name, columns, table_definitions)
+                statement = insert_sql(table_name, columns)
+        elif kind == "rows":
+            if job["mode"] == "incremental":
+                upsert_rows(sqlite_conn, table_name, columns, message[1], item["key_columns"])
+                if table_name in CALL_ID_COLUMNS:
+                    position = columns.index(CALL_ID_COLUMNS[table_name])
+                    job["changed_call_ids"].update(str(row[position]).strip() for row in message[1] if row[position] is not None)
+            else:
+                sqlite_conn.executemany(statement, message[1])
+            rows_written += len(message[1])
+        elif kind == "commit":
+            job["finished"] = True # Extractor is done with this table
+            save_sync_state(sqlite_conn, table_name, item.get("watermark"), job["mode"], rows_written)
+            sqlite_conn.commit()
+            job["attempts"] = message[1]
+            return rows_written
+        elif kind == "abort":
+            if sqlite_conn.in_transaction:
+                sqlite_conn.rollback()
+            error, will_retry = message[1], message[2]
+            if not will_retry:
+                job["finished"] = True
+                raise error
+            job["retries"] += 1
+            print(f"  - ⚠️ Transient error extracting '{table_name}', retrying: {source.describe_error(error)}")
+
+
+def drain_job(job):
+    """Discards a failed table's remaining messages so its extractor thread isn't left blocked."""
+    while True:
+        message = job["queue"].get()
+        if message[0] == "commit" or (message[0] == "abort" and not message[2]):
+            return
+
+
+def sync_table_full_pandas(item, source, sqlite_conn):
+    """
+    The original whole-table loader, kept for comparison (--loader pandas). Holds the entire
+    result set in memory and lets pandas infer column types. Returns the number of rows fetched.
+    """
+    import pandas as pd # Optional: only this loader needs pandas
+
+    # 1. Read data from the source using pandas
+    conn = source.connect()
+    try:
+        df = pd.read_sql_query(source.query_for(item), conn)
+    finally:
+        conn.close()
+
+    print(f"  - Fetched {len(df)} rows from the source.")
+
+    # 2. Write the DataFrame to a table in SQLite
+    # 'if_exists='replace'' will drop the table if it already exists and create a new one.
+    df.to_sql(item["table_name"], sqlite_conn, if_exists='replace', index=False)
+    with sqlite_conn:
+        save_sync_state(sqlite_conn, item["table_name"], item.get("watermark"), "full", len(df))
+    return len(df)
+
+
+# --- 5. MATERIALIZED SERVICE CALLS ---
+# The quote sheet needs, for each service call, its details row, every write-up note and its
+# labor group's billing rate. That only changes when ERP data does, so it is joined once per
+# sync into service_call_snapshot, and the API reads one row by primary key.
+
+# The extracted notes table. After each load it is split by WS_Note_Type into the
+# NOTE_SOURCES tables, which the write-ups and the note search index are built from.
+NOTES_TABLE = "sv000805_service_notes"
+# Tables whose changed service call IDs are tracked during incremental loads, with the ID column
+CALL_ID_COLUMNS = {
+    "service_call_details": "SV00300_Service_Call_ID",
+    NOTES_TABLE: "Service_Call_ID",
+}
+# Extracted tables feeding service_call_snapshot
+SERVICE_CALL_SOURCES = ("service_call_details", NOTES_TABLE)
+# Tables feeding service_note (and its full-text index), with the note type they are tagged as
+NOTE_SOURCES = {"sv000805_service_notes_description": "description", "sv000805_service_notes_resolution": "resolution"}
+# The WS_Note_Type value (compared trimmed and case-insensitively) of each note type
+NOTE_TYPE_CODES = {"description": "DESCRIPTION", "resolution": "RESOLUTION"}
+DEFAULT_LABOR_RATE = 75.00 # Tech/travel rate for calls whose labor group has no billing amount
+
+SQL_MATERIALIZE_DETAILS = """
+    SELECT TRIM(SV00300_Service_Call_ID), PL_CUSTNAME, BillCustomer_CUSTNAME, PL_Labor_Group_Name,
+           Generator_Wennsoft_Model_Number, Generator_Wennsoft_Serial_Number, SV00400_Warranty_Expiration,
+           ATS_Wennsoft_Model_Number, ATS_Wennsoft_Serial_Number, Engine_Wennsoft_Model_Number, Engine_Wennsoft_Serial_Number
+    FROM service_call_details WHERE SV00300_Service_Call_ID IS NOT NULL {where}
+    ORDER BY TRIM(SV00300_Service_Call_ID), rowid
+"""
+SQL_MATERIALIZE_NOTES = """
+    SELECT TRIM(Service_Call_ID), Record_Notes FROM sv000805_service_notes_description WHERE Service_Call_ID IS NOT NULL {where}
+    ORDER BY TRIM(Service_Call_ID), rowid
+"""
+SQL_INSERT_SERVICE_CALL = """
+    INSERT INTO service_call_snapshot (call_id, customer_name, customer_company, labor_group_name, tech_rate, travel_rate,
+        generator_model, generator_serial, generator_warranty_expires, ats_model, ats_serial, engine_model, engine_serial, writeup)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+SQL_INDEX_NOTES = """
+    INSERT INTO service_note (call_id, note_type, customer, technician, notes)
+    SELECT TRIM(Service_Call_ID), ?, TRIM(CUSTNMBR), TRIM(Technician_ID), TRIM(Record_Notes) FROM {table}
+    WHERE Service_Call_ID IS NOT NULL AND TRIM(COALESCE(Record_Notes, '')) != '' {where}
+    ORDER BY TRIM(Service_Call_ID), rowid
+"""
+CHANGED_CALLS_FILTER = "AND TRIM({column}) IN (SELECT call_id FROM temp.changed_calls)"
+SQL_SPLIT_NOTES = """
+    INSERT INTO {table} ({columns}) SELECT {columns} FROM sv000805_service_notes
+    WHERE UPPER(TRIM(WS_Note_Type)) = ? {where} ORDER BY rowid
+"""
+
+
+def stage_changed_calls(sqlite_conn, call_ids):
+    """Loads trimmed service call IDs into temp.changed_calls for the incremental rebuilds to join on."""
+    sqlite_conn.execute("CREATE TEMP TABLE IF NOT EXISTS changed_calls (call_id TEXT PRIMARY KEY)")
+    sqlite_conn.execute("DELETE FROM temp.changed_calls")
+    sqlite_conn.executemany("INSERT OR IGNORE INTO temp.changed_calls (call_id) VALUES (?)", ((c,) for c in call_ids))
+
+
+def plan_rebuild(sqlite_conn, jobs, sources, target, full_reload):
+    """
+    Decides how to bring a derived table up to date after the loads. Returns None when it
+    must be rebuilt in full (a source was reloaded in full, or the table is still empty),
+    otherwise the set of service call IDs whose source rows changed.
+    """
+    source_jobs = [job for job in jobs if job["item"]["table_name"] in sources and job["status"] == "ok"]
+    is_empty = sqlite_conn.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {quote_identifier(target)})").fetchone()[0]
+    if full_reload or is_empty or any(job["mode"] == "full" for job in source_jobs):
+        return None
+    return set().union(*(job.get("changed_call_ids", set()) for job in source_jobs))
+
+
+def parse_warranty_date(value):
+    """
+    Normalizes an ERP warranty timestamp to an ISO date. Returns None when there is no
+    warranty (blank or the 1900 placeholder) and 'invalid' when the value can't be parsed.
+    """
+    if not value or '1900' in str(value):
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).date().isoformat()
+    except ValueError:
+        return "invalid"
+
+
+def load_labor_rates(sqlite_conn):
+    """Returns {labor group name: tech/travel rate}; the first row for a group wins."""
+    rates = {}
+    for name, amount in sqlite_conn.execute("SELECT Labor_Group_Name, Billing_Amount FROM sv000123_overhead_groups ORDER BY rowid"):
+        rates.setdefault(name, amount)
+    return {name: amount for name, amount in rates.items() if amount is not None}
+
+
+def materialize_service_calls(sqlite_conn, call_ids=None, batch_size=ETL_BATCH_SIZE):
+    """
+    Rebuilds service_call_snapshot rows, for every call or only for the given trimmed IDs.
+    Details and notes are read as two streams sorted by call ID and merged, so memory
+    stays bounded by batch_size rather than by the number of calls. Returns the row count.
+    """
+    rates = load_labor_rates(sqlite_conn)
+    where = ""
+    if call_ids is None:
+        sqlite_conn.execute("DELETE FROM service_call_snapshot")
+    else:
+        stage_changed_calls(sqlite_conn, call_ids)
+        sqlite_conn.execute("DELETE FROM service_call_snapshot WHERE call_id IN (SELECT call_id FROM temp.changed_calls)")
+        where = CHANGED_CALLS_FILTER
+
+    details = sqlite_conn.execute(SQL_MATERIALIZE_DETAILS.format(where=where.format(column="SV00300_Service_Call_ID")))
+    notes = sqlite_conn.execute(SQL_MATERIALIZE_NOTES.format(where=where.format(column="Service_Call_ID")))
+    note = notes.fetchone()
+    batch, written, previous_id = [], 0, None
+    for (call_id, customer_name, customer_company, labor_group, generator_model, generator_serial, warranty,
+         ats_model, ats_serial, engine_model, engine_serial) in details:
+        if call_id == previous_id:
+            continue # Keep the first details row for a call, as the API always has
+        previous_id = call_id
+        writeup = []
+        while note is not None and note[0] < call_id:
+            note = notes.fetchone() # Notes for calls that have no details row
+        while note is not None and note[0] == call_id:
+            if note[1]:
+                writeup.append(note[1].strip())
+            note = notes.fetchone()
+        rate = rates.get(labor_group, DEFAULT_LABOR_RATE)
+        batch.append((call_id, customer_name, customer_company or customer_name, labor_group, rate, rate,
+                      generator_model, generator_serial, parse_warranty_date(warranty),
+                      ats_model, ats_serial, engine_model, engine_serial, "\n".join(writeup)))
+        if len(batch) >= batch_size:
+            sqlite_conn.executemany(SQL_INSERT_SERVICE_CALL, batch)
+            written += len(batch)
+            batch = []
+    sqlite_conn.executemany(SQL_INSERT_SERVICE_CALL, batch)
+    return written + len(batch)
+
+
+def refresh_service_call_rates(sqlite_conn):
+    """
+    Updates tech/travel rates in place for calls whose labor group's billing amount changed.
+    sv000123_overhead_groups is reloaded in full on every sync, so this avoids rebuilding
+    every call just to pick up its (usually unchanged) rates. Returns the number of calls updated.
+    """
+    rates = load_labor_rates(sqlite_conn)
+    cursor = sqlite_conn.executemany(
+        "UPDATE service_call_snapshot SET tech_rate = ?, travel_rate = ? WHERE labor_group_name = ? AND tech_rate IS NOT ?",
+        [(rate, rate, name, rate) for name, rate in rates.items()]
+    )
+    updated = cursor.rowcount
+    placeholders = ", ".join("?" for _ in rates)
+    cursor = sqlite_conn.execute(
+        f"""UPDATE service_call_snapshot SET tech_rate = ?, travel_rate = ?
+            WHERE tech_rate IS NOT ? AND (labor_group_name IS NULL OR labor_group_name NOT IN ({placeholders}))""",
+        (DEFAULT_LABOR_RATE, DEFAULT_LABOR_RATE, DEFAULT_LABOR_RATE, *rates)
+    )
+    return updated + cursor.rowcount
+
+
+def update_service_call_snapshot(sqlite_conn, jobs, full_reload):
+    """
+    Brings service_call_snapshot up to date after the tables are loaded: a full rebuild when a
+    source table was reloaded in full, otherwise only the calls whose source rows changed.
+    """
+    changed = plan_rebuild(sqlite_conn, jobs, SERVICE_CALL_SOURCES, "service_call_snapshot", full_reload)
+    started = time.perf_counter()
+    with sqlite_conn:
+        if changed is None:
+            rows = materialize_service_calls(sqlite_conn)
+            print(f"✅ Rebuilt service_call_snapshot: {rows:,} calls in {time.perf_counter() - started:.2f}s.")
+            return
+        rows = materialize_service_calls(sqlite_conn, changed) if changed else 0
+        updated = refresh_service_call_rates(sqlite_conn)
+    print(f"✅ Refreshed service_call_snapshot: {rows:,} calls rebuilt, {updated:,} rates updated "
+          f"in {time.perf_counter() - started:.2f}s.")
+
+
+def split_service_notes(sqlite_conn, call_ids=None):
+    """
+    Rebuilds the NOTE_SOURCES tables from the extracted notes, for every call or only the given
+    trimmed IDs. Returns the number of notes copied.
+    """
+    where = ""
+    if call_ids is not None:
+        stage_changed_calls(sqlite_conn, call_ids)
+        where = CHANGED_CALLS_FILTER.format(column="Service_Call_ID")
+    table_definitions = load_table_definitions(SCHEMA_FILE)
+    rows = 0
+    for table_name, note_type in NOTE_SOURCES.items():
+        columns = ", ".join(quote_identifier(c) for c in table_columns(table_definitions[table_name]))
+        delete_filter = " WHERE " + where[len("AND "):] if where else ""
+        sqlite_conn.execute(f"DELETE FROM {quote_identifier(table_name)}{delete_filter}")
+        rows += sqlite_conn.execute(SQL_SPLIT_NOTES.format(table=quote_identifier(table_name), columns=columns, where=where),
+                                    (NOTE_TYPE_CODES[note_type],)).rowcount
+    return rows
+
+
+def count_split_notes(sqlite_conn):
+    """Returns (notes of each type in NOTES_TABLE, rows in the NOTE_SOURCES tables)."""
+    expected = sqlite_conn.execute(
+        f"SELECT COUNT(*) FROM {quote_identifier(NOTES_TABLE)} WHERE UPPER(TRIM(WS_Note_Type)) IN ({', '.join('?' for _ in NOTE_TYPE_CODES)})",
+        tuple(NOTE_TYPE_CODES.values())
+    ).fetchone()[0]
+    actual = sum(sqlite_conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(t)}").fetchone()[0] for t in NOTE_SOURCES)
+    return expected, actual
+
+
+def update_split_notes(sqlite_conn, jobs, full_reload):
+    """
+    Brings the NOTE_SOURCES tables up to date with the extracted notes after the tables are loaded.
+    They are rebuilt in full after a full load of the notes, or when they don't add up to the
+    extracted notes (e.g. still holding rows seeded from the legacy database). Returns True
+    when they were rebuilt in full, so what is built from them must be rebuilt in full too.
+    """
+    changed = plan_rebuild(sqlite_conn, jobs, (NOTES_TABLE,), next(iter(NOTE_SOURCES)), full_reload)
+    started = time.perf_counter()
+    with sqlite_conn:
+        rows = split_service_notes(sqlite_conn, changed) if changed else 0
+        if changed is not None and len(set(count_split_notes(sqlite_conn))) > 1:
+            changed = None
+        if changed is None:
+            rows = split_service_notes(sqlite_conn)
+    print(f"✅ {'Rebuilt' if changed is None else 'Refreshed'} the description and resolution notes: "
+          f"{rows:,} notes split by type in {time.perf_counter() - started:.2f}s.")
+    return changed is None
+
+
+def index_service_notes(sqlite_conn, call_ids=None):
+    """
+    Rebuilds service_note and its full-text index, for every call or only the given trimmed IDs.
+    The index uses service_note as external content, so it is told explicitly which rows
+    leave and which arrive. Returns the number of notes indexed.
+    """
+    where = ""
+    if call_ids is None:
+        sqlite_conn.execute("DELETE FROM service_note")
+    else:
+        stage_changed_calls(sqlite_conn, call_ids)
+        sqlite_conn.execute(
+            """INSERT INTO service_note_fts (service_note_fts, rowid, notes)
+               SELECT 'delete', id, notes FROM service_note WHERE call_id IN (SELECT call_id FROM temp.changed_calls)"""
+        )
+        sqlite_conn.execute("DELETE FROM service_note WHERE call_id IN (SELECT call_id FROM temp.changed_calls)")
+        where = CHANGED_CALLS_FILTER.format(column="Service_Call_ID")
+    rows = 0
+    for table_name, note_type in NOTE_SOURCES.items():
+        rows += sqlite_conn.execute(SQL_INDEX_NOTES.format(table=quote_identifier(table_name), where=where), (note_type,)).rowcount
+    if call_ids is None:
+        sqlite_conn.execute("INSERT INTO service_note_fts (service_note_fts) VALUES ('rebuild')")
+    else:
+        sqlite_conn.execute(
+            """INSERT INTO service_note_fts (rowid, notes)
+               SELECT id, notes FROM service_note WHERE call_id IN (SELECT call_id FROM temp.changed_calls)"""
+        )
+    return rows
+
+
+def update_service_note_index(sqlite_conn, jobs, full_reload):
+    """Brings service_note and its full-text index up to date after the tables are loaded."""
+    changed = plan_rebuild(sqlite_conn, jobs, (NOTES_TABLE,), "service_note", full_reload)
+    started = time.perf_counter()
+    with sqlite_conn:
+        rows = index_service_notes(sqlite_conn, changed) if changed is None or changed else 0
+    print(f"✅ {'Rebuilt' if changed is None else 'Refreshed'} the service note search index: "
+          f"{rows:,} notes indexed in {time.perf_counter() - started:.2f}s.")
+
+
+# --- 6. SNAPSHOTS ---
+# The API never sees a half-loaded table: each run builds a complete snapshot in
+# "<ERP_DB_NAME>.building", validates it, and renames it over the live file in one step.
+
+def read_snapshot_metadata(path):
+    """Returns the snapshot_metadata of an existing snapshot as a dict, or {} if there is none."""
+    if not os.path.exists(path):
+        return {}
+    conn = sqlite3.connect(f"{pathlib.Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        return dict(conn.execute("SELECT key, value FROM snapshot_metadata").fetchall())
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        conn.close()
+
+
+def start_snapshot(live_path, building_path, legacy_path):
+    """
+    Creates the file the new snapshot is built in, starting from a copy of the live snapshot
+    so tables this run doesn't sync carry over. The very first snapshot is seeded instead with
+    whatever ERP tables the application database still holds from the single-file layout.
+    """
+    for leftover in (building_path, building_path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover) # From an earlier run that failed or was rejected
+    sqlite_conn = sqlite3.connect(building_path)
+    if os.path.exists(live_path):
+        live_conn = sqlite3.connect(f"{pathlib.Path(live_path).resolve().as_uri()}?mode=ro", uri=True)
+        try:
+            live_conn.backup(sqlite_conn)
+        finally:
+            live_conn.close()
+        print(f"✅ Copied the live snapshot '{live_path}' as the starting point.")
+    # Nothing reads this file until it is swapped in, and it is fsynced before the swap,
+    # so skip the journal's per-commit syncs while loading. DELETE mode leaves no -wal
+    # side file behind that would have to move along with the snapshot.
+    sqlite_conn.execute("PRAGMA journal_mode = DELETE")
+    sqlite_conn.execute("PRAGMA synchronous = OFF")
+    with open(SCHEMA_FILE, 'r') as f:
+        sqlite_conn.executescript(f.read()) # Makes sure sync_state exists before it's read
+    if not os.path.exists(live_path) and os.path.exists(legacy_path):
+        seed_from_legacy(sqlite_conn, legacy_path)
+    return sqlite_conn
+
+
+def seed_from_legacy(sqlite_conn, legacy_path):
+    """Copies the ERP tables defined in erp_schema.sql out of the old single-file database."""
+    sqlite_conn.execute("ATTACH DATABASE ? AS legacy", (f"{pathlib.Path(legacy_path).resolve().as_uri()}?mode=ro",))
+    try:
+        with sqlite_conn:
+            for table_name in load_table_definitions(SCHEMA_FILE):
+                table = quote_identifier(table_name)
+                legacy_columns = [row[1] for row in sqlite_conn.execute(f"PRAGMA legacy.table_info({table})")]
+                if not legacy_columns or table_name in ("sync_state", "snapshot_metadata", "service_call_snapshot"):
+                    continue
+                columns = [row[1] for row in sqlite_conn.execute(f"PRAGMA main.table_info({table})")]
+                shared = ", ".join(quote_identifier(c) for c in columns if c in legacy_columns)
+                copied = sqlite_conn.execute(f"INSERT INTO main.{table} ({shared}) SELECT {shared} FROM legacy.{table}").rowcount
+                if copied:
+                    print(f"✅ Seeded {copied:,} rows of '{table_name}' from '{legacy_path}'.")
+    finally:
+        sqlite_conn.execute("DETACH DATABASE legacy")
+
+
+def validate_snapshot(path, live_path, query_list):
+    """
+    Checks a finished snapshot before it is swapped in. Returns a list of problems; an empty
+    list means it is safe to serve. Every synced table must exist with the columns defined in
+    erp_schema.sql and be non-empty (and not much smaller than in the live snapshot), every
+    service call and note must be materialized, the notes split by type must match the
+    extracted notes, every index in erp_schema.sql must exist, and the schema version must be
+    the current one.
+    """
+    with open(SCHEMA_FILE, 'r') as f:
+        required_indexes = re.findall(r'CREATE INDEX IF NOT EXISTS "(\w+)"', f.read())
+    table_definitions = load_table_definitions(SCHEMA_FILE)
+    problems = []
+    conn = sqlite3.connect(f"{pathlib.Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    live_conn = sqlite3.connect(f"{pathlib.Path(live_path).resolve().as_uri()}?mode=ro", uri=True) if os.path.exists(live_path) else None
+    try:
+        existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+        for item in query_list:
+            table_name = item["table_name"]
+            if table_name not in existing:
+                problems.append(f"table '{table_name}' is missing")
+                continue
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})")}
+            if table_name in table_definitions:
+                expected = set(table_columns(table_definitions[table_name]))
+                missing = sorted(expected - columns)
+                if missing:
+                    problems.append(f"table '{table_name}' is missing columns {missing}")
+            count = conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}").fetchone()[0]
+            live_count = 0
+            if live_conn is not None:
+                try:
+                    live_count = live_conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(table_name)}").fetchone()[0]
+                except sqlite3.OperationalError:
+                    pass # Table is new in this snapshot
+            if count == 0:
+                problems.append(f"table '{table_name}' is empty")
+            elif count < live_count * (1 - ETL_MAX_SHRINK):
+                problems.append(f"table '{table_name}' shrank from {live_count:,} to {count:,} rows")
+        # Every distinct service call must have exactly one materialized row
+        expected_calls = conn.execute(
+            "SELECT COUNT(DISTINCT TRIM(SV00300_Service_Call_ID)) FROM service_call_details WHERE SV00300_Service_Call_ID IS NOT NULL"
+        ).fetchone()[0]
+        materialized_calls = conn.execute("SELECT COUNT(*) FROM service_call_snapshot").fetchone()[0]
+        if materialized_calls != expected_calls:
+            problems.append(f"service_call_snapshot has {materialized_calls:,} rows for {expected_calls:,} service calls")
+        # The description and resolution tables must hold exactly the extracted notes of their type
+        expected_split, split_notes = count_split_notes(conn)
+        if split_notes != expected_split:
+            problems.append(f"{', '.join(NOTE_SOURCES)} hold {split_notes:,} rows for {expected_split:,} extracted notes")
+        # Every non-empty note must be searchable
+        expected_notes = sum(
+            conn.execute(f"SELECT COUNT(*) FROM {quote_identifier(t)} WHERE Service_Call_ID IS NOT NULL "
+                         "AND TRIM(COALESCE(Record_Notes, '')) != ''").fetchone()[0]
+            for t in NOTE_SOURCES
+        )
+        indexed_notes = conn.execute("SELECT COUNT(*) FROM service_note").fetchone()[0]
+        if indexed_notes != expected_notes:
+            problems.append(f"service_note has {indexed_notes:,} rows for {expected_notes:,} notes")
+        for index_name in required_indexes:
+            if index_name not in existing:
+                problems.append(f"index '{index_name}' is missing")
+        row = conn.execute("SELECT value FROM snapshot_metadata WHERE key = 'schema_version'").fetchone()
+        if row is None or int(row[0]) != ERP_SCHEMA_VERSION:
+            problems.append(f"schema version is {row[0] if row else None}, expected {ERP_SCHEMA_VERSION}")
+    finally:
+        conn.close()
+        if live_conn is not None:
+            live_conn.close()
+    return problems
+
+
+def swap_snapshot(building_path, live_path):
+    """Makes the new snapshot durable, then atomically renames it over the live one."""
+    with open(building_path, 'rb') as f:
+        os.fsync(f.fileno())
+    for attempt in range(5):
+        try:
+            os.replace(building_path, live_path)
+            break
+        except PermissionError:
+            # Windows refuses to replace a file another process has open; readers let go quickly
+            if attempt == 4:
+                raise
+            time.sleep(1)
+    if hasattr(os, "O_DIRECTORY"):
+        # Persist the rename itself
+        dir_fd = os.open(os.path.dirname(os.path.abspath(live_path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def process_queries(query_list, source, snapshot_path=ERP_DB_NAME, full_reload=False, batch_size=ETL_BATCH_SIZE,
+                    loader="stream", workers=ETL_WORKERS, max_retries=ETL_MAX_RETRIES, trace_memory=False):
+    """
+    Extracts each query from the source into a new ERP snapshot and swaps it in for the live one.
+    Tables with a recorded watermark are synced incrementally unless full_reload is set.
+    Peak memory is reported as RSS, or as traced Python allocations per table with trace_memory
+    (which slows the load down by more than half, so it is off for regular syncs).
+    `source` is an ODBCSource or SQLiteSource; a plain string is treated as an ODBC connection string.
+    Returns a list of per-table result dicts.
+    """
+    if isinstance(source, str):
+        source = ODBCSource(source)
+    building_path = snapshot_path + ".building"
+    print(f"--- Starting Data Transfer ({'full reload' if full_reload else 'incremental'}, {loader} loader, {workers} workers) ---")
+    print(f"Source:      {source.describe()}")
+    print(f"Destination: SQLite snapshot '{snapshot_path}' (built in '{building_path}')\n")
+
+    previous_generation = int(read_snapshot_metadata(snapshot_path).get("generation", 0))
 
     # Establish the SQLite connection once
     try:
-        sqlite_conn = sqlite3.connect(sqlite_db)
+        sqlite_conn = start_snapshot(snapshot_path, building_path, SQLITE_DB_NAME)
+        table_definitions = load_table_definitions(SCHEMA_FILE)
         print("✅ Successfully connected to SQLite.")
     except Exception as e:
-        print(f"❌ ERROR: Could not connect to SQLite database '{sqlite_db}'.")
+        print(f"❌ ERROR: Could not create SQLite snapshot '{building_path}'.")
         print(f"Details: {e}")
-        return
+        return []
 
-    # Process each query
+    # Decide each table's mode up front, while only this thread touches SQLite
+    jobs = []
     for item in query_list:
-        table_name = item["table_name"]
-        query = item["query"]
-        print(f"Processing table '{table_name}'...")
+        watermark_column = item.get("watermark")
+        watermark_value = None if full_reload or not watermark_column else get_sync_state(sqlite_conn, item)
+        jobs.append({
+            "item": item,
+            "mode": "incremental" if watermark_value is not None else "full",
+            "watermark_value": watermark_value,
+            "queue": queue.Queue(maxsize=ETL_QUEUE_BATCHES),
+            "retries": 0, "attempts": 0, "query_seconds": None, "rows": 0, "status": "pending",
+        })
 
-        try:
-            # 1. Read data from SQL Server using pandas
-            with pyodbc.connect(sql_conn_str) as sql_conn:
-                df = pd.read_sql_query(query, sql_conn)
-            
-            print(f"  - Fetched {len(df)} rows from SQL Server.")
-
-            # 2. Write the DataFrame to a table in SQLite
-            # 'if_exists='replace'' will drop the table if it already exists and create a new one.
-            df.to_sql(table_name, sqlite_conn, if_exists='replace', index=False)
-            
-            print(f"  - ✅ Successfully wrote data to SQLite table '{table_name}'.\n")
-
-        except pyodbc.Error as ex:
-            sqlstate = ex.args[0]
-            print(f"  - ❌ ERROR executing query for '{table_name}' on SQL Server.")
-            print(f"  - SQLSTATE: {sqlstate}")
-            print(f"  - Details: {ex}\n")
-        except Exception as e:
-            print(f"  - ❌ An unexpected error occurred for table '{table_name}'.")
-            print(traceback.format_exc()) # Provides detailed error info
+    if trace_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+
+    if loader == "pandas":
+        for job in jobs:
+            print(f"Processing table '{job['item']['table_name']}' (full, pandas)...")
+            job_started = time.perf_counter()
+            reset_memory_peak(trace_memory)
+            try:
+                job["rows"] = sync_table_full_pandas(job["item"], source, sqlite_conn)
+                job["mode"], job["status"] = "full", "ok"
+            except Exception as e:
+                job["status"] = "failed"
+                print(f"  - ❌ An unexpected error occurred for table '{job['item']['table_name']}'.")
+                print(traceback.format_exc()) # Provides detailed error info
+            job["seconds"] = time.perf_counter() - job_started
+            job["peak_mb"] = read_memory_peak(trace_memory)
+    else:
+        work_queue = queue.Queue()
+        ready_queue = queue.Queue()
+        for job in jobs:
+            work_queue.put(job)
+        extractors = [
+            threading.Thread(target=extractor_worker, args=(source, work_queue, ready_queue, batch_size, max_retries),
+                             name=f"extractor-{i}", daemon=True)
+            for i in range(max(1, min(workers, len(jobs))))
+        ]
+        for thread in extractors:
+            work_queue.put(None) # One stop signal per extractor
+            thread.start()
+
+        # The single writer: load tables in the order their extractions start producing data
+        for _ in jobs:
+            job = ready_queue.get()
+            table_name = job["item"]["table_name"]
+            job_started = time.perf_counter()
+            reset_memory_peak(trace_memory) # Peak per table: from when the writer starts it until it finishes
+            print(f"Processing table '{table_name}' ({job['mode']})...")
+            try:
+                job["rows"] = write_table(sqlite_conn, job, table_definitions, source)
+                job["status"] = "ok"
+                print(f"  - ✅ Successfully wrote {job['rows']} rows to SQLite table '{table_name}'.\n")
+            except Exception as e:
+                job["status"] = "failed"
+                if sqlite_conn.in_transaction:
+                    sqlite_conn.rollback()
+                if not job.get("finished"):
+                    drain_job(job)
+                print(f"  - ❌ ERROR syncing '{table_name}'. {source.describe_error(e)}\n")
+            job["seconds"] = time.perf_counter() - job_started
+            job["peak_mb"] = read_memory_peak(trace_memory)
+
+        for thread in extractors:
+            thread.join()
+
+    total_seconds = time.perf_counter() - started
+    if trace_memory:
+        tracemalloc.stop()
+
+    # Summary report
+    report = []
+    print(f"{'Table':<40} {'Mode':<12} {'Status':<7} {'Rows':>10} {'Query s':>8} {'Write s':>8} {'Rows/sec':>10} {'Peak MB':>8} {'Retries':>7}")
+    for job in jobs:
+        seconds = job.get("seconds") or 0
+        result = {
+            "table_name": job["item"]["table_name"], "mode": job["mode"], "status": job["status"], "rows": job["rows"],
+            "query_seconds": job["query_seconds"], "seconds": seconds, "retries": job["retries"],
+            "rows_per_second": job["rows"] / seconds if seconds else 0, "peak_mb": job.get("peak_mb", 0),
+        }
+        report.append(result)
+        print(f"{result['table_name']:<40} {result['mode']:<12} {result['status']:<7} {result['rows']:>10,} "
+              f"{result['query_seconds'] or 0:>8.2f} {seconds:>8.2f} {result['rows_per_second']:>10,.0f} "
+              f"{result['peak_mb']:>8.1f} {result['retries']:>7}")
+    print(f"Total: {sum(r['rows'] for r in report):,} rows in {total_seconds:.2f}s, "
+          f"peak {'traced memory' if trace_memory else 'RSS'} {max((r['peak_mb'] for r in report), default=0):.1f} MB\n")
+    total_rows = sum(r["rows"] for r in report)
+
+    notes_rebuilt = False
+    try:
+        notes_rebuilt = update_split_notes(sqlite_conn, jobs, full_reload)
+    except Exception as e:
+        print(f"❌ ERROR: Could not split '{NOTES_TABLE}' by note type. Details: {e}")
+    try:
+        update_service_call_snapshot(sqlite_conn, jobs, full_reload or notes_rebuilt)
+    except Exception as e:
+        print(f"❌ ERROR: Could not rebuild service_call_snapshot. Details: {e}")
+    try:
+        update_service_note_index(sqlite_conn, jobs, full_reload or notes_rebuilt)
+    except Exception as e:
+        print(f"❌ ERROR: Could not rebuild the service note search index. Details: {e}")
+
+    # Re-apply erp_schema.sql. Replacing a table drops its indexes, and every statement in the
+    # schema is idempotent, so this recreates the lookup indexes the API depends on.
+    try:
+        with open(SCHEMA_FILE, 'r') as f:
+            sqlite_conn.executescript(f.read())
+        # Full reloads get fresh planner statistics; incremental runs use the cheap optimize pass
+        sqlite_conn.execute("ANALYZE" if full_reload else "PRAGMA optimize")
+        generation = previous_generation + 1
+        sqlite_conn.executemany(
+            "INSERT OR REPLACE INTO snapshot_metadata (key, value) VALUES (?, ?)",
+            [("generation", generation), ("schema_version", ERP_SCHEMA_VERSION),
+             ("built_at", datetime.now().isoformat(sep=' ', timespec='seconds'))]
+        )
+        sqlite_conn.commit()
+        if full_reload:
+            sqlite_conn.execute("VACUUM") # Reclaim the pages of the replaced tables copied from the old snapshot
+        print("✅ Recreated indexes from erp_schema.sql and refreshed planner statistics.")
+    except Exception as e:
+        print(f"❌ ERROR: Could not apply '{SCHEMA_FILE}' to '{building_path}'.")
+        print(f"Details: {e}")
+        sqlite_conn.close()
+        return report
 
     # Close the SQLite connection
     sqlite_conn.close()
-    print("--- Data Transfer Complete ---")
 
+    if total_rows == 0 and os.path.exists(snapshot_path):
+        os.remove(building_path)
+        print("✅ No ERP changes; the live snapshot was left in place.")
+    else:
+        problems = validate_snapshot(building_path, snapshot_path, QUERIES_TO_RUN)
+        if problems:
+            print(f"❌ The new snapshot failed validation and was NOT swapped in (kept at '{building_path}'):")
+            for problem in problems:
+                print(f"  - {problem}")
+        else:
+            swap_snapshot(building_path, snapshot_path)
+            print(f"✅ Swapped in snapshot generation {generation}; the API switches over within seconds.")
+    print("--- Data Transfer Complete ---")
+    return report
 
 if __name__ == "__main__":
-    process_queries(QUERIES_TO_RUN, CONNECTION_STRING, SQLITE_DB_NAME)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Copy ERP data from SQL Server into a new ERP snapshot and swap it in for the API.")
+    parser.add_argument("--full", action="store_true", help="Reload every table in full instead of syncing changes")
+    parser.add_argument("--tables", nargs="+", metavar="TABLE", help="Only sync these tables")
+    parser.add_argument("--batch-size", type=int, default=ETL_BATCH_SIZE, help="Rows per fetch/insert batch")
+    parser.add_argument("--loader", choices=["stream", "pandas"], default="stream",
+                        help="Full-reload loader: constant-memory streaming (default) or the original pandas path")
+    parser.add_argument("--workers", type=int, default=ETL_WORKERS, help="Tables extracted concurrently")
+    parser.add_argument("--retries", type=int, default=ETL_MAX_RETRIES, help="Retries per table on transient source errors")
+    parser.add_argument("--source-sqlite", metavar="PATH",
+                        help="Read tables from this SQLite file instead of SQL Server (for testing)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Report traced Python allocations per table instead of peak RSS (slower)")
+    args = parser.parse_args()
+
+    source = SQLiteSource(args.source_sqlite) if args.source_sqlite else ODBCSource(CONNECTION_STRING)
+    queries = [q for q in QUERIES_TO_RUN if not args.tables or q["table_name"] in args.tables]
+    process_queries(queries, source, ERP_DB_NAME, full_reload=args.full, batch_size=args.batch_size,
+                    loader=args.loader, workers=args.workers, max_retries=args.retries, trace_memory=args.trace_memory)